@@ -0,0 +1 @@
+# This file makes the 'ai_action_streamer' directory a Python package.
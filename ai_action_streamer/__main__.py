@@ -0,0 +1,4 @@
+# python -m ai_action_streamer [--in-process] [--port N] ...; see --help.
+from ai_action_streamer.ai_action_streamer_server import main
+
+main()
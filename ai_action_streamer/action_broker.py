@@ -0,0 +1,198 @@
+"""
+Per-session fan-out of server-pushed actions (the SubscribeActions stream).
+
+Each session keeps a bounded backlog of Actions and at most one pending wakeup
+future shared by its subscribers, so an idle session costs a deque and a few
+counters: there is no task, timer or queue per subscriber. publish() stamps
+Action.sequence, appends to the backlog and wakes the session; subscribers
+drain everything after their cursor in batches of up to `max_batch`, so a burst
+of decisions costs one wakeup rather than one per action.
+
+A reconnecting client passes the last sequence it received
+(SessionInfo.resume_after) and is sent the retained actions after it. If the
+backlog rolled over while it was away, the first sequence it sees jumps past
+resume_after + 1, so the gap is visible to the client.
+
+All methods must be called from the event loop that runs the gRPC server.
+"""
+import asyncio
+import collections
+import itertools
+import time
+
+from ai_action_streamer.checkpoint import pack_messages, unpack_messages
+
+from proto import nf_ai_comms_pb2
+
+
+class _Session:
+    __slots__ = ("pipeline_name", "backlog", "last_sequence", "waiter", "subscribers", "last_active", "closed")
+
+    def __init__(self, pipeline_name, retain):
+        self.pipeline_name = pipeline_name
+        self.backlog = collections.deque(maxlen=retain)
+        self.last_sequence = 0
+        self.waiter = None
+        self.subscribers = 0
+        self.last_active = time.monotonic()
+        self.closed = False
+
+
+class ActionBroker:
+    """
+    Args:
+        retain (int): Actions kept per session for subscribers that resume.
+        max_batch (int): Default upper bound on actions handed out per wakeup.
+        idle_ttl_s (float): Sessions with no subscriber and no new action for this
+            long are dropped; a later subscriber starts a fresh sequence.
+    """
+
+    def __init__(self, retain=1024, max_batch=256, idle_ttl_s=3600.0):
+        self.retain = retain
+        self.max_batch = max_batch
+        self.idle_ttl_s = idle_ttl_s
+        self.sessions = {}
+        self.published = 0
+        self.delivered = 0
+        self._last_sweep = time.monotonic()
+
+    def publish(self, session_id, action):
+        """
+        Queues `action` for one session, creating the session if needed. The
+        action's `sequence` field is overwritten with the session cursor.
+
+        Returns:
+            int: The sequence number assigned.
+        """
+        return self._push(self._session(session_id), action)
+
+    def broadcast(self, action, pipeline_name=None):
+        """
+        Publishes a copy of `action` to every known session, or only to the
+        sessions of `pipeline_name`.
+
+        Returns:
+            int: Number of sessions the action was queued for.
+        """
+        targets = [s for s in self.sessions.values() if pipeline_name is None or s.pipeline_name == pipeline_name]
+        for session in targets:
+            copy = type(action)()
+            copy.CopyFrom(action)
+            self._push(session, copy)
+        return len(targets)
+
+    async def subscribe(self, session_id, pipeline_name="", resume_after=0, max_batch=0):
+        """
+        Async generator of action batches (lists, in sequence order) for one
+        session, starting after sequence `resume_after`. Runs until cancelled or
+        the session is closed.
+        """
+        session = self._session(session_id, pipeline_name)
+        limit = max_batch or self.max_batch
+        cursor = resume_after
+        if cursor > session.last_sequence:
+            # The session was dropped (or the server restarted) since the client's
+            # last action; its old cursor means nothing for the new sequence.
+            cursor = 0
+        session.subscribers += 1
+        try:
+            while True:
+                backlog = session.backlog
+                if backlog and session.last_sequence > cursor:
+                    # Sequences in the backlog are consecutive, so the cursor maps to an offset.
+                    start = max(cursor + 1 - backlog[0].sequence, 0)
+                    batch = list(itertools.islice(backlog, start, start + limit))
+                    cursor = batch[-1].sequence
+                    self.delivered += len(batch)
+                    yield batch
+                    continue
+                if session.closed:
+                    return
+                if session.waiter is None:
+                    session.waiter = asyncio.get_running_loop().create_future()
+                # Shielded: one subscriber going away must not cancel the others' wakeup.
+                await asyncio.shield(session.waiter)
+        finally:
+            session.subscribers -= 1
+            session.last_active = time.monotonic()
+
+    def close_session(self, session_id):
+        """
+        Forgets a session and its backlog (e.g. when the Nextflow run completes).
+        Its subscribers receive what is still queued and then their streams end.
+        """
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.closed = True
+            waiter, session.waiter = session.waiter, None
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    def metrics(self):
+        return {
+            "sessions": len(self.sessions),
+            "subscribed_sessions": sum(1 for s in self.sessions.values() if s.subscribers),
+            "subscribers": sum(s.subscribers for s in self.sessions.values()),
+            "retained": sum(len(s.backlog) for s in self.sessions.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+    def checkpoint_state(self, full):
+        # StateCheckpointer protocol. Each session's cursor and retained backlog are
+        # saved so a client resuming after a restart gets the actions it missed
+        # without sequence numbers starting over and repeating ones it already has.
+        # Always written whole: it is bounded by `retain` actions per session.
+        sessions = [(session_id, s.pipeline_name, s.last_sequence, list(s.backlog))
+                    for session_id, s in self.sessions.items()]
+        meta = {
+            "published": self.published,
+            "delivered": self.delivered,
+            "sessions": [[session_id, pipeline_name, last_sequence, len(backlog)]
+                         for session_id, pipeline_name, last_sequence, backlog in sessions],
+        }
+
+        def build():
+            chunks, offsets = pack_messages([action for *_, backlog in sessions for action in backlog])
+            return {"actions": chunks, "action_offsets": offsets}
+
+        return meta, build
+
+    def restore_state(self, meta, arrays):
+        self.published = meta["published"]
+        self.delivered = meta["delivered"]
+        actions = iter(unpack_messages(nf_ai_comms_pb2.Action, arrays["actions"], arrays["action_offsets"]))
+        self.sessions = {}
+        for session_id, pipeline_name, last_sequence, retained in meta["sessions"]:
+            session = self.sessions[session_id] = _Session(pipeline_name, self.retain)
+            session.last_sequence = last_sequence
+            session.backlog.extend(itertools.islice(actions, retained))
+
+    def _session(self, session_id, pipeline_name=""):
+        session = self.sessions.get(session_id)
+        if session is None:
+            self._expire_idle()
+            session = self.sessions[session_id] = _Session(pipeline_name, self.retain)
+        elif pipeline_name and not session.pipeline_name:
+            session.pipeline_name = pipeline_name
+        return session
+
+    def _push(self, session, action):
+        session.last_sequence += 1
+        action.sequence = session.last_sequence
+        session.backlog.append(action)
+        session.last_active = time.monotonic()
+        self.published += 1
+        waiter, session.waiter = session.waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+        return session.last_sequence
+
+    def _expire_idle(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.idle_ttl_s / 10:
+            return
+        self._last_sweep = now
+        for session_id in [k for k, s in self.sessions.items()
+                           if not s.subscribers and now - s.last_active > self.idle_ttl_s]:
+            del self.sessions[session_id]
@@ -1,75 +1,254 @@
 import grpc
 import time
 import asyncio
+import signal
 from concurrent import futures
 import uuid # For generating unique action IDs
 
-import ray
+# Ray is imported where it is used: it is most of this module's import time and
+# the in-process server (AiActionStreamerServer) does not need it.
 
 # Import the generated gRPC files
-try:
-    # This assumes PYTHONPATH is set to BioWorkFlowML or you run from BioWorkFlowML
-    from proto import nf_ai_comms_pb2
-    from proto import nf_ai_comms_pb2_grpc
-except ImportError:
-    import sys
-    import os
-
-    # Get the absolute path to the directory containing the current script (ai_action_streamer)
-    current_script_dir = os.path.dirname(os.path.abspath(__file__))
-    # Get the project root directory (BioWorkFlowML)
-    project_root_dir = os.path.dirname(current_script_dir)
-    # Get the path to the 'proto' directory
-    proto_dir = os.path.join(project_root_dir, 'proto')
-
-    # Add the project root to sys.path to allow 'from proto import ...'
-    if project_root_dir not in sys.path:
-        sys.path.insert(0, project_root_dir)
-    
-    if proto_dir not in sys.path:
-        sys.path.insert(0, proto_dir)
-
-    import nf_ai_comms_pb2
-    import nf_ai_comms_pb2_grpc
+from proto import nf_ai_comms_pb2
+from proto import nf_ai_comms_pb2_grpc
+
+from ai_action_streamer.action_broker import ActionBroker
+from ai_action_streamer.checkpoint import StateCheckpointer
+from ai_action_streamer.fair_scheduler import WeightedFairScheduler
+from ai_action_streamer.features import ACTION_NOOP
+from ai_action_streamer.health import AI_ACTION_SERVICE, NOT_SERVING, SERVING, HealthServicer, health_pb2_grpc
+from ai_action_streamer.observation_log import ObservationLog
+from ai_action_streamer.policy import MultiAgentPolicy
+from ai_action_streamer.profiling import CHUNK_BYTES, MAX_DURATION_S, Profiler, profiled
+from ai_action_streamer.sessions import SessionRegistry
+from ai_action_streamer.transitions import TransitionAssembler
+from ai_action_streamer.transport import default_uds_path, ensure_socket_dir
 
 
 # Define the servicer class that implements the RPC methods
 class AiActionServicer(nf_ai_comms_pb2_grpc.AiActionServiceServicer):
+    def __init__(self, scheduler=None, observation_log=None, transitions=None, policy=None, broker=None,
+                 sessions=None):
+        # Weighted fair-share admission per pipeline_name in front of the decision path.
+        self.scheduler = scheduler if scheduler is not None else WeightedFairScheduler()
+        # Optional write-ahead log of (observation, action) pairs for offline training.
+        self.observation_log = observation_log
+        # Optional TransitionAssembler feeding the online replay buffer.
+        self.transitions = transitions
+        # Optional trained MultiAgentPolicy; without one the servicer just echoes.
+        self.policy = policy
+        # Per-session outbound queues behind SubscribeActions.
+        self.broker = broker if broker is not None else ActionBroker()
+        # String intern tables for OpenSession / SendCompactObservation.
+        self.sessions = sessions if sessions is not None else SessionRegistry()
+        # Set only while a Profile call runs; @profiled handlers check it.
+        self.profiler = None
+
+    @profiled
     async def SendTaskObservation(self, request: nf_ai_comms_pb2.TaskObservation, context):
+        return await self._act(request)
+
+    async def _act(self, request):
+        # Decides, logs and records an observation. Shared by SendTaskObservation and
+        # SendCompactObservation without a second @profiled layer, so a compact call
+        # is timed under its own handler only.
         print(f"AiActionStreamer: Received observation_event_id: {request.event_id}, type: {request.event_type}")
         print(f"  Pipeline: {request.pipeline_name}, Process: {request.process_name}, Task: {request.task_name}")
 
-        await asyncio.sleep(0.01) 
+        async with self.scheduler.slot(request.pipeline_name):
+            if self.policy is not None:
+                action_details, action_code = self.policy.decide(request)
+            else:
+                await asyncio.sleep(0.01) 
+                action_details, action_code = "echo_received_and_processed", ACTION_NOOP
 
         action_id = f"act_{uuid.uuid4()}"
         response_message = f"AiActionStreamer: Echoed observation_event_id {request.event_id}"
         print(f"  Sending action_id: {action_id}")
 
-        return nf_ai_comms_pb2.Action(
+        action = nf_ai_comms_pb2.Action(
             observation_event_id=request.event_id, 
             action_id=action_id,
-            action_details="echo_received_and_processed", 
+            action_details=action_details, 
             success=True,
             message=response_message
         )
+        if self.observation_log is not None:
+            self.observation_log.append_pair(request, action)
+        if self.transitions is not None:
+            self.transitions.observe(request, action_code)
+        return action
+
+    @profiled
+    async def OpenSession(self, request: nf_ai_comms_pb2.SessionOpen, context):
+        try:
+            session, ids = self.sessions.open(request.strings, request.session)
+        except KeyError as e:
+            await context.abort(grpc.StatusCode.NOT_FOUND, e.args[0])
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+        return nf_ai_comms_pb2.SessionHandle(session=session, ids=ids)
+
+    @profiled
+    async def SendCompactObservation(self, request: nf_ai_comms_pb2.CompactTaskObservation, context):
+        try:
+            observation = self.sessions.resolve(request)
+        except KeyError as e:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"{e.args[0]}; call OpenSession again")
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        return await self._act(observation)
+
+    @profiled
+    async def CloseSession(self, request: nf_ai_comms_pb2.SessionClose, context):
+        return nf_ai_comms_pb2.SessionClosed(was_open=self.sessions.close(request.session))
+
+    @profiled
+    async def SubscribeActions(self, request: nf_ai_comms_pb2.SessionInfo, context):
+        session_id = request.session_id or request.pipeline_name
+        if not session_id:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "session_id or pipeline_name is required")
+        print(f"AiActionStreamer: Session {session_id} subscribed (resume_after={request.resume_after})")
+        async for batch in self.broker.subscribe(
+            session_id, request.pipeline_name, request.resume_after, request.max_batch
+        ):
+            for action in batch:
+                yield action
+
+    async def Profile(self, request: nf_ai_comms_pb2.ProfileRequest, context):
+        if self.profiler is not None:
+            await context.abort(grpc.StatusCode.FAILED_PRECONDITION, "a profile is already running")
+        duration_s = min(request.duration_s or 5.0, MAX_DURATION_S)
+        print(f"AiActionStreamer: profiling for {duration_s:.1f}s")
+        profiler = Profiler(request.top_n or 25, cprofile=not request.skip_cprofile,
+                            trace_allocations=not request.skip_tracemalloc)
+        self.profiler = profiler
+        profiler.start(asyncio.get_running_loop())
+        try:
+            await asyncio.sleep(duration_s)
+        finally:
+            # Also when the caller goes away: instrumentation never outlives the call.
+            self.profiler = None
+            filename, archive = profiler.stop()
+        for offset in range(0, len(archive), CHUNK_BYTES):
+            yield nf_ai_comms_pb2.ProfileChunk(filename=filename if offset == 0 else "",
+                                               data=archive[offset:offset + CHUNK_BYTES])
+
+
+class AiActionStreamerServer:
+    """
+    The streamer's gRPC server and state. Runs in-process as is (fastest start and
+    restart), or as the Ray actor AiActionStreamer.
 
-@ray.remote
-class AiActionStreamer:
-    # Make the __init__ method asynchronous
-    async def __init__(self, host="[::]", port=50051):
+    Args:
+        port (int): TCP port; 0 picks a free one (see wait_ready()).
+        checkpoint_dir (str): Restore state from and snapshot it to this directory.
+        checkpoint_interval_s (float): Seconds between snapshots.
+    """
+
+    def __init__(self, host="[::]", port=50051, pipeline_weights=None, max_concurrent_decisions=10,
+                 observation_log_dir=None, replay_buffer=None, policy_checkpoint=None, unix_socket=True,
+                 checkpoint_dir=None, checkpoint_interval_s=30.0):
+        created = time.perf_counter()
         self.host = host
         self.port = port
+        # Co-located clients (transport.local_address) connect to a Unix socket named
+        # after the bound port; set by start_server().
+        self.unix_socket = unix_socket
+        self.uds_path = None
         self.server = None
-        print(f"AiActionStreamer Actor initialized. Will listen on {self.host}:{self.port}")
+        self.health = HealthServicer()
+        self._ready = None
+        self._stopping = None
+        self.scheduler = WeightedFairScheduler(
+            max_concurrency=max_concurrent_decisions, weights=pipeline_weights
+        )
+        self.observation_log = ObservationLog(observation_log_dir) if observation_log_dir else None
+        # replay_buffer is a ray-multiagent ReplayBufferActor handle; transitions are
+        # assembled per task_hash here and shipped to it in batches.
+        self.transitions = None
+        if replay_buffer is not None:
+            self.transitions = TransitionAssembler(
+                lambda *batch: replay_buffer.add_batch.remote(*batch)
+            )
+        # Checkpoint written by ray-multiagent/trainer.py (MultiAgentPolicy.save).
+        self.policy = MultiAgentPolicy.load(policy_checkpoint) if policy_checkpoint else None
+        # Actions pushed to Nextflow sessions over SubscribeActions.
+        self.broker = ActionBroker()
+        self.sessions = SessionRegistry()
+        # Snapshots of scheduler stats, broker cursors/backlogs and open tasks. Intern
+        # tables are not saved: CompactSession clients reopen on NOT_FOUND.
+        self.checkpointer = None
+        self.checkpoint_interval_s = checkpoint_interval_s
+        self._checkpoint_task = None
+        restore_s = 0.0
+        if checkpoint_dir:
+            components = {"scheduler": self.scheduler, "broker": self.broker}
+            if self.transitions is not None:
+                components["transitions"] = self.transitions
+            self.checkpointer = StateCheckpointer(checkpoint_dir, components)
+            start = time.perf_counter()
+            restored = self.checkpointer.restore()
+            restore_s = time.perf_counter() - start
+            if restored:
+                print(f"AiActionStreamer restored snapshot {restored} from {checkpoint_dir} in {restore_s:.3f}s")
+        self._created = created
+        self.startup = {"init_s": time.perf_counter() - created, "restore_s": restore_s, "ready_s": None}
+        print(f"AiActionStreamer initialized. Will listen on {self.host}:{self.port}")
+
+    async def _checkpoint_loop(self, interval_s):
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                await self.checkpointer.snapshot()
+            except Exception as e:
+                print(f"AiActionStreamer snapshot failed: {e}")
+
+    def _ready_future(self):
+        if self._ready is None:
+            self._ready = asyncio.get_running_loop().create_future()
+        return self._ready
+
+    def _set_health(self, status):
+        for service in ("", AI_ACTION_SERVICE):
+            self.health.set(service, status)
 
     async def start_server(self):
-        self.server = grpc.aio.server(futures.ThreadPoolExecutor(max_workers=10))
-        nf_ai_comms_pb2_grpc.add_AiActionServiceServicer_to_server(
-            AiActionServicer(), self.server
-        )
-        self.server.add_insecure_port(f"{self.host}:{self.port}")
-        await self.server.start()
-        print(f"AiActionStreamer gRPC server started on {self.host}:{self.port}")
+        # Serves until the server is stopped; wait_ready() tells when it accepts calls.
+        if self._ready is not None and self._ready.done():
+            self._ready = None  # left from a previous run
+        ready = self._ready_future()
+        try:
+            self.server = grpc.aio.server(futures.ThreadPoolExecutor(max_workers=10))
+            nf_ai_comms_pb2_grpc.add_AiActionServiceServicer_to_server(
+                AiActionServicer(self.scheduler, self.observation_log, self.transitions, self.policy, self.broker,
+                                 self.sessions),
+                self.server
+            )
+            health_pb2_grpc.add_HealthServicer_to_server(self.health, self.server)
+            self._set_health(NOT_SERVING)
+            self.port = self.server.add_insecure_port(f"{self.host}:{self.port}")
+            if self.unix_socket:
+                # Fails the start rather than serving TCP only: a socket that is not
+                # ours at this path would receive our local clients' traffic.
+                ensure_socket_dir()
+                uds_path = default_uds_path(self.port)
+                self.server.add_insecure_port(f"unix:{uds_path}")
+                self.uds_path = uds_path
+            await self.server.start()
+            if self.checkpointer is not None:
+                self._checkpoint_task = asyncio.get_running_loop().create_task(
+                    self._checkpoint_loop(self.checkpoint_interval_s))
+            self._set_health(SERVING)
+        except Exception as e:
+            ready.set_exception(e)
+            await self.stop_server()
+            raise
+        self.startup["ready_s"] = time.perf_counter() - self._created
+        ready.set_result(self.port)
+        print(f"AiActionStreamer gRPC server started on {self.host}:{self.port}"
+              + (f" and unix:{self.uds_path}" if self.uds_path else "")
+              + f", ready {self.startup['ready_s'] * 1000:.1f} ms after init")
         try:
             await self.server.wait_for_termination()
         except KeyboardInterrupt:
@@ -79,34 +258,137 @@ class AiActionStreamer:
         finally:
             await self.stop_server()
 
+    async def wait_ready(self, timeout=None):
+        # Returns the bound port once start_server() is serving (health SERVING), or
+        # raises the error that stopped it from starting.
+        return await asyncio.wait_for(asyncio.shield(self._ready_future()), timeout)
 
     async def stop_server(self):
-        if self.server:
+        # Also runs when start_server() returns, possibly while an explicit call is
+        # still shutting down; concurrent calls share one shutdown.
+        if self._stopping is None or self._stopping.done():
+            self._stopping = asyncio.get_running_loop().create_task(self._shutdown())
+        await asyncio.shield(self._stopping)
+
+    async def _shutdown(self):
+        server, self.server = self.server, None
+        if server:
             print("Stopping AiActionStreamer gRPC server...")
-            await self.server.stop(grace=1.0) 
-            self.server = None
+            self._set_health(NOT_SERVING)
+            await server.stop(grace=1.0) 
             print("AiActionStreamer gRPC server stopped.")
+        observation_log, self.observation_log = self.observation_log, None
+        if observation_log is not None:
+            observation_log.close()
+        if self.transitions is not None:
+            self.transitions.flush()
+        checkpointer, self.checkpointer = self.checkpointer, None
+        if checkpointer is not None:
+            if self._checkpoint_task is not None:
+                self._checkpoint_task.cancel()
+            await checkpointer.snapshot()
+            checkpointer.close()
 
     def get_port(self): 
         return self.port
 
-async def main_server_loop():
+    def get_uds_path(self):
+        # None when not listening on a Unix socket.
+        return self.uds_path
+
+    def set_pipeline_weight(self, pipeline_name, weight):
+        self.scheduler.set_weight(pipeline_name, weight)
+
+    def get_scheduler_metrics(self):
+        # Per-pipeline queue depth, in-flight count and admission latency.
+        return self.scheduler.metrics()
+
+    async def push_action(self, session_id, action_details, message="", observation_event_id=""):
+        # Delivered to the session's SubscribeActions stream(s) without waiting for an
+        # observation; returns the action's sequence number in that session. The broker
+        # methods are async so they run on the event loop that serves the streams.
+        action = nf_ai_comms_pb2.Action(
+            observation_event_id=observation_event_id,
+            action_id=f"act_{uuid.uuid4()}",
+            action_details=action_details,
+            success=True,
+            message=message,
+        )
+        return self.broker.publish(session_id, action)
+
+    async def broadcast_action(self, action_details, pipeline_name=None, message=""):
+        # Pushes the same action to every session (of pipeline_name, if given).
+        action = nf_ai_comms_pb2.Action(
+            action_id=f"act_{uuid.uuid4()}", action_details=action_details, success=True, message=message
+        )
+        return self.broker.broadcast(action, pipeline_name)
+
+    async def close_session(self, session_id):
+        self.broker.close_session(session_id)
+
+    def get_broker_metrics(self):
+        return self.broker.metrics()
+
+    async def checkpoint(self, full=None):
+        # Writes a snapshot now (full, delta, or None to follow full_every); returns its
+        # path, or None when the server was started without a checkpoint_dir.
+        if self.checkpointer is None:
+            return None
+        return await self.checkpointer.snapshot(full)
+
+    def get_checkpoint_metrics(self):
+        if self.checkpointer is None:
+            return {}
+        return {
+            "sequence": self.checkpointer.sequence,
+            "written": self.checkpointer.written,
+            "last_snapshot_s": self.checkpointer.last_snapshot_s,
+        }
+
+    def get_startup_metrics(self):
+        # Seconds spent in __init__ (restore_s of it restoring the checkpoint) and from
+        # __init__ until health reported SERVING (None before that).
+        return dict(self.startup)
+
+
+def _actor_class():
+    # Ray restarts the actor if its process dies and retries the calls that were in
+    # flight (including start_server), so the server comes back on the same port
+    # with the state restored from checkpoint_dir.
+    global AiActionStreamer
+    if "AiActionStreamer" not in globals():
+        import ray
+
+        AiActionStreamer = ray.remote(max_restarts=-1, max_task_retries=-1)(AiActionStreamerServer)
+    return AiActionStreamer
+
+
+def __getattr__(name):
+    # AiActionStreamer, the Ray actor, is built on first use so that importing this
+    # module does not import Ray.
+    if name == "AiActionStreamer":
+        return _actor_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def main_server_loop(**streamer_options):
+    import ray
+
     if not ray.is_initialized():
         ray.init(ignore_reinit_error=True, log_to_driver=False)
 
-    broker_port = 50051 
-    ai_streamer_actor = AiActionStreamer.options(name="AiActionStreamerService", get_if_exists=True).remote(port=broker_port)
+    streamer_options.setdefault("port", 50051)
+    ai_streamer_actor = _actor_class().options(
+        name="AiActionStreamerService", get_if_exists=True).remote(**streamer_options)
 
     print("Attempting to start AiActionStreamer server via Ray actor...")
     server_task_future = ai_streamer_actor.start_server.remote()
-    # Ensure the actor has time to initialize before getting the port
-    # A small delay or a more robust check might be needed in some cases
-    await asyncio.sleep(0.1) 
-    print(f"AiActionStreamer server launch initiated. Expected to listen on port {await ai_streamer_actor.get_port.remote()}")
+    port = await ai_streamer_actor.wait_ready.remote()
+    startup = await ai_streamer_actor.get_startup_metrics.remote()
+    print(f"AiActionStreamer server ready on port {port} ({startup['ready_s'] * 1000:.1f} ms after actor init)")
 
     try:
-        while True:
-            await asyncio.sleep(3600) 
+        await server_task_future
     except KeyboardInterrupt:
         print("Application shutting down by KeyboardInterrupt...")
     except Exception as e:
@@ -119,8 +401,41 @@ async def main_server_loop():
         print("Ray shut down. Exiting.")
 
 
-if __name__ == "__main__":
+async def serve(**streamer_options):
+    # In-process server until SIGINT/SIGTERM, which stop it cleanly (final snapshot
+    # included) rather than cancelling it mid-shutdown.
+    server = AiActionStreamerServer(**streamer_options)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, lambda: loop.create_task(server.stop_server()))
+    await server.start_server()
+
+
+def main(argv=None):
+    """Command line entry point: python -m ai_action_streamer --help."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AiActionStreamer gRPC server.")
+    parser.add_argument("--host", default="[::]")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--policy-checkpoint", default=None)
+    parser.add_argument("--observation-log-dir", default=None)
+    parser.add_argument("--checkpoint-dir", default=None)
+    parser.add_argument("--checkpoint-interval-s", type=float, default=30.0)
+    parser.add_argument("--no-unix-socket", dest="unix_socket", action="store_false")
+    parser.add_argument("--in-process", action="store_true",
+                        help="serve from this process instead of a Ray actor: no Ray import, no actor restarts")
+    args = vars(parser.parse_args(argv))
+    in_process = args.pop("in_process")
+
     try:
-        asyncio.run(main_server_loop())
+        if in_process:
+            asyncio.run(serve(**args))
+        else:
+            asyncio.run(main_server_loop(**args))
     except KeyboardInterrupt:
         print("Exiting main application script...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Periodic, incremental snapshots of AiActionStreamer's in-memory state.
+
+Components (the fair scheduler, the action broker, the transition assembler)
+implement two methods:
+
+    checkpoint_state(full) -> (meta, build)
+        Called on the event loop. Copies whatever may change afterwards and
+        returns JSON-able `meta` plus `build()`, which runs on the writer
+        thread and returns {name: array} (serialising messages, sorting, ...).
+        With full=False only what changed since the previous call is needed.
+    restore_state(meta, arrays)
+        Applies a full snapshot, or a delta on top of the state restored so far.
+
+and optionally
+
+    snapshot_written(meta, arrays)
+        Called on the capturing thread once a full snapshot is on disk, with the
+        memory-mapped arrays, so state handed to the writer can be swapped for them.
+
+Snapshot files are "<sequence>.full.snap" or "<sequence>.delta.snap" in one
+directory: an 8-byte magic, a little-endian uint64 header length, a JSON header
+({"meta": ..., "arrays": {name: [dtype, shape, offset]}}) and the raw arrays,
+each 64-byte aligned. read_snapshot() memory-maps the file, so restoring costs
+the header parse plus whatever the components copy, not the file size. Files
+are written to a temporary name, fsynced and renamed; a full snapshot deletes
+everything older than itself, and restore() deletes temporary files left by a
+crash mid-write.
+"""
+import asyncio
+import concurrent.futures
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"NFASNAP1"
+_ALIGN = 64
+
+
+def pack_strings(strings):
+    """Encodes a list of str as (uint8 blob, int64 offsets); see unpack_strings."""
+    encoded = [s.encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def unpack_strings(blob, offsets):
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[a:b].decode() for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def pack_messages(messages):
+    """Serialises protobuf messages (or passes bytes through) as (list of chunks, int64 offsets)."""
+    chunks = [m if isinstance(m, bytes) else m.SerializeToString() for m in messages]
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in chunks], out=offsets[1:])
+    return chunks, offsets
+
+
+def unpack_messages(message_class, blob, offsets):
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [message_class.FromString(data[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def write_snapshot(path, meta, arrays):
+    """
+    Writes `arrays` ({name: ndarray, or a list of bytes-like chunks stored as one
+    uint8 array}) atomically to `path`.
+    """
+    layout = {}
+    offset = 0
+    for name, value in arrays.items():
+        if isinstance(value, np.ndarray):
+            dtype, shape, nbytes = value.dtype.str, value.shape, value.nbytes
+        else:
+            dtype, nbytes = "|u1", sum(len(memoryview(c).cast("B")) for c in value)
+            shape = (nbytes,)
+        layout[name] = [dtype, list(shape), offset]
+        offset += -(-nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({"meta": meta, "arrays": layout}).encode()
+    start = -(-(len(MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, value in arrays.items():
+                f.seek(start + layout[name][2])
+                if isinstance(value, np.ndarray):
+                    f.write(np.ascontiguousarray(value).data)
+                else:
+                    for chunk in value:
+                        f.write(chunk)
+            f.truncate(start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def read_snapshot(path):
+    """
+    Returns:
+        tuple: (meta, {name: read-only ndarray backed by a memory map of the file}).
+
+    Raises:
+        ValueError: `path` is not a snapshot file.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a state snapshot")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+    start = -(-(len(MAGIC) + 8 + header_len) // _ALIGN) * _ALIGN
+    size = os.path.getsize(path)
+    data = np.memmap(path, dtype=np.uint8, mode="r") if size > start else np.zeros(0, np.uint8)
+    arrays = {}
+    for name, (dtype, shape, offset) in header["arrays"].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        arrays[name] = data[start + offset:start + offset + count].view(dtype).reshape(shape)
+    return header["meta"], arrays
+
+
+def _component_arrays(name, arrays):
+    prefix = f"{name}/"
+    return {k[len(prefix):]: v for k, v in arrays.items() if k.startswith(prefix)}
+
+
+def _snapshot_files(directory, temporary=False):
+    # (sequence, kind, path) of the snapshots in `directory`, or with temporary=True
+    # of the "<sequence>.<kind>.snap.tmp" files a write in progress (or a crash) left.
+    files = []
+    for name in os.listdir(directory):
+        parts = name.split(".")
+        if temporary:
+            if parts[-1] != "tmp":
+                continue
+            parts = parts[:-1]
+        if len(parts) == 3 and parts[2] == "snap" and parts[1] in ("full", "delta") and parts[0].isdigit():
+            files.append((int(parts[0]), parts[1], os.path.join(directory, name)))
+    return sorted(files)
+
+
+class StateCheckpointer:
+    """
+    Args:
+        directory (str): Snapshot directory (created if missing).
+        components (dict): name -> object implementing checkpoint_state/restore_state.
+        full_every (int): Write a full snapshot after this many deltas.
+    """
+
+    def __init__(self, directory, components, full_every=20):
+        self.directory = directory
+        self.components = components
+        self.full_every = full_every
+        self.sequence = 0
+        self.written = 0
+        self.last_snapshot_s = 0.0
+        self._deltas_since_full = None  # None: the next snapshot must be full
+        self._lock = asyncio.Lock()  # one snapshot() at a time, so a full one is folded back before the next
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        os.makedirs(directory, exist_ok=True)
+
+    def restore(self):
+        """
+        Applies the latest full snapshot and the deltas written after it.
+
+        Returns:
+            int: Sequence number of the last snapshot applied (0 if there was none).
+        """
+        for _, _, path in _snapshot_files(self.directory, temporary=True):
+            os.remove(path)
+        files = _snapshot_files(self.directory)
+        fulls = [i for i, (_, kind, _) in enumerate(files) if kind == "full"]
+        if not fulls:
+            return 0
+        chain = [files[fulls[-1]]]
+        for sequence, kind, path in files[fulls[-1] + 1:]:
+            if kind != "delta" or sequence != chain[-1][0] + 1:
+                break  # a gap means a delta was lost; later ones do not apply
+            chain.append((sequence, kind, path))
+        for sequence, kind, path in chain:
+            meta, arrays = read_snapshot(path)
+            for name, component in self.components.items():
+                if name in meta:
+                    component.restore_state(meta[name], _component_arrays(name, arrays))
+        self.sequence = chain[-1][0]
+        self._deltas_since_full = len(chain) - 1
+        return self.sequence
+
+    def _capture(self, full):
+        if self._deltas_since_full is None:
+            full = True  # a delta needs a full snapshot to apply to
+        elif full is None:
+            full = self._deltas_since_full >= self.full_every
+        metas, builds = {}, {}
+        for name, component in self.components.items():
+            metas[name], builds[name] = component.checkpoint_state(full)
+        self.sequence += 1
+        self._deltas_since_full = 0 if full else self._deltas_since_full + 1
+        kind = "full" if full else "delta"
+        path = os.path.join(self.directory, f"{self.sequence:012d}.{kind}.snap")
+        return path, full, metas, builds
+
+    def _write(self, path, full, metas, builds):
+        start = time.perf_counter()
+        arrays = {}
+        for name, build in builds.items():
+            for key, value in build().items():
+                arrays[f"{name}/{key}"] = value
+        metas["created_unix_s"] = time.time()
+        write_snapshot(path, metas, arrays)
+        if full:
+            sequence = int(os.path.basename(path).split(".")[0])
+            for other_sequence, _, other in _snapshot_files(self.directory):
+                if other_sequence < sequence:
+                    os.remove(other)
+        self.written += 1
+        self.last_snapshot_s = time.perf_counter() - start
+        return path
+
+    def _written(self, path, full):
+        if not full:
+            return path
+        meta, arrays = read_snapshot(path)
+        for name, component in self.components.items():
+            written = getattr(component, "snapshot_written", None)
+            if written is not None and name in meta:
+                written(meta[name], _component_arrays(name, arrays))
+        return path
+
+    def _failed(self):
+        # The changes handed to a lost delta are gone from the components' change
+        # sets, so only a full snapshot is consistent again.
+        self._deltas_since_full = None
+
+    async def snapshot(self, full=None):
+        """
+        Captures state on the running event loop and writes it on the writer thread.
+
+        Args:
+            full (bool): Force a full (True) or delta (False) snapshot; None decides
+                from full_every. A delta is written as a full snapshot when there is
+                no full one for it to follow (first snapshot, after a failed one).
+
+        Returns:
+            str: Path of the snapshot written.
+        """
+        async with self._lock:
+            capture = self._capture(full)
+            try:
+                path = await asyncio.get_running_loop().run_in_executor(self._executor, self._write, *capture)
+            except Exception:
+                self._failed()
+                raise
+            return self._written(path, capture[1])
+
+    def snapshot_now(self, full=None):
+        """Blocking snapshot() for callers outside an event loop."""
+        capture = self._capture(full)
+        try:
+            path = self._executor.submit(self._write, *capture).result()
+        except Exception:
+            self._failed()
+            raise
+        return self._written(path, capture[1])
+
+    def close(self):
+        self._executor.shutdown(wait=True)
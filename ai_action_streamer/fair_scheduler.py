@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class _TenantState:
+    """Book-keeping for one pipeline (tenant) known to the scheduler."""
+
+    __slots__ = (
+        "weight", "last_finish", "queued", "in_flight",
+        "admitted", "wait_total_s", "wait_max_s", "idle_since",
+    )
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.last_finish = 0.0
+        self.queued = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.idle_since = time.monotonic()
+
+
+class WeightedFairScheduler:
+    """
+    Weighted fair queueing in front of the AiActionServicer decision path.
+
+    At most `max_concurrency` decisions run at once. While there are free slots
+    and nobody is waiting, `acquire()` admits immediately without touching the
+    queue, so a single active pipeline pays only a dict lookup and two counter
+    updates (and one clock read on release, to time out idle pipelines). Once
+    the slots are saturated, waiters are tagged with a virtual finish time
+    (start = max(virtual_time, tenant.last_finish), finish = start + 1 / weight)
+    and released smallest finish tag first, as in WFQ / SCFQ, with the virtual
+    clock advancing to the tag of each admitted waiter. A pipeline with weight 2
+    thus gets twice the share of one with weight 1 and a huge run cannot starve
+    small interactive ones.
+
+    Per-pipeline state (and its metrics) is dropped once a pipeline has had no
+    queued or running decision for `idle_ttl_s`, so a long-lived server does not
+    keep every pipeline it has ever seen.
+
+    The scheduler is not thread-safe; use it from the gRPC aio server's event loop.
+
+    Args:
+        max_concurrency (int): Number of decisions allowed to run concurrently.
+        weights (dict): Optional mapping of pipeline_name -> weight (> 0).
+        default_weight (float): Weight for pipelines not listed in `weights`.
+        idle_ttl_s (float): Idle pipelines are forgotten after this long; weights
+            set with set_weight() are kept.
+    """
+
+    def __init__(self, max_concurrency=10, weights=None, default_weight=1.0, idle_ttl_s=3600.0):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        if default_weight <= 0:
+            raise ValueError("default_weight must be > 0")
+        self.max_concurrency = max_concurrency
+        self.default_weight = default_weight
+        self.idle_ttl_s = idle_ttl_s
+        self._weights = {}
+        self._tenants = {}
+        self._in_flight = 0
+        self._virtual_time = 0.0
+        self._heap = []  # (finish_tag, seq, future, tenant_state, enqueued_at)
+        self._seq = itertools.count()
+        self._last_sweep = time.monotonic()
+        for name, weight in (weights or {}).items():
+            self.set_weight(name, weight)
+
+    def set_weight(self, pipeline_name, weight):
+        """Sets (or updates) the weight of a pipeline. Applies to future enqueues."""
+        if weight <= 0:
+            raise ValueError(f"Weight for pipeline '{pipeline_name}' must be > 0, got {weight}")
+        self._weights[pipeline_name] = weight
+        tenant = self._tenants.get(pipeline_name)
+        if tenant is not None:
+            tenant.weight = weight
+
+    def _tenant(self, pipeline_name):
+        tenant = self._tenants.get(pipeline_name)
+        if tenant is None:
+            tenant = _TenantState(self._weights.get(pipeline_name, self.default_weight))
+            self._tenants[pipeline_name] = tenant
+        return tenant
+
+    async def acquire(self, pipeline_name):
+        """Waits for a decision slot on behalf of `pipeline_name`."""
+        tenant = self._tenant(pipeline_name)
+        if self._in_flight < self.max_concurrency and not self._heap:
+            # Fast path: uncontended, no queueing and no clock reads.
+            self._in_flight += 1
+            tenant.in_flight += 1
+            tenant.admitted += 1
+            return
+
+        start = max(self._virtual_time, tenant.last_finish)
+        finish = start + 1.0 / tenant.weight
+        tenant.last_finish = finish
+        tenant.queued += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._seq), future, tenant, time.monotonic()))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just before cancellation; pass it on.
+                self._release_slot(tenant)
+            else:
+                tenant.queued -= 1
+            raise
+
+    def release(self, pipeline_name):
+        """Returns the slot taken by a previous `acquire(pipeline_name)`."""
+        self._release_slot(self._tenants[pipeline_name])
+
+    def _release_slot(self, tenant):
+        tenant.in_flight -= 1
+        self._in_flight -= 1
+        self._dispatch()
+        if not tenant.in_flight and not tenant.queued:
+            tenant.idle_since = now = time.monotonic()
+            self._expire_idle(now)
+
+    def _expire_idle(self, now):
+        if now - self._last_sweep < self.idle_ttl_s / 10:
+            return
+        self._last_sweep = now
+        for name in [k for k, t in self._tenants.items()
+                     if not t.queued and not t.in_flight and now - t.idle_since > self.idle_ttl_s]:
+            del self._tenants[name]
+
+    def _dispatch(self):
+        while self._heap and self._in_flight < self.max_concurrency:
+            finish, _, future, tenant, enqueued_at = heapq.heappop(self._heap)
+            if future.cancelled():
+                continue
+            self._virtual_time = finish
+            waited = time.monotonic() - enqueued_at
+            tenant.queued -= 1
+            tenant.in_flight += 1
+            tenant.admitted += 1
+            tenant.wait_total_s += waited
+            if waited > tenant.wait_max_s:
+                tenant.wait_max_s = waited
+            self._in_flight += 1
+            future.set_result(None)
+        if not self._heap and self._in_flight == 0:
+            # Idle: restart the virtual clock so tags do not grow without bound.
+            self._virtual_time = 0.0
+            for tenant in self._tenants.values():
+                tenant.last_finish = 0.0
+
+    def slot(self, pipeline_name):
+        """Async context manager wrapping acquire()/release()."""
+        return _SchedulerSlot(self, pipeline_name)
+
+    def metrics(self):
+        """
+        Returns a snapshot of per-pipeline scheduler metrics.
+
+        Returns:
+            dict: {
+                "in_flight": int, "queued": int, "max_concurrency": int,
+                "pipelines": {pipeline_name: {"weight", "queue_depth", "in_flight",
+                              "admitted", "mean_wait_ms", "max_wait_ms"}}
+            }
+        Waits are only measured for requests that actually queued; mean_wait_ms
+        is averaged over all admitted requests, so uncontended admits count as 0.
+        Pipelines idle for longer than idle_ttl_s are no longer listed.
+        """
+        pipelines = {}
+        queued_total = 0
+        for name, tenant in self._tenants.items():
+            queued_total += tenant.queued
+            pipelines[name] = {
+                "weight": tenant.weight,
+                "queue_depth": tenant.queued,
+                "in_flight": tenant.in_flight,
+                "admitted": tenant.admitted,
+                "mean_wait_ms": (tenant.wait_total_s / tenant.admitted * 1000.0) if tenant.admitted else 0.0,
+                "max_wait_ms": tenant.wait_max_s * 1000.0,
+            }
+        return {
+            "in_flight": self._in_flight,
+            "queued": queued_total,
+            "max_concurrency": self.max_concurrency,
+            "pipelines": pipelines,
+        }
+
+
+    def checkpoint_state(self, full):
+        # StateCheckpointer protocol: weights and cumulative per-pipeline counters.
+        # Queued and in-flight requests belong to connections that do not survive
+        # a restart, so they are not saved.
+        meta = {
+            "weights": dict(self._weights),
+            "tenants": {name: [t.admitted, t.wait_total_s, t.wait_max_s] for name, t in self._tenants.items()},
+        }
+        return meta, lambda: {}
+
+    def restore_state(self, meta, arrays):
+        for name, weight in meta["weights"].items():
+            self.set_weight(name, weight)
+        for name, (admitted, wait_total_s, wait_max_s) in meta["tenants"].items():
+            tenant = self._tenant(name)
+            tenant.admitted = admitted
+            tenant.wait_total_s = wait_total_s
+            tenant.wait_max_s = wait_max_s
+
+
+class _SchedulerSlot:
+    __slots__ = ("_scheduler", "_pipeline_name")
+
+    def __init__(self, scheduler, pipeline_name):
+        self._scheduler = scheduler
+        self._pipeline_name = pipeline_name
+
+    async def __aenter__(self):
+        await self._scheduler.acquire(self._pipeline_name)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._scheduler.release(self._pipeline_name)
+        return False
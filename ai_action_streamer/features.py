@@ -0,0 +1,109 @@
+"""
+Fixed-size numeric encoding of TaskObservation messages.
+
+Shared by the action service (which assembles training transitions) and the
+training code under ray-multiagent, so both sides agree on the layout.
+"""
+import math
+
+import numpy as np
+
+# Index of each feature in the encoded vector.
+FEATURES = (
+    "is_task_start",
+    "is_task_complete",
+    "status_running",
+    "status_completed",
+    "status_failed",
+    "exit_code_nonzero",
+    "log_duration_s",
+    "log_realtime_s",
+    "cpu_fraction",
+    "log_peak_rss_mb",
+    "log_peak_vmem_mb",
+    "log_read_mb",
+    "log_write_mb",
+)
+OBSERVATION_DIM = len(FEATURES)
+
+# Statuses after which Nextflow will not report further events for a task hash.
+TERMINAL_STATUSES = frozenset(("COMPLETED", "FAILED", "ABORTED"))
+
+# Action codes stored in transitions: MultiAgentPolicy.decide() returns joint codes
+# >= 0 (0 is a real action), so NOOP, which the echo servicer always decides, is
+# negative. Learners should drop transitions with actions < 0.
+ACTION_NOOP = -1
+
+_MB = 1024.0 * 1024.0
+
+
+def parse_cpu_percent(value):
+    """Parses Nextflow's '%cpu' strings (e.g. '150.0%') to a float, 0.0 if unparsable."""
+    if isinstance(value, float):
+        return value  # already numeric, as in CompactObservation
+    if not value:
+        return 0.0
+    try:
+        return float(str(value).rstrip("%"))
+    except ValueError:
+        return 0.0
+
+
+def encode_observation(observation, out=None):
+    """
+    Encodes a TaskObservation (protobuf or object with the same attributes) as float32.
+
+    Args:
+        observation: nf_ai_comms_pb2.TaskObservation or compatible object.
+        out (np.ndarray): Optional float32 array of shape (OBSERVATION_DIM,) to fill.
+
+    Returns:
+        np.ndarray: The encoded observation, shape (OBSERVATION_DIM,).
+    """
+    if out is None:
+        out = np.zeros(OBSERVATION_DIM, dtype=np.float32)
+    event_type = observation.event_type
+    status = observation.status.upper()
+    out[0] = event_type == "task_start"
+    out[1] = event_type == "task_complete"
+    out[2] = status == "RUNNING"
+    out[3] = status == "COMPLETED"
+    out[4] = status in ("FAILED", "ABORTED")
+    out[5] = observation.exit_code != 0
+    out[6] = math.log1p(max(observation.duration_ms, 0) / 1000.0)
+    out[7] = math.log1p(max(observation.realtime_ms, 0) / 1000.0)
+    out[8] = parse_cpu_percent(observation.cpu_percent) / 100.0
+    out[9] = math.log1p(max(observation.peak_rss_bytes, 0) / _MB)
+    out[10] = math.log1p(max(observation.peak_vmem_bytes, 0) / _MB)
+    out[11] = math.log1p(max(observation.read_bytes, 0) / _MB)
+    out[12] = math.log1p(max(observation.write_bytes, 0) / _MB)
+    return out
+
+
+def encode_batch(n, task_start=0, task_complete=0, status_running=0, status_completed=0,
+                 status_failed=0, exit_code=0, duration_ms=0, realtime_ms=0, cpu_percent=0.0,
+                 peak_rss_bytes=0, peak_vmem_bytes=0, read_bytes=0, write_bytes=0):
+    """
+    Vectorized counterpart of encode_observation for simulators.
+
+    Every argument is a scalar or an array of length `n` holding the raw field
+    value (flags as 0/1, cpu_percent as a number such as 150.0).
+
+    Returns:
+        np.ndarray: float32 array of shape (n, OBSERVATION_DIM).
+    """
+    out = np.empty((n, OBSERVATION_DIM), dtype=np.float32)
+    out[:, 0] = task_start
+    out[:, 1] = task_complete
+    out[:, 2] = status_running
+    out[:, 3] = status_completed
+    out[:, 4] = status_failed
+    out[:, 5] = np.asarray(exit_code) != 0
+    out[:, 6] = np.log1p(np.maximum(duration_ms, 0) / 1000.0)
+    out[:, 7] = np.log1p(np.maximum(realtime_ms, 0) / 1000.0)
+    out[:, 8] = np.asarray(cpu_percent, dtype=np.float64) / 100.0
+    out[:, 9] = np.log1p(np.maximum(peak_rss_bytes, 0) / _MB)
+    out[:, 10] = np.log1p(np.maximum(peak_vmem_bytes, 0) / _MB)
+    out[:, 11] = np.log1p(np.maximum(read_bytes, 0) / _MB)
+    out[:, 12] = np.log1p(np.maximum(write_bytes, 0) / _MB)
+    return out
@@ -0,0 +1,62 @@
+"""
+The standard gRPC health service (grpc.health.v1.Health) for the asyncio server.
+
+AiActionStreamer reports NOT_SERVING while it starts and stops and SERVING in
+between, both for the whole server ("") and for nf_ai_comms.AiActionService, so
+clients and probes can wait for readiness instead of sleeping:
+
+    stub = health_pb2_grpc.HealthStub(channel)
+    stub.Check(health_pb2.HealthCheckRequest(service=AI_ACTION_SERVICE))
+
+grpcio-health-checking's generated modules are used when it is installed; the
+copy generated from proto/health.proto otherwise.
+"""
+import asyncio
+
+import grpc
+
+try:
+    from grpc_health.v1 import health_pb2, health_pb2_grpc
+except ImportError:
+    from proto import health_pb2, health_pb2_grpc
+
+AI_ACTION_SERVICE = "nf_ai_comms.AiActionService"
+SERVING = health_pb2.HealthCheckResponse.SERVING
+NOT_SERVING = health_pb2.HealthCheckResponse.NOT_SERVING
+SERVICE_UNKNOWN = health_pb2.HealthCheckResponse.SERVICE_UNKNOWN
+
+
+class HealthServicer(health_pb2_grpc.HealthServicer):
+
+    def __init__(self):
+        self._statuses = {}
+        self._watchers = {}  # service -> set of asyncio.Queue
+
+    def set(self, service, status):
+        """Sets `service`'s status and notifies its Watch streams. Call on the server's event loop."""
+        self._statuses[service] = status
+        for queue in self._watchers.get(service, ()):
+            queue.put_nowait(status)
+
+    def status(self, service=""):
+        return self._statuses.get(service, SERVICE_UNKNOWN)
+
+    async def Check(self, request, context):
+        if request.service not in self._statuses:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"unknown service {request.service!r}")
+        return health_pb2.HealthCheckResponse(status=self._statuses[request.service])
+
+    async def Watch(self, request, context):
+        queue = asyncio.Queue()
+        watchers = self._watchers.setdefault(request.service, set())
+        watchers.add(queue)
+        try:
+            last = self.status(request.service)
+            yield health_pb2.HealthCheckResponse(status=last)
+            while True:
+                status = await queue.get()
+                if status != last:  # the protocol only sends changes
+                    last = status
+                    yield health_pb2.HealthCheckResponse(status=status)
+        finally:
+            watchers.discard(queue)
@@ -0,0 +1,535 @@
+"""
+Append-only, segmented, memory-mapped log of TaskObservation / Action messages.
+
+On-disk layout: a directory of segment files named `<first_seq:020d>.wal`. Each
+segment is preallocated to `segment_bytes` (posix_fallocate, so a full disk fails
+the allocation instead of a later write through the map), memory-mapped, and
+filled with records:
+
+    header  <IIQdBxH>  payload_len, crc32(event_id + payload), seq, timestamp, kind, event_id_len
+    event_id           utf-8 bytes (the observation event_id, also for actions)
+    payload            serialized protobuf
+
+A zero `kind` byte marks the end of the written region of the active segment.
+Sealed segments are truncated to their used length and get an index file,
+`<first_seq:020d>.idx`: record timestamps and offsets in log order, and
+(event_id hash, offset) pairs sorted by hash. Index files are memory-mapped on
+open, so opening a log and looking up event_ids cost neither a scan of its
+history nor memory per record; only the active segment is scanned and indexed
+in memory. `max_segments` bounds the history kept on disk.
+
+Writers (the RPC path) only append to an in-memory deque. A background thread
+drains it, serializes the messages, writes them into the mapped segment and issues
+one msync per batch (group commit). Errors in the writer (e.g. ENOSPC) are counted
+in `write_errors`, printed, and retried after `retry_interval_s`; the records wait
+in the deque meanwhile. On open, segments are scanned, CRCs verified and any torn
+tail left by a crash is discarded.
+
+`LogReader` iterates segments through read-only mmaps and yields payloads as
+memoryview slices, so offline training and replay read at disk speed without
+copying.
+"""
+import bisect
+import collections
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+
+KIND_OBSERVATION = 1
+KIND_ACTION = 2
+
+_HEADER = struct.Struct("<IIQdBxH")
+_SEGMENT_SUFFIX = ".wal"
+_INDEX_SUFFIX = ".idx"
+_INDEX_HEADER = struct.Struct("<8sQQ")  # magic, record count, sealed segment size
+_INDEX_MAGIC = b"NFAWIDX1"
+
+LogRecord = collections.namedtuple("LogRecord", ["seq", "timestamp", "kind", "event_id", "payload"])
+
+
+def decode_record(record):
+    """Parses a LogRecord's payload into an nf_ai_comms_pb2 TaskObservation or Action."""
+    from proto import nf_ai_comms_pb2
+    message_cls = nf_ai_comms_pb2.TaskObservation if record.kind == KIND_OBSERVATION else nf_ai_comms_pb2.Action
+    return message_cls.FromString(bytes(record.payload))
+
+
+def _segment_paths(directory):
+    names = sorted(n for n in os.listdir(directory) if n.endswith(_SEGMENT_SUFFIX))
+    return [os.path.join(directory, n) for n in names]
+
+
+def _index_path(segment_path):
+    return segment_path[:-len(_SEGMENT_SUFFIX)] + _INDEX_SUFFIX
+
+
+def _key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def _preallocate(fd, size):
+    # A truncate()d file is sparse: on a full disk the first store into one of its
+    # holes through the mmap raises SIGBUS and takes the whole server down.
+    if hasattr(os, "posix_fallocate"):
+        os.posix_fallocate(fd, 0, size)
+    elif os.fstat(fd).st_size < size:
+        os.ftruncate(fd, size)
+
+
+def _scan(buf, start, end, verify=True):
+    """Yields (offset, seq, timestamp, kind, event_id_bytes, payload_view) until end or first bad record."""
+    view = memoryview(buf)
+    pos = start
+    header_size = _HEADER.size
+    try:
+        while pos + header_size <= end:
+            payload_len, crc, seq, timestamp, kind, key_len = _HEADER.unpack_from(buf, pos)
+            if kind == 0:
+                return
+            body_start = pos + header_size
+            body_end = body_start + key_len + payload_len
+            if kind not in (KIND_OBSERVATION, KIND_ACTION) or body_end > end:
+                return
+            body = view[body_start:body_end]
+            if verify and zlib.crc32(body) != crc:
+                body.release()
+                return
+            yield pos, seq, timestamp, kind, bytes(body[:key_len]), body[key_len:]
+            pos = body_end
+    finally:
+        view.release()
+
+
+def _write_index(segment_path, sealed_size, timestamps, offsets, keyed_offsets):
+    """Writes a sealed segment's index; keyed_offsets is a list of (event_id hash, offset)."""
+    keyed_offsets.sort()
+    path = _index_path(segment_path)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, len(offsets), sealed_size))
+        f.write(array("d", timestamps).tobytes())
+        f.write(array("Q", offsets).tobytes())
+        f.write(array("Q", (h for h, _ in keyed_offsets)).tobytes())
+        f.write(array("Q", (o for _, o in keyed_offsets)).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _load_index(segment_path, sealed_size):
+    """
+    Returns:
+        tuple: (timestamps, offsets, key_hashes, key_offsets) as memoryviews of the
+            mapped index file, or None if it is missing or does not match the segment.
+    """
+    try:
+        with open(_index_path(segment_path), "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    view = memoryview(mm)
+    magic, count, indexed_size = _INDEX_HEADER.unpack_from(view)
+    if magic != _INDEX_MAGIC or indexed_size != sealed_size or len(view) != _INDEX_HEADER.size + 32 * count:
+        view.release()
+        mm.close()
+        return None
+    arrays = []
+    for i, fmt in enumerate("dQQQ"):
+        start = _INDEX_HEADER.size + 8 * count * i
+        arrays.append(view[start:start + 8 * count].cast(fmt))
+    return tuple(arrays)
+
+
+class _Segment:
+    __slots__ = ("first_seq", "path", "timestamps", "offsets", "by_event_id", "key_hashes", "key_offsets")
+
+    def __init__(self, first_seq, path):
+        self.first_seq = first_seq
+        self.path = path
+        # In memory while the segment is active, memoryviews of its index file once sealed.
+        self.timestamps = array("d")
+        self.offsets = array("Q")
+        self.by_event_id = {}  # event_id -> [offset]; None once sealed and indexed
+        self.key_hashes = None
+        self.key_offsets = None
+
+    def set_index(self, index):
+        self.timestamps, self.offsets, self.key_hashes, self.key_offsets = index
+        self.by_event_id = None
+
+    def lookup_offsets(self, event_id, key_hash):
+        by_event_id = self.by_event_id
+        if by_event_id is not None:
+            return by_event_id.get(event_id, ())
+        lo = bisect.bisect_left(self.key_hashes, key_hash)
+        hi = bisect.bisect_right(self.key_hashes, key_hash, lo)
+        return self.key_offsets[lo:hi].tolist()
+
+
+class ObservationLog:
+    """
+    Write-ahead log for (TaskObservation, Action) pairs.
+
+    Args:
+        directory (str): Directory holding the segment files (created if missing).
+        segment_bytes (int): Preallocated size of each segment; larger records are
+            dropped by the writer (counted in `dropped`, reported as a write error).
+        commit_interval_s (float): Max time a record waits in memory before the
+            writer thread picks it up; all records drained together share one msync.
+        max_pending (int): Records buffered in memory before new appends are dropped
+            (counted in `dropped`) rather than blocking the RPC path.
+        max_segments (int): Keep at most this many segments (the active one
+            included), deleting the oldest when a segment is sealed; None keeps all.
+        retry_interval_s (float): Wait after a writer error before retrying.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, commit_interval_s=0.005, max_pending=100_000,
+                 max_segments=None, retry_interval_s=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.commit_interval_s = commit_interval_s
+        self.max_pending = max_pending
+        self.max_segments = max_segments
+        self.retry_interval_s = retry_interval_s
+        self.write_errors = 0
+        self.last_error = None
+        self._append_lock = threading.Lock()
+        self._accepted = 0
+        self._rejected = 0  # appends refused at max_pending
+        self._handled = 0  # written, or lost in the writer
+        self._lost = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self._pending = collections.deque()
+        self._segments = []
+        self._next_seq = 1
+        self._committed_seq = 0
+        self._commit_cond = threading.Condition()
+        self._stop = threading.Event()
+        self._file = None
+        self._mm = None
+        self._pos = 0
+
+        self._recover()
+        self._writer = threading.Thread(target=self._writer_loop, name="ObservationLogWriter", daemon=True)
+        self._writer.start()
+
+    # ----------------------------------------------------------------- RPC path
+    def append(self, kind, message, event_id):
+        """Queues one message. Cheap enough to call inline from an RPC handler."""
+        record = (kind, message, event_id, time.time())
+        # RPC threads share these counters; the writer never takes this lock, so an
+        # append does not wait behind a commit.
+        with self._append_lock:
+            if len(self._pending) >= self.max_pending:
+                self._rejected += 1
+                return
+            self._accepted += 1
+            self._pending.append(record)
+
+    def append_pair(self, observation, action):
+        """Queues an observation and the action decided for it."""
+        self.append(KIND_OBSERVATION, observation, observation.event_id)
+        self.append(KIND_ACTION, action, observation.event_id)
+
+    # ------------------------------------------------------------------ queries
+    def sync(self, timeout=None):
+        """
+        Blocks until everything appended so far has been handled by the writer.
+
+        Returns:
+            bool: False on timeout, or if the writer lost a record meanwhile.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._commit_cond:
+            target = self._accepted
+            lost = self._lost
+            while self._handled < target and not self._stop.is_set():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._commit_cond.wait(remaining)
+            return self._lost == lost
+
+    def lookup(self, event_id):
+        """Returns the committed LogRecords (copies) written for an observation event_id."""
+        key_hash = _key_hash(event_id.encode())
+        records = []
+        for segment in list(self._segments):
+            for offset in segment.lookup_offsets(event_id, key_hash):
+                record = self._read_at(segment, offset)
+                if record.event_id == event_id:  # sealed segments match on a hash
+                    records.append(record)
+        return records
+
+    def records_between(self, start_ts, end_ts):
+        """Yields committed LogRecords (copies) with start_ts <= timestamp < end_ts."""
+        for segment in list(self._segments):
+            timestamps, offsets = segment.timestamps, segment.offsets
+            if not len(timestamps) or timestamps[-1] < start_ts or timestamps[0] >= end_ts:
+                continue
+            lo = bisect.bisect_left(timestamps, start_ts)
+            hi = bisect.bisect_left(timestamps, end_ts)
+            for i in range(lo, hi):
+                yield self._read_at(segment, offsets[i])
+
+    @property
+    def committed_seq(self):
+        return self._committed_seq
+
+    @property
+    def dropped(self):
+        """Records refused at max_pending plus records the writer could not write."""
+        return self._rejected + self._lost
+
+    def close(self):
+        """Flushes pending records, stops the writer and releases the active segment."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._writer.join()
+        try:
+            self._drain()
+        except Exception as e:
+            self._report(e)
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+        with self._commit_cond:
+            self._commit_cond.notify_all()
+
+    # ---------------------------------------------------------------- internals
+    def _read_at(self, segment, offset):
+        with open(segment.path, "rb") as f:
+            header = os.pread(f.fileno(), _HEADER.size, offset)
+            payload_len, _, seq, timestamp, kind, key_len = _HEADER.unpack(header)
+            body = os.pread(f.fileno(), key_len + payload_len, offset + _HEADER.size)
+        return LogRecord(seq, timestamp, kind, body[:key_len].decode(), body[key_len:])
+
+    @staticmethod
+    def _index(segment, offset, timestamp, event_id):
+        segment.timestamps.append(timestamp)
+        segment.offsets.append(offset)
+        segment.by_event_id.setdefault(event_id, []).append(offset)
+
+    def _recover(self):
+        paths = _segment_paths(self.directory)
+        for i, path in enumerate(paths):
+            first_seq = int(os.path.basename(path)[:-len(_SEGMENT_SUFFIX)])
+            segment = _Segment(first_seq, path)
+            self._segments.append(segment)
+            is_last = i == len(paths) - 1
+            if not is_last:
+                index = _load_index(path, os.path.getsize(path))
+                if index is not None:
+                    segment.set_index(index)
+                    self._next_seq = first_seq + len(index[1])
+                    continue
+            with open(path, "r+b" if is_last else "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                keyed_offsets = []
+                end = 0
+                if size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        for offset, seq, timestamp, _, key, payload in _scan(mm, 0, size):
+                            payload.release()
+                            if is_last:
+                                self._index(segment, offset, timestamp, key.decode())
+                            else:
+                                segment.timestamps.append(timestamp)
+                                segment.offsets.append(offset)
+                                keyed_offsets.append((_key_hash(key), offset))
+                            self._next_seq = seq + 1
+                            end = self._record_end(mm, offset)
+                if is_last and end < size:
+                    # Discard a torn or corrupt tail left by a crash.
+                    f.seek(end)
+                    f.write(b"\0" * min(size - end, _HEADER.size))
+            if is_last:
+                self._open_segment(segment, end)
+            else:
+                # Sealed before this version, or crashed before writing the index.
+                _write_index(path, size, segment.timestamps, segment.offsets, keyed_offsets)
+                segment.set_index(_load_index(path, size))
+        self._committed_seq = self._next_seq - 1
+        if self._mm is None:
+            self._start_segment()
+        self._apply_retention()
+
+    @staticmethod
+    def _record_end(buf, offset):
+        payload_len, _, _, _, _, key_len = _HEADER.unpack_from(buf, offset)
+        return offset + _HEADER.size + key_len + payload_len
+
+    def _open_segment(self, segment, pos):
+        self._file = open(segment.path, "r+b")
+        _preallocate(self._file.fileno(), self.segment_bytes)
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self._pos = pos
+
+    def _start_segment(self):
+        path = os.path.join(self.directory, f"{self._next_seq:020d}{_SEGMENT_SUFFIX}")
+        segment = _Segment(self._next_seq, path)
+        try:
+            with open(path, "wb") as f:
+                _preallocate(f.fileno(), self.segment_bytes)
+            self._open_segment(segment, 0)
+        except OSError:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            raise
+        self._segments.append(segment)
+
+    def _seal_segment(self):
+        segment = self._segments[-1]
+        self._mm.flush()
+        self._mm.close()
+        self._mm = None
+        self._file.truncate(self._pos)
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        try:
+            keyed_offsets = [(_key_hash(event_id.encode()), offset)
+                             for event_id, offsets in segment.by_event_id.items() for offset in offsets]
+            _write_index(segment.path, self._pos, segment.timestamps, segment.offsets, keyed_offsets)
+            segment.set_index(_load_index(segment.path, self._pos))
+        except OSError as e:
+            self._report(e)  # keeps the in-memory index; the next open rebuilds the file
+        self._start_segment()
+        self._apply_retention()
+
+    def _apply_retention(self):
+        if self.max_segments is None:
+            return
+        while len(self._segments) > max(1, self.max_segments):
+            segment = self._segments.pop(0)
+            for path in (segment.path, _index_path(segment.path)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _report(self, error):
+        self.write_errors += 1
+        self.last_error = repr(error)
+        print(f"ObservationLog({self.directory}) writer error: {error!r}")
+
+    def _writer_loop(self):
+        while not self._stop.is_set():
+            if not self._pending:
+                self._stop.wait(self.commit_interval_s)
+                continue
+            try:
+                self._drain()
+            except Exception as e:
+                # The record being written stays queued; later appends are dropped
+                # once max_pending is reached.
+                self._report(e)
+                self._stop.wait(self.retry_interval_s)
+
+    def _lose_head(self, error):
+        self._pending.popleft()
+        self._report(error)
+        with self._commit_cond:
+            self._lost += 1
+            self._handled += 1
+            self._commit_cond.notify_all()
+
+    def _drain(self):
+        written = 0
+        try:
+            while self._pending:
+                kind, message, event_id, timestamp = self._pending[0]
+                try:
+                    key = event_id.encode()
+                    payload = message.SerializeToString()
+                except Exception as e:
+                    self._lose_head(e)
+                    continue
+                record_len = _HEADER.size + len(key) + len(payload)
+                if record_len > self.segment_bytes:
+                    # Sized here rather than in append(): ByteSize() serializes, which
+                    # would double the cost of the RPC path.
+                    self._lose_head(ValueError(f"record of {record_len} bytes does not fit in a "
+                                               f"{self.segment_bytes}-byte segment"))
+                    continue
+                if self._mm is None:
+                    self._start_segment()  # the previous attempt failed
+                elif self._pos + record_len > self.segment_bytes:
+                    self._seal_segment()
+                segment = self._segments[-1]
+                body_start = self._pos + _HEADER.size
+                self._mm[body_start:body_start + len(key)] = key
+                self._mm[body_start + len(key):body_start + len(key) + len(payload)] = payload
+                crc = zlib.crc32(payload, zlib.crc32(key))
+                _HEADER.pack_into(self._mm, self._pos, len(payload), crc, self._next_seq, timestamp, kind, len(key))
+                self._index(segment, self._pos, timestamp, event_id)
+                self._pos += record_len
+                self._next_seq += 1
+                self._pending.popleft()
+                written += 1
+        finally:
+            if written:
+                try:
+                    if self._mm is not None:
+                        self._mm.flush()  # One msync per batch: group commit.
+                finally:
+                    with self._commit_cond:
+                        self._committed_seq = self._next_seq - 1
+                        self._handled += written
+                        self._commit_cond.notify_all()
+
+
+class LogReader:
+    """
+    Zero-copy sequential reader over the segments of an ObservationLog directory.
+
+    Payloads are memoryview slices of a read-only mmap and are only valid while the
+    iteration stays on their segment; copy with bytes() (or use decode_record) to
+    keep them. Safe to use while a writer is appending: iteration stops at the last
+    fully written record.
+
+    Args:
+        directory (str): ObservationLog directory.
+        verify (bool): Check record CRCs while iterating.
+    """
+
+    def __init__(self, directory, verify=True):
+        self.directory = directory
+        self.verify = verify
+
+    def segments(self):
+        return _segment_paths(self.directory)
+
+    def __iter__(self):
+        for path in self.segments():
+            yield from self.iter_segment(path)
+
+    def iter_segment(self, path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for _, seq, timestamp, kind, key, payload in _scan(mm, 0, size, self.verify):
+                yield LogRecord(seq, timestamp, kind, key.decode(), payload)
+        finally:
+            try:
+                mm.close()
+            except BufferError:
+                # A caller still holds a payload view; the map is freed with it.
+                pass
@@ -0,0 +1,144 @@
+"""
+Multi-agent linear softmax policy and its checkpoint format.
+
+One agent per decision domain, each a linear softmax over the encoded
+TaskObservation (see features.py). Checkpoints are single .npz files:
+
+    meta                    JSON: {"format": 1, "version", "features", "agents": {name: [action names]}}
+    <agent>/weights         float32 (OBSERVATION_DIM, n_actions)
+    <agent>/bias            float32 (n_actions,)
+
+ray-multiagent's trainer writes them and AiActionStreamer loads them via
+`policy_checkpoint=`.
+"""
+import hashlib
+import json
+
+import numpy as np
+
+try:
+    from ai_action_streamer.features import FEATURES, OBSERVATION_DIM, encode_observation
+except ImportError:
+    from features import FEATURES, OBSERVATION_DIM, encode_observation
+
+CHECKPOINT_FORMAT = 1
+
+# Decision domains and their discrete actions. The simulator in
+# state_simulation/cluster_env.py interprets these names.
+DEFAULT_AGENTS = {
+    "executor": ("local", "cluster", "cloud_spot"),
+    "memory": ("scale_0.5", "scale_0.75", "scale_1.0", "scale_1.5", "scale_2.0"),
+    "retry": ("give_up", "retry_same", "retry_double_memory"),
+}
+
+
+class MultiAgentPolicy:
+    """
+    Args:
+        agents (dict): agent name -> tuple of action names.
+        params (dict): agent name -> (weights, bias); zeros (uniform policy) if None.
+        version (str): Free-form policy version recorded in checkpoints.
+    """
+
+    def __init__(self, agents=None, params=None, version="0"):
+        self.agents = {name: tuple(actions) for name, actions in (agents or DEFAULT_AGENTS).items()}
+        self.version = str(version)
+        self.params = {}
+        for name, actions in self.agents.items():
+            if params and name in params:
+                weights, bias = params[name]
+                self.params[name] = (np.asarray(weights, np.float32), np.asarray(bias, np.float32))
+            else:
+                self.params[name] = (
+                    np.zeros((OBSERVATION_DIM, len(actions)), np.float32),
+                    np.zeros(len(actions), np.float32),
+                )
+
+    def probabilities(self, agent, obs):
+        """Action probabilities for a batch of encoded observations, shape (n, n_actions)."""
+        weights, bias = self.params[agent]
+        logits = obs @ weights + bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def act(self, agent, obs, rng=None, greedy=False):
+        """Samples (or, if greedy, takes the argmax) action indices for a batch."""
+        probs = self.probabilities(agent, obs)
+        if greedy:
+            return probs.argmax(axis=1)
+        rng = rng if rng is not None else np.random.default_rng()
+        # Inverse-CDF sampling, vectorized over the batch.
+        draws = rng.random((probs.shape[0], 1))
+        return np.minimum((probs.cumsum(axis=1) < draws).sum(axis=1), probs.shape[1] - 1)
+
+    def decide(self, observation):
+        """
+        Greedy decisions of every agent for one TaskObservation.
+
+        Returns:
+            (str, int): action_details string ("executor=cluster;memory=scale_1.0;...")
+            and the joint action code (mixed-radix index over all agents).
+        """
+        obs = encode_observation(observation)[None, :]
+        parts = []
+        code = 0
+        for name, actions in self.agents.items():
+            index = int(self.act(name, obs, greedy=True)[0])
+            parts.append(f"{name}={actions[index]}")
+            code = code * len(actions) + index
+        return ";".join(parts), code
+
+    def split_action_code(self, code):
+        """
+        Inverse of the joint code returned by decide().
+
+        Returns:
+            dict: agent name -> action index, or None for ACTION_NOOP (and any code < 0).
+        """
+        if code < 0:
+            return None
+        indices = {}
+        for name, actions in reversed(self.agents.items()):
+            code, indices[name] = divmod(code, len(actions))
+        return {name: indices[name] for name in self.agents}
+
+    def get_params(self):
+        return {name: (w.copy(), b.copy()) for name, (w, b) in self.params.items()}
+
+    def set_params(self, params):
+        for name, (weights, bias) in params.items():
+            self.params[name] = (np.asarray(weights, np.float32), np.asarray(bias, np.float32))
+
+    def fingerprint(self):
+        """SHA-256 of the agents and their parameters; unlike `version`, unique per policy."""
+        digest = hashlib.sha256(json.dumps(list(self.agents.items())).encode())
+        for weights, bias in self.params.values():
+            digest.update(np.ascontiguousarray(weights, np.float32).tobytes())
+            digest.update(np.ascontiguousarray(bias, np.float32).tobytes())
+        return digest.hexdigest()
+
+    def save(self, path):
+        meta = {
+            "format": CHECKPOINT_FORMAT,
+            "version": self.version,
+            "features": list(FEATURES),
+            "agents": {name: list(actions) for name, actions in self.agents.items()},
+        }
+        arrays = {"meta": np.array(json.dumps(meta))}
+        for name, (weights, bias) in self.params.items():
+            arrays[f"{name}/weights"] = weights
+            arrays[f"{name}/bias"] = bias
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("format") != CHECKPOINT_FORMAT:
+                raise ValueError(f"Unsupported policy checkpoint format {meta.get('format')} in {path}")
+            if tuple(meta["features"]) != FEATURES:
+                raise ValueError(f"Checkpoint {path} was trained on a different observation encoding")
+            params = {name: (data[f"{name}/weights"], data[f"{name}/bias"]) for name in meta["agents"]}
+        return cls(agents=meta["agents"], params=params, version=meta["version"])
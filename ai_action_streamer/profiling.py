@@ -0,0 +1,255 @@
+"""
+On-demand profiling of the AiActionStreamer event loop, behind the Profile RPC.
+
+A Profiler exists only while a profile runs. It samples event-loop lag from a
+task that sleeps LAG_INTERVAL_S and records how late it wakes up, times the
+servicer's handlers (wall time from call to return, CPU time of the steps they
+run on the loop), and optionally runs tracemalloc and cProfile on the loop
+thread. stop() packs everything into a zip archive:
+
+    summary.json     loop lag, per-handler times, tracemalloc totals and top-N
+    profile.pstats   cProfile data (pstats.Stats("profile.pstats"))
+    profile.txt      cProfile top-N by cumulative time
+    tracemalloc.txt  top-N allocation sites still alive at the end
+
+Handlers decorated with @profiled check the servicer's `profiler` attribute and
+otherwise run untouched, so nothing is measured or traced between profiles.
+
+Download a profile with:
+    python -m ai_action_streamer.profiling [--target localhost:50051] [--seconds 10] [-o DIR]
+"""
+import asyncio
+import cProfile
+import datetime
+import functools
+import inspect
+import io
+import json
+import marshal
+import os
+import pstats
+import time
+import tracemalloc
+import types
+import zipfile
+
+import grpc
+
+from proto import nf_ai_comms_pb2
+from proto import nf_ai_comms_pb2_grpc
+
+LAG_INTERVAL_S = 0.01
+MAX_DURATION_S = 60.0
+CHUNK_BYTES = 1 << 20
+
+
+@types.coroutine
+def _cpu_timed(awaitable, handler):
+    # Drives `awaitable` the way `await` would, adding the CPU time of each step to
+    # handler["cpu_s"]; the time spent suspended belongs to other tasks.
+    it = awaitable.__await__()
+    value, error = None, None
+    while True:
+        start = time.thread_time()
+        try:
+            yielded = it.send(value) if error is None else it.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            handler["cpu_s"] += time.thread_time() - start
+        try:
+            value, error = (yield yielded), None
+        except GeneratorExit:
+            it.close()
+            raise
+        except BaseException as e:
+            value, error = None, e
+
+
+def profiled(method):
+    """
+    Decorates an async servicer handler (coroutine or async generator) so the
+    servicer's running Profiler, if any, times its calls.
+    """
+    name = method.__name__
+    if inspect.isasyncgenfunction(method):
+        @functools.wraps(method)
+        async def stream_wrapper(self, request, context):
+            profiler = self.profiler
+            if profiler is None:
+                async for item in method(self, request, context):
+                    yield item
+                return
+            handler, start = profiler.handler_started(name)
+            stream = method(self, request, context)
+            try:
+                while True:
+                    try:
+                        item = await _cpu_timed(stream.__anext__(), handler)
+                    except StopAsyncIteration:
+                        break
+                    handler["messages"] += 1
+                    yield item
+            except BaseException:
+                handler["errors"] += 1
+                raise
+            finally:
+                await stream.aclose()
+                profiler.handler_finished(handler, start)
+        return stream_wrapper
+
+    @functools.wraps(method)
+    async def wrapper(self, request, context):
+        profiler = self.profiler
+        if profiler is None:
+            return await method(self, request, context)
+        handler, start = profiler.handler_started(name)
+        try:
+            return await _cpu_timed(method(self, request, context), handler)
+        except BaseException:
+            handler["errors"] += 1
+            raise
+        finally:
+            profiler.handler_finished(handler, start)
+    return wrapper
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+class Profiler:
+    """
+    Args:
+        top_n (int): Rows of tracemalloc and cProfile output.
+        cprofile (bool): Run cProfile on the loop thread.
+        trace_allocations (bool): Run tracemalloc (unless something else already does).
+    """
+
+    def __init__(self, top_n=25, cprofile=True, trace_allocations=True):
+        self.top_n = top_n
+        self.handlers = {}
+        self.lags_s = []
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._trace_allocations = trace_allocations
+        self._started_tracemalloc = False
+        self._lag_task = None
+        self._started = None
+
+    def start(self, loop):
+        self._started = (time.time(), time.perf_counter())
+        if self._trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._lag_task = loop.create_task(self._sample_lag())
+        if self._cprofile is not None:
+            self._cprofile.enable()  # profiles the calling thread, i.e. the loop
+
+    async def _sample_lag(self):
+        clock = time.perf_counter
+        while True:
+            expected = clock() + LAG_INTERVAL_S
+            await asyncio.sleep(LAG_INTERVAL_S)
+            self.lags_s.append(clock() - expected)
+
+    def handler_started(self, name):
+        handler = self.handlers.get(name)
+        if handler is None:
+            handler = self.handlers[name] = {"calls": 0, "completed": 0, "errors": 0, "messages": 0,
+                                             "wall_s": 0.0, "wall_max_s": 0.0, "cpu_s": 0.0}
+        handler["calls"] += 1
+        return handler, time.perf_counter()
+
+    def handler_finished(self, handler, start):
+        wall = time.perf_counter() - start
+        handler["completed"] += 1
+        handler["wall_s"] += wall
+        handler["wall_max_s"] = max(handler["wall_max_s"], wall)
+
+    def stop(self):
+        """
+        Stops all instrumentation and builds the report.
+
+        Returns:
+            tuple: (suggested file name, zip archive bytes).
+        """
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self._lag_task.cancel()
+        files = {}
+        allocations = None
+        if tracemalloc.is_tracing() and self._trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:self.top_n]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            allocations = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top": [{"where": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+                        for stat in top],
+            }
+            files["tracemalloc.txt"] = "\n".join(str(stat) for stat in top) + "\n"
+        if self._cprofile is not None:
+            self._cprofile.create_stats()
+            files["profile.pstats"] = marshal.dumps(self._cprofile.stats)
+            text = io.StringIO()
+            pstats.Stats(self._cprofile, stream=text).sort_stats("cumulative").print_stats(self.top_n)
+            files["profile.txt"] = text.getvalue()
+
+        started_unix_s, started = self._started
+        lags = sorted(self.lags_s)
+        summary = {
+            "started": datetime.datetime.fromtimestamp(started_unix_s, datetime.timezone.utc).isoformat(),
+            "duration_s": time.perf_counter() - started,
+            "loop_lag_ms": {
+                "interval_ms": LAG_INTERVAL_S * 1000,
+                "samples": len(lags),
+                "mean": sum(lags) / len(lags) * 1000 if lags else 0.0,
+                "p50": _percentile(lags, 0.50) * 1000,
+                "p99": _percentile(lags, 0.99) * 1000,
+                "max": lags[-1] * 1000 if lags else 0.0,
+            },
+            "handlers": self.handlers,
+            "tracemalloc": allocations,
+        }
+        files["summary.json"] = json.dumps(summary, indent=2)
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, content in files.items():
+                zf.writestr(name, content)
+        stamp = datetime.datetime.fromtimestamp(started_unix_s, datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        return f"streamer-profile-{stamp}.zip", archive.getvalue()
+
+
+def download_profile(target, directory=".", duration_s=10.0, **request_options):
+    """
+    Runs the Profile RPC against a server and saves the archive in `directory`.
+
+    Returns:
+        str: Path of the saved archive.
+    """
+    request = nf_ai_comms_pb2.ProfileRequest(duration_s=duration_s, **request_options)
+    with grpc.insecure_channel(target) as channel:
+        chunks = list(nf_ai_comms_pb2_grpc.AiActionServiceStub(channel).Profile(request))
+    path = os.path.join(directory, chunks[0].filename)
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk.data)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile a running AiActionStreamer and save the report.")
+    parser.add_argument("--target", default="localhost:50051")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--top-n", type=int, default=0)
+    parser.add_argument("--skip-cprofile", action="store_true")
+    parser.add_argument("--skip-tracemalloc", action="store_true")
+    parser.add_argument("-o", "--output-dir", default=".")
+    args = parser.parse_args()
+    print(download_profile(args.target, args.output_dir, args.seconds, top_n=args.top_n,
+                           skip_cprofile=args.skip_cprofile, skip_tracemalloc=args.skip_tracemalloc))
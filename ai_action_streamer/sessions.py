@@ -0,0 +1,225 @@
+"""
+Server-side string intern tables behind OpenSession / SendCompactObservation.
+
+A Nextflow run registers the strings it keeps repeating (pipeline, process and
+task names, event types, statuses) once per session, then sends
+CompactTaskObservation messages that carry small integer ids and a numeric
+epoch timestamp instead. resolve() wraps them in a CompactObservation, which
+reads like a TaskObservation to the decision path, observation log and
+transition assembly without building one on the RPC path; expand() builds the
+equivalent TaskObservation.
+
+Ids are per session and start at 1 (0 means "unset"). Session handles are
+random, so a client holding a handle from before a server restart gets an
+unknown-session error and reopens instead of silently reading another run's
+strings. Clients close their session at the end of a run (CloseSession);
+sessions idle for longer than idle_timeout_s are dropped in case they don't.
+"""
+import datetime
+import operator
+import secrets
+import threading
+import time
+
+from proto import nf_ai_comms_pb2
+
+
+_DAY_CACHE = {}
+
+
+def format_epoch_ms(epoch_ms):
+    """1704067200123 -> '2024-01-01T00:00:00.123Z' (the timestamp_iso format nf_client sends)."""
+    days, ms = divmod(epoch_ms, 86_400_000)
+    date = _DAY_CACHE.get(days)
+    if date is None:
+        if len(_DAY_CACHE) > 1024:
+            _DAY_CACHE.clear()
+        date = _DAY_CACHE[days] = (datetime.date(1970, 1, 1) + datetime.timedelta(days=days)).isoformat()
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{date}T{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}Z"
+
+
+def _compact_field(name):
+    return property(operator.attrgetter(f"compact.{name}"))
+
+
+class CompactObservation:
+    """
+    Read-only TaskObservation stand-in for a resolved CompactTaskObservation.
+
+    Interned strings and the event_id are resolved up front; timestamp_iso is
+    formatted on access and the other fields are read from the compact message. cpu_percent is the compact float (63.5), not the "63.5%" string.
+    SerializeToString() serializes the equivalent TaskObservation, so the
+    observation log and checkpoints store the same bytes as for a full message.
+    """
+
+    __slots__ = ("compact", "event_id", "event_type", "pipeline_name", "process_name", "task_name", "status",
+                 "_expanded")
+
+    def __init__(self, compact, event_type, pipeline_name, process_name, task_name, status):
+        self.compact = compact
+        self.event_id = compact.event_id or f"{pipeline_name}-{compact.task_id_num}-{event_type}"
+        self.event_type = event_type
+        self.pipeline_name = pipeline_name
+        self.process_name = process_name
+        self.task_name = task_name
+        self.status = status
+        self._expanded = None
+
+    # Fields stored as-is, read through C-level getters (a Python __getattr__ costs
+    # ~1 us per field, more than parsing the whole message).
+    task_id_num = _compact_field("task_id_num")
+    task_hash = _compact_field("task_hash")
+    native_id = _compact_field("native_id")
+    exit_code = _compact_field("exit_code")
+    duration_ms = _compact_field("duration_ms")
+    realtime_ms = _compact_field("realtime_ms")
+    cpu_percent = _compact_field("cpu_percent")
+    peak_rss_bytes = _compact_field("peak_rss_bytes")
+    peak_vmem_bytes = _compact_field("peak_vmem_bytes")
+    read_bytes = _compact_field("read_bytes")
+    write_bytes = _compact_field("write_bytes")
+
+    @property
+    def timestamp_iso(self):
+        epoch_ms = self.compact.timestamp_epoch_ms
+        return format_epoch_ms(epoch_ms) if epoch_ms else ""
+
+    def to_observation(self):
+        """Returns the equivalent TaskObservation (built once)."""
+        if self._expanded is None:
+            compact = self.compact
+            self._expanded = nf_ai_comms_pb2.TaskObservation(
+                event_id=self.event_id,
+                event_type=self.event_type,
+                timestamp_iso=self.timestamp_iso,
+                pipeline_name=self.pipeline_name,
+                process_name=self.process_name,
+                task_id_num=compact.task_id_num,
+                task_hash=compact.task_hash,
+                task_name=self.task_name,
+                native_id=compact.native_id,
+                status=self.status,
+                exit_code=compact.exit_code,
+                duration_ms=compact.duration_ms,
+                realtime_ms=compact.realtime_ms,
+                cpu_percent=f"{compact.cpu_percent:.1f}%" if compact.cpu_percent else "",
+                peak_rss_bytes=compact.peak_rss_bytes,
+                peak_vmem_bytes=compact.peak_vmem_bytes,
+                read_bytes=compact.read_bytes,
+                write_bytes=compact.write_bytes,
+            )
+        return self._expanded
+
+    def SerializeToString(self):
+        return self.to_observation().SerializeToString()
+
+
+class SessionRegistry:
+    """
+    Args:
+        max_strings_per_session (int): Upper bound on a session's intern table.
+        idle_timeout_s (float): Sessions unused for this long are dropped; checked
+            when a new session is opened.
+    """
+
+    def __init__(self, max_strings_per_session=1_000_000, idle_timeout_s=3600.0):
+        self.max_strings_per_session = max_strings_per_session
+        self.idle_timeout_s = idle_timeout_s
+        # session -> [id -> string list, string -> id dict, last used (time.monotonic())]
+        self._tables = {}
+        self._next_sweep = time.monotonic() + idle_timeout_s / 4
+        # open() runs on gRPC worker threads in the threaded AiServer; resolve() only reads.
+        self._lock = threading.Lock()
+
+    def open(self, strings, session=0):
+        """
+        Interns `strings` in `session` (a new session if 0).
+
+        Returns:
+            tuple: (session, list of ids, one per string).
+
+        Raises:
+            KeyError: `session` is not open.
+            ValueError: The session's table would exceed max_strings_per_session.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if session:
+                if session not in self._tables:
+                    raise KeyError(f"Unknown session {session}")
+            else:
+                if now >= self._next_sweep:
+                    self._expire_idle(now)
+                session = secrets.randbits(63) or 1
+                self._tables[session] = [[""], {"": 0}, now]
+            table = self._tables[session]
+            table[2] = now
+            by_id, by_string = table[0], table[1]
+            new = sum(1 for s in set(strings) if s not in by_string)
+            if len(by_id) + new > self.max_strings_per_session + 1:
+                raise ValueError(f"Session {session} would exceed {self.max_strings_per_session} interned strings")
+            ids = []
+            for s in strings:
+                string_id = by_string.get(s)
+                if string_id is None:
+                    string_id = by_string[s] = len(by_id)
+                    by_id.append(s)
+                ids.append(string_id)
+        return session, ids
+
+    def close(self, session):
+        """
+        Drops a session's table.
+
+        Returns:
+            bool: Whether the session was open.
+        """
+        with self._lock:
+            return self._tables.pop(session, None) is not None
+
+    def _expire_idle(self, now):
+        deadline = now - self.idle_timeout_s
+        for session in [s for s, table in self._tables.items() if table[2] < deadline]:
+            del self._tables[session]
+        self._next_sweep = now + self.idle_timeout_s / 4
+
+    def resolve(self, compact):
+        """
+        Wraps a CompactTaskObservation in a CompactObservation.
+
+        Raises:
+            KeyError: The session is not open.
+            ValueError: The message references an id the session never issued.
+        """
+        table = self._tables.get(compact.session)
+        if table is None:
+            raise KeyError(f"Unknown session {compact.session}")
+        table[2] = time.monotonic()
+        strings = table[0]
+        try:
+            return CompactObservation(
+                compact,
+                strings[compact.event_type_id],
+                strings[compact.pipeline_name_id],
+                strings[compact.process_name_id],
+                strings[compact.task_name_id] if compact.task_name_id else compact.task_name,
+                strings[compact.status_id],
+            )
+        except IndexError:
+            raise ValueError(f"Unknown string id in session {compact.session}") from None
+
+    def expand(self, compact):
+        """
+        Converts a CompactTaskObservation into the equivalent TaskObservation.
+
+        Raises:
+            KeyError: The session is not open.
+            ValueError: The message references an id the session never issued.
+        """
+        return self.resolve(compact).to_observation()
+
+    def __len__(self):
+        return len(self._tables)
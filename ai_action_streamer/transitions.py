@@ -0,0 +1,392 @@
+import collections
+import itertools
+
+import numpy as np
+
+from ai_action_streamer.checkpoint import pack_messages, pack_strings, unpack_messages, unpack_strings
+from ai_action_streamer.features import OBSERVATION_DIM, TERMINAL_STATUSES, encode_observation
+
+from proto import nf_ai_comms_pb2
+
+
+def default_reward(previous, current):
+    """
+    Reward for the step from `previous` to `current` (both TaskObservation-like).
+
+    Failures cost 1, and every completed step is charged its wall time in hours so
+    that decisions leading to shorter tasks are preferred.
+    """
+    reward = -max(current.realtime_ms or current.duration_ms, 0) / 3_600_000.0
+    if current.status.upper() in ("FAILED", "ABORTED") or current.exit_code != 0:
+        reward -= 1.0
+    return reward
+
+
+class TransitionAssembler:
+    """
+    Matches consecutive observations of the same task_hash into
+    (observation, action, reward, next_observation, done) transitions.
+
+    Transitions are buffered and handed to `sink(obs, actions, rewards, next_obs, dones)`
+    as NumPy batches of `batch_size`, so the replay buffer takes its lock once per
+    batch instead of once per event.
+
+    Args:
+        sink (callable): Receives each batch, e.g. PrioritizedReplayBuffer.add_batch
+            or a Ray actor's add_batch.remote.
+        batch_size (int): Transitions per sink call.
+        max_open_tasks (int): Bound on tasks awaiting their next observation; the
+            least recently seen task is forgotten beyond that.
+        reward_fn (callable): reward_fn(previous_observation, observation) -> float.
+    """
+
+    def __init__(self, sink, batch_size=64, max_open_tasks=100_000, reward_fn=default_reward):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_open_tasks = max_open_tasks
+        self.reward_fn = reward_fn
+        self.emitted = 0
+        self._open = collections.OrderedDict()  # task_hash -> (observation, encoded, action_code)
+        # Open tasks restored from a snapshot and not seen since (older than all of _open).
+        self._restored = None
+        # Generations of _open handed to a full snapshot still being written, oldest
+        # first (between _restored and _open in age); see checkpoint_state().
+        self._frozen = []
+        self._full_capture = None
+        self._full_captures = 0
+        # task_hashes touched since the last checkpoint_state(); None until checkpointing starts.
+        self._changed = None
+        self._obs = np.zeros((batch_size, OBSERVATION_DIM), dtype=np.float32)
+        self._next_obs = np.zeros((batch_size, OBSERVATION_DIM), dtype=np.float32)
+        self._actions = np.zeros(batch_size, dtype=np.int64)
+        self._rewards = np.zeros(batch_size, dtype=np.float32)
+        self._dones = np.zeros(batch_size, dtype=np.bool_)
+        self._fill = 0
+
+    def observe(self, observation, action_code):
+        """Records an observation and the action code decided for it."""
+        task_hash = observation.task_hash
+        if not task_hash:
+            return
+        encoded = encode_observation(observation)
+        done = observation.status.upper() in TERMINAL_STATUSES
+        previous = self._open.pop(task_hash, None)
+        if previous is None:
+            for frozen in self._frozen:
+                previous = frozen.pop(task_hash)
+                if previous is not None:
+                    break
+            else:
+                if self._restored is not None:
+                    previous = self._restored.pop(task_hash)
+        if self._changed is not None:
+            self._changed.add(task_hash)
+        if previous is not None:
+            prev_observation, prev_encoded, prev_action = previous
+            i = self._fill
+            self._obs[i] = prev_encoded
+            self._actions[i] = prev_action
+            self._rewards[i] = self.reward_fn(prev_observation, observation)
+            self._next_obs[i] = encoded
+            self._dones[i] = done
+            self._fill += 1
+            if self._fill == self.batch_size:
+                self.flush()
+        if not done:
+            self._open[task_hash] = (observation, encoded, action_code)
+            if self.open_tasks > self.max_open_tasks:
+                evicted = self._evict_oldest()
+                if self._changed is not None:
+                    self._changed.add(evicted)
+
+    def _evict_oldest(self):
+        # Forgets the least recently seen task; every restored task is older than the
+        # frozen generations, and those are older than _open.
+        if self._restored is not None and len(self._restored):
+            return self._restored.evict_oldest()
+        for frozen in self._frozen:
+            if len(frozen):
+                return frozen.evict_oldest()
+        return self._open.popitem(last=False)[0]
+
+    def flush(self):
+        """Hands any buffered transitions to the sink."""
+        n = self._fill
+        if n == 0:
+            return
+        self.sink(
+            self._obs[:n].copy(), self._actions[:n].copy(), self._rewards[:n].copy(),
+            self._next_obs[:n].copy(), self._dones[:n].copy(),
+        )
+        self.emitted += n
+        self._fill = 0
+
+    @property
+    def open_tasks(self):
+        return (len(self._open) + sum(len(frozen) for frozen in self._frozen)
+                + (len(self._restored) if self._restored is not None else 0))
+
+    def checkpoint_state(self, full):
+        # StateCheckpointer protocol. A delta holds the tasks observed since the
+        # previous call: every observe() moves its task to the end of _open, so the
+        # ones still open are exactly its last entries. A full snapshot merges the
+        # restored tier and the open tasks into one task_hash-sorted table; the
+        # capture only freezes _open as a generation the writer thread reads and
+        # starts a new one, and snapshot_written() later swaps the frozen
+        # generations for the memory-mapped file, so nothing here is O(open tasks)
+        # beyond copying the restored tier's alive mask.
+        changed, self._changed = self._changed or set(), set()
+        meta = {"emitted": self.emitted, "full": full}
+        pending = {
+            "pending_obs": self._obs[:self._fill].copy(),
+            "pending_actions": self._actions[:self._fill].copy(),
+            "pending_rewards": self._rewards[:self._fill].copy(),
+            "pending_next_obs": self._next_obs[:self._fill].copy(),
+            "pending_dones": self._dones[:self._fill].copy(),
+        }
+        if not full:
+            n_live = sum(1 for task_hash in changed if task_hash in self._open)
+            live = list(itertools.islice(reversed(self._open.items()), n_live))
+            live.reverse()
+            removed = [task_hash for task_hash in changed if task_hash not in self._open]
+
+            def build_delta():
+                arrays = dict(pending)
+                arrays["hashes"], arrays["hash_offsets"] = pack_strings([task_hash for task_hash, _ in live])
+                arrays["removed"], arrays["removed_offsets"] = pack_strings(removed)
+                arrays["observations"], arrays["observation_offsets"] = pack_messages([v[0] for _, v in live])
+                arrays["encoded"] = np.array([v[1] for _, v in live], dtype=np.float32).reshape(-1, OBSERVATION_DIM)
+                arrays["actions"] = np.fromiter((v[2] for _, v in live), dtype=np.int64, count=len(live))
+                return arrays
+
+            return meta, build_delta
+
+        # Earlier generations are still frozen only if their snapshot failed; they
+        # are written again, without the tasks removed from them so far.
+        self._frozen.append(_FrozenTasks(self._open))
+        self._open = collections.OrderedDict()
+        generations = [(frozen.tasks, set(frozen.gone)) for frozen in self._frozen]
+        restored = self._restored
+        restored_alive = restored.alive.copy() if restored is not None else None
+        self._full_captures += 1
+        meta["capture"] = self._full_captures
+        self._full_capture = (meta["capture"], list(self._frozen), [len(f.gone) for f in self._frozen],
+                              restored, restored_alive)
+
+        def build_full():
+            arrays = dict(pending)
+            keys, encoded, actions, chunks, lengths = [], [], [], [], []
+            if restored is not None and restored_alive.any():
+                index, _, blob_chunks = restored.gather(restored_alive)
+                keys.append(restored.keys[index])
+                encoded.append(restored.encoded[index])
+                actions.append(restored.actions[index])
+                lengths.append(restored.lengths[index])
+                chunks.extend(blob_chunks)
+                # Restored tasks are older than all frozen ones and keep their relative order.
+                rank = [np.argsort(np.argsort(restored.rank[index], kind="stable"))]
+            else:
+                rank = []
+            for tasks, gone in generations:
+                for hashes, values in _chunked_tasks(tasks, gone):
+                    keys.append(np.array([task_hash.encode() for task_hash in hashes], dtype=np.bytes_))
+                    encoded.append(np.array([v[1] for v in values], dtype=np.float32).reshape(-1, OBSERVATION_DIM))
+                    actions.append(np.fromiter((v[2] for v in values), dtype=np.int64, count=len(values)))
+                    part_chunks, offsets = pack_messages([v[0] for v in values])
+                    chunks.extend(part_chunks)
+                    lengths.append(np.diff(offsets))
+            n_restored = len(rank[0]) if rank else 0
+            n = sum(len(k) for k in keys)
+            rank.append(np.arange(n_restored, n))
+            keys = np.concatenate(keys) if keys else np.zeros(0, "S1")
+            lengths = np.concatenate(lengths) if lengths else np.zeros(0, np.int64)
+            starts = np.zeros(n, dtype=np.int64)
+            np.cumsum(lengths[:-1], out=starts[1:])
+            order = np.argsort(keys, kind="stable")
+            rank = np.concatenate(rank)[order]
+            by_age = np.empty(n, dtype=np.int64)
+            by_age[rank] = np.arange(n)
+            arrays.update(keys=keys[order], starts=starts[order], lengths=lengths[order], rank=rank, by_age=by_age,
+                          observations=chunks)
+            arrays["encoded"] = (np.concatenate(encoded) if encoded
+                                 else np.zeros((0, OBSERVATION_DIM), np.float32))[order]
+            arrays["actions"] = (np.concatenate(actions) if actions else np.zeros(0, np.int64))[order]
+            return arrays
+
+        return meta, build_full
+
+    def snapshot_written(self, meta, arrays):
+        # StateCheckpointer protocol. The full snapshot captured as meta["capture"]
+        # is on disk: its memory-mapped tasks replace the restored tier and the
+        # generations frozen for it, minus the tasks removed from those since.
+        capture = self._full_capture
+        if not meta["full"] or capture is None or capture[0] != meta.get("capture"):
+            return
+        _, frozen, marks, restored, restored_alive = capture
+        self._full_capture = None
+        tier = _RestoredTasks(arrays) if len(arrays["keys"]) else None
+        if tier is not None:
+            for generation, mark in zip(frozen, marks):
+                for task_hash in itertools.islice(generation.gone, mark, None):
+                    tier.pop(task_hash, parse=False)
+            if restored is not None:
+                for i in np.flatnonzero(restored_alive & ~restored.alive):
+                    tier.pop(restored.keys[i].decode(), parse=False)
+        self._restored = tier
+        self._frozen = [generation for generation in self._frozen if generation not in frozen]
+
+    def restore_state(self, meta, arrays):
+        self._changed = set()
+        self.emitted = meta["emitted"]
+        pending = [np.array(arrays[name]) for name in ("pending_obs", "pending_actions", "pending_rewards",
+                                                          "pending_next_obs", "pending_dones")]
+        self._fill = len(pending[1])
+        if self._fill >= self.batch_size:
+            self.sink(*pending)  # saved with a larger batch_size
+            self.emitted += self._fill
+            self._fill = 0
+        else:
+            for target, rows in zip((self._obs, self._actions, self._rewards, self._next_obs, self._dones), pending):
+                target[:self._fill] = rows
+        if meta["full"]:
+            self._open.clear()
+            self._frozen = []
+            self._full_capture = None
+            self._restored = _RestoredTasks(arrays) if len(arrays["keys"]) else None
+            return
+        for task_hash in unpack_strings(arrays["removed"], arrays["removed_offsets"]):
+            self._open.pop(task_hash, None)
+            if self._restored is not None:
+                self._restored.pop(task_hash, parse=False)
+        hashes = unpack_strings(arrays["hashes"], arrays["hash_offsets"])
+        observations = unpack_messages(nf_ai_comms_pb2.TaskObservation, arrays["observations"],
+                                       arrays["observation_offsets"])
+        encoded = np.array(arrays["encoded"])
+        for i, task_hash in enumerate(hashes):
+            self._open.pop(task_hash, None)
+            if self._restored is not None:
+                self._restored.pop(task_hash, parse=False)
+            self._open[task_hash] = (observations[i], encoded[i], int(arrays["actions"][i]))
+
+
+def _chunked_tasks(tasks, gone, size=16384):
+    # (task_hashes, values) of a frozen generation not in `gone`, a chunk at a time:
+    # one list() over millions of entries would hold the GIL, and with it the event
+    # loop thread, for the whole copy. No tuple per task either, or the cyclic GC
+    # would run full collections over the whole heap while the loop waits.
+    hashes = iter(tasks)
+    while True:
+        part = list(itertools.islice(hashes, size))
+        if not part:
+            return
+        if gone:
+            part = [task_hash for task_hash in part if task_hash not in gone]
+        yield part, [tasks[task_hash] for task_hash in part]
+
+
+class _FrozenTasks:
+    """
+    A generation of open tasks handed to a full snapshot's writer thread. The dict
+    is no longer modified; tasks taken out of it are recorded in `gone` (in removal
+    order) until the written snapshot replaces the generation.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.gone = {}
+        self._eviction_order = iter(tasks)
+
+    def __len__(self):
+        return len(self.tasks) - len(self.gone)
+
+    def pop(self, task_hash):
+        """Removes a task; returns (observation, encoded, action_code) or None."""
+        if task_hash in self.gone:
+            return None
+        value = self.tasks.get(task_hash)
+        if value is not None:
+            self.gone[task_hash] = None
+        return value
+
+    def evict_oldest(self):
+        """Forgets the least recently seen task; returns its task_hash."""
+        for task_hash in self._eviction_order:
+            if task_hash not in self.gone:
+                self.gone[task_hash] = None
+                return task_hash
+
+
+class _RestoredTasks:
+    """
+    Open tasks from a full snapshot, left in the memory-mapped arrays (sorted by
+    task_hash) and looked up by binary search until their next observation, so
+    restoring millions of tasks does not build millions of Python objects.
+    """
+
+    def __init__(self, arrays):
+        self.keys = arrays["keys"]
+        self.encoded = arrays["encoded"]
+        self.actions = arrays["actions"]
+        self.starts = arrays["starts"]
+        self.lengths = arrays["lengths"]
+        self.rank = arrays["rank"]
+        self.blob = arrays["observations"]
+        self.alive = np.ones(len(self.keys), dtype=np.bool_)
+        self._count = len(self.keys)
+        self._eviction_order = arrays.get("by_age")
+        self._evicted = 0
+
+    def __len__(self):
+        return self._count
+
+    def _find(self, task_hash):
+        key = task_hash.encode()
+        if len(key) > self.keys.dtype.itemsize:
+            return -1
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key and self.alive[i]:
+            return i
+        return -1
+
+    def pop(self, task_hash, parse=True):
+        """Removes a task; returns (observation, encoded, action_code) or None."""
+        i = self._find(task_hash)
+        if i < 0:
+            return None
+        self.alive[i] = False
+        self._count -= 1
+        if not parse:
+            return None
+        start = int(self.starts[i])
+        observation = nf_ai_comms_pb2.TaskObservation.FromString(
+            self.blob[start:start + int(self.lengths[i])].tobytes())
+        return observation, np.array(self.encoded[i]), int(self.actions[i])
+
+    def evict_oldest(self):
+        """Forgets the least recently seen task; returns its task_hash."""
+        if self._eviction_order is None:
+            self._eviction_order = np.argsort(self.rank, kind="stable")
+        while True:
+            i = self._eviction_order[self._evicted]
+            self._evicted += 1
+            if self.alive[i]:
+                self.alive[i] = False
+                self._count -= 1
+                return self.keys[i].decode()
+
+    def gather(self, alive):
+        """
+        Indices of the `alive` tasks in blob order, their offsets in a compacted
+        blob, and the compacted blob as a list of contiguous chunks.
+        """
+        index = np.flatnonzero(alive)
+        index = index[np.argsort(self.starts[index], kind="stable")]
+        starts, lengths = self.starts[index], self.lengths[index]
+        new_starts = np.zeros(len(index), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=new_starts[1:])
+        ends = starts + lengths
+        breaks = np.flatnonzero(starts[1:] != ends[:-1]) + 1
+        run_starts = starts[np.concatenate([[0], breaks])]
+        run_ends = ends[np.concatenate([breaks - 1, [len(index) - 1]])]
+        chunks = [self.blob[a:b] for a, b in zip(run_starts.tolist(), run_ends.tolist())]
+        return index, new_starts, chunks
@@ -0,0 +1,133 @@
+"""
+Unix-domain-socket addresses for a co-located Nextflow observer and AI server.
+
+A server started on TCP port P also listens on default_uds_path(P). A client
+given "host:P" calls local_address() and, when host is this machine and that
+socket accepts connections, talks to "unix:<path>" instead, skipping the TCP
+stack. Anything else (a remote host, no socket, a socket left behind by a
+crashed server, or an address that already names a scheme such as
+"ipv4:127.0.0.1:50051") is returned unchanged. The answer is cached per target
+for LOCAL_ADDRESS_TTL_S, so clients can call local_address() on every send
+without a socket probe each time.
+
+Only sockets this user owns, in a directory this user owns and nobody else can
+write to, are used: anyone able to plant a socket at the path would otherwise
+receive every observation and answer with actions of their choosing. The
+directory is $XDG_RUNTIME_DIR, else "nf_ai_comms-<uid>" (mode 0700) in the
+system temp directory; set NF_AI_COMMS_SOCKET_DIR when server and client see
+different ones (containers).
+"""
+import functools
+import os
+import socket
+import stat
+import tempfile
+import time
+
+_SCHEMES = ("unix:", "unix-abstract:", "dns:", "ipv4:", "ipv6:")
+_LOOPBACK = {"localhost", "127.0.0.1", "::1", "0.0.0.0", "::", ""}
+
+# How long a local_address() answer is reused, which bounds how late a client
+# notices a server's Unix socket appearing or going away.
+LOCAL_ADDRESS_TTL_S = 5.0
+_resolved = {}  # (server_address, socket dir setting) -> (address, expires_at)
+
+
+def socket_dir():
+    """Directory the Unix sockets live in (see the module docstring)."""
+    return (os.environ.get("NF_AI_COMMS_SOCKET_DIR") or os.environ.get("XDG_RUNTIME_DIR")
+            or os.path.join(tempfile.gettempdir(), f"nf_ai_comms-{os.getuid()}"))
+
+
+def default_uds_path(port):
+    """Socket path a server on TCP `port` listens on."""
+    return os.path.join(socket_dir(), f"nf_ai_comms_{port}.sock")
+
+
+def ensure_socket_dir():
+    """
+    Creates the socket directory (mode 0700) if missing and checks it is private.
+
+    Returns:
+        str: The directory.
+
+    Raises:
+        PermissionError: It is not a directory owned by this user, or others can
+            write to it.
+    """
+    path = socket_dir()
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    _check_owned(path, stat.S_ISDIR, private=True)
+    return path
+
+
+def _check_owned(path, is_kind, private):
+    # private: nobody else may write to it either (for the directory; a socket's
+    # own mode bits follow the umask and matter less than who could replace it).
+    st = os.lstat(path)
+    if not is_kind(st.st_mode) or st.st_uid != os.getuid() or (private and st.st_mode & 0o022):
+        raise PermissionError(f"{path} is not private to uid {os.getuid()}")
+
+
+@functools.lru_cache(maxsize=None)
+def _host_names():
+    names = set(_LOOPBACK)
+    names.add(socket.gethostname())
+    names.add(socket.gethostname().split(".")[0])
+    return frozenset(name.lower() for name in names)
+
+
+def split_host_port(server_address):
+    """'[::1]:50051' -> ('::1', 50051); returns (address, None) when there is no port."""
+    host, sep, port = server_address.rpartition(":")
+    if not sep or not port.isdigit():
+        return server_address, None
+    return host.strip("[]"), int(port)
+
+
+def is_local_host(host):
+    return host.lower() in _host_names()
+
+
+def local_address(server_address):
+    """
+    Returns "unix:<path>" for a server on this host listening on its default
+    socket, otherwise server_address unchanged.
+
+    Args:
+        server_address (str): A gRPC target such as 'localhost:50052'.
+    """
+    key = (server_address, os.environ.get("NF_AI_COMMS_SOCKET_DIR"))
+    now = time.monotonic()
+    cached = _resolved.get(key)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    address = _probe_local_address(server_address)
+    if len(_resolved) > 1024:
+        _resolved.clear()
+    _resolved[key] = (address, now + LOCAL_ADDRESS_TTL_S)
+    return address
+
+
+def _probe_local_address(server_address):
+    if server_address.startswith(_SCHEMES) or "://" in server_address:
+        return server_address
+    host, port = split_host_port(server_address)
+    if port is None or not is_local_host(host):
+        return server_address
+    path = default_uds_path(port)
+    try:
+        _check_owned(os.path.dirname(path), stat.S_ISDIR, private=True)
+        _check_owned(path, stat.S_ISSOCK, private=False)
+    except OSError:  # missing, or planted by someone else
+        return server_address
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        if probe.connect_ex(path) != 0:
+            return server_address  # stale socket from a server that did not shut down cleanly
+    finally:
+        probe.close()
+    return f"unix:{path}"
@@ -0,0 +1,55 @@
+"""
+Benchmark for state_simulation.cloudy.binpacking.
+
+Packs N synthetic pending tasks from scratch with each heuristic, then replays
+a rolling window: the earliest-finishing tenth of the tasks completes and the
+same number of new tasks arrives, updated incrementally rather than re-solved.
+
+Run from the project root:
+    python benchmarks/bench_binpacking.py [N]
+"""
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import numpy as np
+
+from state_simulation.cloudy.binpacking import HEURISTICS, PlacementEngine
+from state_simulation.cluster_env import SyntheticWorkload
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = np.random.default_rng(0)
+    workload = SyntheticWorkload()
+    tasks = workload.sample(n, rng)
+    for heuristic in HEURISTICS:
+        engine = PlacementEngine(heuristic=heuristic)
+        start = time.perf_counter()
+        engine.solve(tasks["cpus"], tasks["peak_rss_bytes"], tasks["duration_s"])
+        solve_s = time.perf_counter() - start
+        s = engine.summary()
+        print(f"{heuristic}: solve {n} tasks in {solve_s * 1000:.0f} ms -> {s['instances']} instances, "
+              f"${s['hourly_cost']:.2f}/h, expected ${s['expected_cost']:.2f}, "
+              f"cpu {s['cpu_utilization']:.1%}, mem {s['memory_utilization']:.1%}")
+
+        step = n // 10
+        next_id = n
+        update_s = []
+        for _ in range(5):
+            task_ids, _, end_s = engine.placements()
+            now = float(np.partition(end_s, step)[step])
+            finished = task_ids[end_s <= now]
+            arrivals = workload.sample(len(finished), rng)
+            start = time.perf_counter()
+            engine.remove(finished, now=now)
+            engine.add(arrivals["cpus"], arrivals["peak_rss_bytes"], arrivals["duration_s"],
+                       task_ids=np.arange(next_id, next_id + len(finished)), now=now)
+            update_s.append(time.perf_counter() - start)
+            next_id += len(finished)
+        s = engine.summary(now=now)
+        print(f"{heuristic}: incremental update of ~{step} tasks in {np.mean(update_s) * 1000:.0f} ms "
+              f"(mean of {len(update_s)}) -> {s['instances']} instances, incurred ${s['incurred_cost']:.2f}")
@@ -0,0 +1,106 @@
+"""
+Benchmark of AiActionStreamer state snapshots with many open tasks.
+
+Fills a TransitionAssembler with N open tasks and reports, for a full snapshot
+and for a delta after 10k observations: time spent on the event loop capturing
+state, the longest the event loop went without running while the writer thread
+worked, the writer thread's time, and file size. Then restores the chain into a
+fresh assembler and reports restore time and the cost observe() pays for
+looking a task up in the restored (memory-mapped) tier.
+
+Run from the project root:
+    python benchmarks/bench_checkpoint.py [N_TASKS]
+"""
+import asyncio
+import collections
+import gc
+import os
+import sys
+import tempfile
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from proto import nf_ai_comms_pb2
+from ai_action_streamer.checkpoint import StateCheckpointer
+from ai_action_streamer.features import encode_observation
+from ai_action_streamer.transitions import TransitionAssembler
+
+
+def _task_hash(i):
+    return f"{i % 256:02x}/{i:07x}"
+
+
+def _running(task_hash):
+    return nf_ai_comms_pb2.TaskObservation(
+        task_hash=task_hash, event_type="task_start", status="RUNNING", pipeline_name="nf-core/rnaseq",
+        process_name="ALIGN", task_name="ALIGN (sample_1)", cpu_percent="95.0%", peak_rss_bytes=2 << 30,
+    )
+
+
+async def _longest_stall(done):
+    longest, last = 0.0, time.perf_counter()
+    while not done.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        longest, last = max(longest, now - last), now
+    return longest
+
+
+async def _snapshot_async(checkpointer, full):
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    path, full, metas, builds = checkpointer._capture(full)
+    captured = time.perf_counter()
+    done = asyncio.Event()
+    stall = loop.create_task(_longest_stall(done))
+    await loop.run_in_executor(checkpointer._executor, checkpointer._write, path, full, metas, builds)
+    written = time.perf_counter()
+    done.set()
+    checkpointer._written(path, full)
+    folded = time.perf_counter()
+    print(f"{'full' if full else 'delta':>5} snapshot  capture on loop {captured - start:7.3f}s   "
+          f"longest loop stall {await stall:6.3f}s   writer thread {written - captured:6.2f}s   "
+          f"fold on loop {folded - written:6.3f}s   {os.path.getsize(path) / 2**20:7.1f} MiB")
+
+
+def _snapshot(checkpointer, full):
+    asyncio.run(_snapshot_async(checkpointer, full))
+
+
+def _observe_us(assembler, task_hashes):
+    start = time.perf_counter()
+    for task_hash in task_hashes:
+        assembler.observe(_running(task_hash), 1)
+    return (time.perf_counter() - start) / len(task_hashes) * 1e6
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    template = _running("x")
+    value = (template, encode_observation(template), 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        assembler = TransitionAssembler(lambda *b: None, max_open_tasks=2 * n_tasks)
+        assembler._open = collections.OrderedDict((_task_hash(i), value) for i in range(n_tasks))
+        gc.collect()  # a server's _open grew slowly and is in the oldest generation
+        checkpointer = StateCheckpointer(tmp, {"transitions": assembler})
+        print(f"{n_tasks} open tasks")
+        _snapshot(checkpointer, full=True)
+        for i in range(0, 20_000, 2):
+            assembler.observe(_running(_task_hash(i)), 2)  # updates
+            assembler.observe(_running(_task_hash(n_tasks + i)), 2)  # new tasks
+        _snapshot(checkpointer, full=False)
+        del assembler
+
+        restored = TransitionAssembler(lambda *b: None, max_open_tasks=2 * n_tasks)
+        start = time.perf_counter()
+        StateCheckpointer(tmp, {"transitions": restored}).restore()
+        print(f"restore (full + delta)  {time.perf_counter() - start:.3f}s   {restored.open_tasks} open tasks")
+
+        fresh = TransitionAssembler(lambda *b: None)
+        new = [_task_hash(2 * n_tasks + i) for i in range(20_000)]
+        print(f"observe() us/event  restored task {_observe_us(restored, [_task_hash(i) for i in range(1, 20_001, 2)]):.1f}"
+              f"   new task with restored tier {_observe_us(restored, new):.1f}"
+              f"   new task without {_observe_us(fresh, new):.1f}")
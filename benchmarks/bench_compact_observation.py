@@ -0,0 +1,101 @@
+"""
+Benchmark of CompactTaskObservation against TaskObservation.
+
+Encodes the task_start / task_complete events of a synthetic workflow both
+ways, replaying CompactSession's interning (one OpenSession call whenever an
+event brings a new pipeline, process, event type or status; task names go
+inline), and reports RPCs and bytes per event on the wire, OpenSession traffic
+included. The "task names interned" column is the alternative of registering
+each new task name after its first use. Then decode time per event: protobuf
+parsing alone, parsing plus SessionRegistry.resolve() (what the server does
+before the decision path sees the observation), and parsing plus expand() into
+a full TaskObservation for comparison. The last line adds encode_observation(),
+the feature vector the decision path computes.
+
+Run from the project root:
+    python benchmarks/bench_compact_observation.py [N_TASKS]
+"""
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from proto import nf_ai_comms_pb2
+from ai_action_streamer.features import encode_observation
+from ai_action_streamer.sessions import SessionRegistry
+from state_simulation.synthetic import generate_workflow, observation_events
+from utilities.nf_client import compact_observation
+
+
+INTERNED = ("pipeline_name", "process_name", "event_type", "status")
+
+
+def _time_per_event(fn, payloads, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best / len(payloads) * 1e6
+
+
+def _client(events, registry, intern_task_names):
+    # Replays a client's interning: returns the compact payloads, the number of
+    # OpenSession calls and their request + reply bytes.
+    session, _ = registry.open([])
+    ids, calls, open_bytes, payloads = {}, 1, 0, []
+
+    def intern(strings):
+        nonlocal calls, open_bytes
+        new = [s for s in dict.fromkeys(strings) if s and s not in ids]
+        if new:
+            _, new_ids = registry.open(new, session)
+            ids.update(zip(new, new_ids))
+            calls += 1
+            open_bytes += (nf_ai_comms_pb2.SessionOpen(session=session, strings=new).ByteSize()
+                           + nf_ai_comms_pb2.SessionHandle(session=session, ids=new_ids).ByteSize())
+
+    for event in events:
+        intern([event[k] for k in INTERNED])
+        payloads.append(compact_observation(event, session, ids).SerializeToString())
+        if intern_task_names:
+            intern([event["task_name"]])  # after the first use, as a background call would
+    return payloads, calls, open_bytes
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    events = list(observation_events(generate_workflow(n_tasks, seed=0), pipeline_name="nf-core/rnaseq"))
+
+    registry = SessionRegistry()
+    compact, calls, open_bytes = _client(events, registry, intern_task_names=False)
+    interned, interned_calls, interned_open_bytes = _client(events, SessionRegistry(), intern_task_names=True)
+    full = []
+    for event in events:
+        event = dict(event)
+        event.pop("timestamp_epoch_s")
+        full.append(nf_ai_comms_pb2.TaskObservation(**event).SerializeToString())
+
+    def mean_bytes(payloads, extra=0):
+        return (sum(map(len, payloads)) + extra) / len(payloads)
+
+    n = len(events)
+    parse_full = nf_ai_comms_pb2.TaskObservation.FromString
+    parse_compact = nf_ai_comms_pb2.CompactTaskObservation.FromString
+    print(f"{n} events ({n_tasks} tasks)")
+    print(f"RPCs/event    TaskObservation 1.000   compact {1 + calls / n:.3f} ({calls} OpenSession)   "
+          f"task names interned {1 + interned_calls / n:.3f} ({interned_calls} OpenSession)")
+    print(f"bytes/event   TaskObservation {mean_bytes(full):6.1f}   "
+          f"compact {mean_bytes(compact, open_bytes):6.1f} ({mean_bytes(compact, open_bytes) / mean_bytes(full):.0%})   "
+          f"task names interned {mean_bytes(interned, interned_open_bytes):6.1f}")
+    print(f"decode us/event   TaskObservation {_time_per_event(parse_full, full):5.2f}   "
+          f"compact {_time_per_event(parse_compact, compact):5.2f}   "
+          f"compact + resolve {_time_per_event(lambda p: registry.resolve(parse_compact(p)), compact):5.2f}   "
+          f"compact + expand {_time_per_event(lambda p: registry.expand(parse_compact(p)), compact):5.2f}")
+    print(f"decode + encode us/event   TaskObservation "
+          f"{_time_per_event(lambda p: encode_observation(parse_full(p)), full):5.2f}   compact + resolve "
+          f"{_time_per_event(lambda p: encode_observation(registry.resolve(parse_compact(p))), compact):5.2f}")
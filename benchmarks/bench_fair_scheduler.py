@@ -0,0 +1,65 @@
+"""
+Micro-benchmark for ai_action_streamer.fair_scheduler.WeightedFairScheduler.
+
+Compares the per-decision overhead of the scheduler's slot() against a bare
+await, for a single active pipeline (uncontended fast path) and for many
+pipelines competing for a small number of slots.
+
+Run from the project root:
+    python benchmarks/bench_fair_scheduler.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from ai_action_streamer.fair_scheduler import WeightedFairScheduler
+
+N = 200_000
+
+
+async def bare():
+    start = time.perf_counter()
+    for _ in range(N):
+        await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+
+async def single_pipeline():
+    scheduler = WeightedFairScheduler(max_concurrency=10)
+    start = time.perf_counter()
+    for _ in range(N):
+        async with scheduler.slot("only_pipeline"):
+            await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+
+async def contended(pipelines=8, concurrency=4):
+    scheduler = WeightedFairScheduler(max_concurrency=concurrency)
+    per_pipeline = N // pipelines
+
+    async def run(name):
+        for _ in range(per_pipeline):
+            async with scheduler.slot(name):
+                await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(f"pipeline_{i}") for i in range(pipelines)))
+    elapsed = time.perf_counter() - start
+    return elapsed, scheduler.metrics()
+
+
+if __name__ == "__main__":
+    base = asyncio.run(bare())
+    single = asyncio.run(single_pipeline())
+    multi, metrics = asyncio.run(contended())
+    print(f"bare await:        {base / N * 1e9:8.0f} ns/decision")
+    print(f"single pipeline:   {single / N * 1e9:8.0f} ns/decision "
+          f"(overhead {(single - base) / N * 1e9:.0f} ns)")
+    print(f"8 pipelines/4 slots: {multi / N * 1e9:6.0f} ns/decision")
+    for name, stats in sorted(metrics["pipelines"].items()):
+        print(f"  {name}: admitted={stats['admitted']} mean_wait_ms={stats['mean_wait_ms']:.3f}")
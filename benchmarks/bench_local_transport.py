@@ -0,0 +1,86 @@
+"""
+Benchmark of unary SendTaskObservation latency over TCP loopback against the
+Unix domain socket a co-located server also listens on.
+
+A grpc.aio server with an echo servicer (the AiActionStreamer one sleeps 10 ms
+to stand in for a decision, which would hide the transport) runs in a child
+process; the client issues sequential blocking calls on one channel per
+transport and reports latency percentiles.
+
+Run from the project root:
+    python benchmarks/bench_local_transport.py [N_CALLS]
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import grpc
+import numpy as np
+
+from proto import nf_ai_comms_pb2
+from proto import nf_ai_comms_pb2_grpc
+from ai_action_streamer.transport import default_uds_path, local_address
+
+
+class EchoServicer(nf_ai_comms_pb2_grpc.AiActionServiceServicer):
+
+    async def SendTaskObservation(self, request, context):
+        return nf_ai_comms_pb2.Action(observation_event_id=request.event_id, success=True)
+
+
+def _serve(port_queue):
+    async def run():
+        server = grpc.aio.server()
+        nf_ai_comms_pb2_grpc.add_AiActionServiceServicer_to_server(EchoServicer(), server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        server.add_insecure_port(f"unix:{default_uds_path(port)}")
+        await server.start()
+        port_queue.put(port)
+        await server.wait_for_termination()
+
+    asyncio.run(run())
+
+
+def _latencies_us(target, n_calls, request):
+    with grpc.insecure_channel(target) as channel:
+        stub = nf_ai_comms_pb2_grpc.AiActionServiceStub(channel)
+        for _ in range(200):
+            stub.SendTaskObservation(request)
+        samples = np.empty(n_calls)
+        for i in range(n_calls):
+            start = time.perf_counter()
+            stub.SendTaskObservation(request)
+            samples[i] = time.perf_counter() - start
+    return samples * 1e6
+
+
+if __name__ == "__main__":
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    os.environ.setdefault("NF_AI_COMMS_SOCKET_DIR", tempfile.mkdtemp())
+    spawn = multiprocessing.get_context("spawn")  # grpc does not survive fork()
+    port_queue = spawn.Queue()
+    server = spawn.Process(target=_serve, args=(port_queue,), daemon=True)
+    server.start()
+    port = port_queue.get(timeout=30)
+    request = nf_ai_comms_pb2.TaskObservation(
+        event_id="bench-1-task_complete", event_type="task_complete", pipeline_name="nf-core/rnaseq",
+        process_name="ALIGN", task_id_num=1, task_name="ALIGN (sample_1)", status="COMPLETED",
+        duration_ms=61_000, realtime_ms=60_000, cpu_percent="380.0%", peak_rss_bytes=6 << 30,
+    )
+    try:
+        uds = local_address(f"localhost:{port}")
+        assert uds.startswith("unix:"), uds
+        print(f"{n_calls} sequential unary calls")
+        for name, target in (("tcp", f"ipv4:127.0.0.1:{port}"), ("uds", uds)):
+            us = _latencies_us(target, n_calls, request)
+            print(f"{name}  mean {us.mean():7.1f} us   p50 {np.percentile(us, 50):7.1f}   "
+                  f"p99 {np.percentile(us, 99):7.1f}   {n_calls / us.sum() * 1e6:8.0f} calls/s")
+    finally:
+        server.terminate()
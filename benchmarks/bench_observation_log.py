@@ -0,0 +1,53 @@
+"""
+Benchmark for ai_action_streamer.observation_log.
+
+Measures the cost of ObservationLog.append_pair() as seen by the RPC path, the
+end-to-end group-commit throughput of the writer thread, and the sequential
+read rate of LogReader over the resulting segments.
+
+Run from the project root:
+    python benchmarks/bench_observation_log.py [N]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from proto import nf_ai_comms_pb2
+from ai_action_streamer.observation_log import LogReader, ObservationLog
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    log_dir = tempfile.mkdtemp(prefix="obs_log_bench_")
+    observation = nf_ai_comms_pb2.TaskObservation(
+        event_id="bench_event", event_type="task_complete", timestamp_iso="2024-01-01T00:00:00Z",
+        pipeline_name="bench_pipeline", process_name="BENCH_PROCESS", task_id_num=1,
+        task_hash="ab/cdef12", task_name="BENCH_PROCESS (1)", status="COMPLETED",
+        duration_ms=1234, peak_rss_bytes=1 << 28,
+    )
+    action = nf_ai_comms_pb2.Action(observation_event_id="bench_event", action_id="act", success=True)
+    try:
+        log = ObservationLog(log_dir, max_pending=n * 2)
+        start = time.perf_counter()
+        for _ in range(n):
+            log.append_pair(observation, action)
+        append_s = time.perf_counter() - start
+        log.sync()
+        commit_s = time.perf_counter() - start
+        log.close()
+
+        print(f"append_pair on RPC path: {append_s / n * 1e9:.0f} ns/pair")
+        print(f"group commit throughput: {2 * n / commit_s:,.0f} records/s")
+        for verify in (True, False):
+            start = time.perf_counter()
+            payload_bytes = sum(len(r.payload) for r in LogReader(log_dir, verify=verify))
+            read_s = time.perf_counter() - start
+            print(f"sequential read (verify={verify}): {2 * n / read_s:,.0f} records/s, "
+                  f"{payload_bytes / read_s / 1e6:,.1f} MB/s of payload")
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
@@ -0,0 +1,98 @@
+"""
+Throughput benchmark of AiServer: the threaded single-process server against
+the pre-fork mode with 1..N worker processes sharing the port.
+
+Every request runs MultiAgentPolicy.decide() (a freshly initialised policy
+checkpoint), so handler time is GIL-bound Python work. Load comes from client
+processes, each keeping several blocking calls in flight over its own
+connections, so the kernel's SO_REUSEPORT hashing spreads them over workers.
+Scaling is bounded by the cores left over after the clients.
+
+Run from the project root:
+    python benchmarks/bench_prefork_server.py [SECONDS] [MAX_WORKERS]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import grpc
+
+from proto import nf_ai_comms_pb2
+from proto import nf_ai_comms_pb2_grpc
+from ai_action_streamer.policy import MultiAgentPolicy
+from utilities.ai_server import AiServer
+
+CONNECTIONS_PER_CLIENT = 8
+
+
+def _client(port, seconds, counts):
+    request = nf_ai_comms_pb2.TaskObservation(
+        event_id="bench-1-task_complete", event_type="task_complete", pipeline_name="nf-core/rnaseq",
+        process_name="ALIGN", task_name="ALIGN (sample_1)", status="COMPLETED", exit_code=0,
+        duration_ms=61_000, realtime_ms=60_000, cpu_percent="380.0%", peak_rss_bytes=6 << 30,
+    )
+    deadline = time.monotonic() + seconds
+    done = [0] * CONNECTIONS_PER_CLIENT
+
+    def loop(slot):
+        # A private subchannel pool gives each loop its own TCP connection.
+        with grpc.insecure_channel(f"ipv4:127.0.0.1:{port}", options=[("grpc.use_local_subchannel_pool", 1)]) as ch:
+            stub = nf_ai_comms_pb2_grpc.AiActionServiceStub(ch)
+            while time.monotonic() < deadline:
+                stub.SendTaskObservation(request)
+                done[slot] += 1
+
+    threads = [threading.Thread(target=loop, args=(slot,)) for slot in range(CONNECTIONS_PER_CLIENT)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts.put(sum(done))
+
+
+def _throughput(server, seconds, n_clients):
+    server.start()
+    try:
+        context = multiprocessing.get_context("spawn")
+        counts = context.Queue()
+        clients = [context.Process(target=_client, args=(server.port, seconds, counts)) for _ in range(n_clients)]
+        start = time.monotonic()
+        for client in clients:
+            client.start()
+        total = sum(counts.get() for _ in clients)
+        elapsed = time.monotonic() - start
+        for client in clients:
+            client.join()
+        return total / elapsed, server.metrics()
+    finally:
+        server.stop(0)
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    cores = os.cpu_count() or 1
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else max(1, cores // 2)
+    n_clients = max(1, cores - max_workers)
+
+    tmp = tempfile.mkdtemp()
+    checkpoint = os.path.join(tmp, "policy.npz")
+    MultiAgentPolicy().save(checkpoint)
+    log_file = os.path.join(tmp, "ai_server.log")
+
+    print(f"{cores} cores, {n_clients} client processes x {CONNECTIONS_PER_CLIENT} connections, {seconds:.0f}s per run")
+    baseline = None
+    for workers in ["threaded"] + list(range(1, max_workers + 1)):
+        server = AiServer(port=0, log_file=log_file, unix_socket=False, policy_checkpoint=checkpoint,
+                          workers=None if workers == "threaded" else workers)
+        rate, metrics = _throughput(server, seconds, n_clients)
+        baseline = baseline or rate
+        busy = [sum(m["seconds"] for m in w["methods"].values()) for w in metrics["per_worker"]]
+        print(f"{str(workers):>9} workers  {rate:9.0f} req/s  x{rate / baseline:4.2f}   "
+              f"handler busy s per worker {', '.join(f'{b:.1f}' for b in busy)}")
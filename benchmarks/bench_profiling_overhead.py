@@ -0,0 +1,60 @@
+"""
+Cost of the Profile RPC's instrumentation on a servicer handler.
+
+Calls AiActionServicer.OpenSession (no printing, no sleeping) directly on the
+event loop: undecorated, decorated with no profile running (the normal state),
+and during a profile with handler timing only, with tracemalloc, and with
+tracemalloc plus cProfile.
+
+Run from the project root:
+    python benchmarks/bench_profiling_overhead.py [CALLS]
+"""
+import asyncio
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from proto import nf_ai_comms_pb2
+from ai_action_streamer.ai_action_streamer_server import AiActionServicer
+from ai_action_streamer.profiling import Profiler
+
+
+async def _us_per_call(handler, servicer, request, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        await handler(servicer, request, None)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+async def main(calls):
+    servicer = AiActionServicer()
+    handle = await servicer.OpenSession(nf_ai_comms_pb2.SessionOpen(strings=["nf-core/rnaseq", "ALIGN"]), None)
+    request = nf_ai_comms_pb2.SessionOpen(session=handle.session, strings=["nf-core/rnaseq", "ALIGN"])
+    decorated = AiActionServicer.OpenSession
+    undecorated = decorated.__wrapped__
+    loop = asyncio.get_running_loop()
+
+    runs = [("undecorated", undecorated, None), ("no profile running", decorated, None),
+            ("profile: handler timing", decorated, {"cprofile": False, "trace_allocations": False}),
+            ("profile: + tracemalloc", decorated, {"cprofile": False, "trace_allocations": True}),
+            ("profile: + cProfile", decorated, {"cprofile": True, "trace_allocations": True})]
+    await _us_per_call(undecorated, servicer, request, calls // 10)  # warm up
+    baseline = None
+    for label, handler, options in runs:
+        if options is not None:
+            servicer.profiler = Profiler(**options)
+            servicer.profiler.start(loop)
+        us = await _us_per_call(handler, servicer, request, calls)
+        if options is not None:
+            servicer.profiler.stop()
+            servicer.profiler = None
+        baseline = baseline or us
+        print(f"{label:>26}  {us:7.2f} us/call  x{us / baseline:5.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
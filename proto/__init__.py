@@ -1 +1,5 @@
 # This file makes the 'proto' directory a Python package.
+#
+# Regenerate the *_pb2 modules from the project root, so the *_pb2_grpc ones
+# import them through this package ("from proto import nf_ai_comms_pb2"):
+#     python -m grpc_tools.protoc -I. --python_out=. --grpc_python_out=. proto/*.proto
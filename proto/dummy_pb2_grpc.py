@@ -3,7 +3,7 @@
 import grpc
 import warnings
 
-import dummy_pb2 as dummy__pb2
+from proto import dummy_pb2 as proto_dot_dummy__pb2
 
 GRPC_GENERATED_VERSION = '1.71.0'
 GRPC_VERSION = grpc.__version__
@@ -18,7 +18,7 @@ except ImportError:
 if _version_not_supported:
     raise RuntimeError(
         f'The grpc package installed is at version {GRPC_VERSION},'
-        + f' but the generated code in dummy_pb2_grpc.py depends on'
+        + f' but the generated code in proto/dummy_pb2_grpc.py depends on'
         + f' grpcio>={GRPC_GENERATED_VERSION}.'
         + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
         + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
@@ -37,8 +37,8 @@ class GreeterStub(object):
         """
         self.SayHello = channel.unary_unary(
                 '/dummy.Greeter/SayHello',
-                request_serializer=dummy__pb2.HelloRequest.SerializeToString,
-                response_deserializer=dummy__pb2.HelloReply.FromString,
+                request_serializer=proto_dot_dummy__pb2.HelloRequest.SerializeToString,
+                response_deserializer=proto_dot_dummy__pb2.HelloReply.FromString,
                 _registered_method=True)
 
 
@@ -58,8 +58,8 @@ def add_GreeterServicer_to_server(servicer, server):
     rpc_method_handlers = {
             'SayHello': grpc.unary_unary_rpc_method_handler(
                     servicer.SayHello,
-                    request_deserializer=dummy__pb2.HelloRequest.FromString,
-                    response_serializer=dummy__pb2.HelloReply.SerializeToString,
+                    request_deserializer=proto_dot_dummy__pb2.HelloRequest.FromString,
+                    response_serializer=proto_dot_dummy__pb2.HelloReply.SerializeToString,
             ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
@@ -88,8 +88,8 @@ class Greeter(object):
             request,
             target,
             '/dummy.Greeter/SayHello',
-            dummy__pb2.HelloRequest.SerializeToString,
-            dummy__pb2.HelloReply.FromString,
+            proto_dot_dummy__pb2.HelloRequest.SerializeToString,
+            proto_dot_dummy__pb2.HelloReply.FromString,
             options,
             channel_credentials,
             insecure,
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
 # NO CHECKED-IN PROTOBUF GENCODE
-# source: nf_ai_comms.proto
+# source: proto/nf_ai_comms.proto
 # Protobuf Python Version: 5.29.0
 """Generated protocol buffer code."""
 from google.protobuf import descriptor as _descriptor
@@ -15,7 +15,7 @@ _runtime_version.ValidateProtobufRuntimeVersion(
     29,
     0,
     '',
-    'nf_ai_comms.proto'
+    'proto/nf_ai_comms.proto'
 )
 # @@protoc_insertion_point(imports)
 
@@ -24,18 +24,34 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11nf_ai_comms.proto\x12\x0bnf_ai_comms\"\x85\x03\n\x0fTaskObservation\x12\x10\n\x08\x65vent_id\x18\x01 \x01(\t\x12\x12\n\nevent_type\x18\x02 \x01(\t\x12\x15\n\rtimestamp_iso\x18\x03 \x01(\t\x12\x15\n\rpipeline_name\x18\x04 \x01(\t\x12\x14\n\x0cprocess_name\x18\x05 \x01(\t\x12\x13\n\x0btask_id_num\x18\x06 \x01(\x03\x12\x11\n\ttask_hash\x18\x07 \x01(\t\x12\x11\n\ttask_name\x18\x08 \x01(\t\x12\x11\n\tnative_id\x18\t \x01(\t\x12\x0e\n\x06status\x18\n \x01(\t\x12\x11\n\texit_code\x18\x0b \x01(\x05\x12\x13\n\x0b\x64uration_ms\x18\x0c \x01(\x03\x12\x13\n\x0brealtime_ms\x18\r \x01(\x03\x12\x13\n\x0b\x63pu_percent\x18\x0e \x01(\t\x12\x16\n\x0epeak_rss_bytes\x18\x0f \x01(\x03\x12\x17\n\x0fpeak_vmem_bytes\x18\x10 \x01(\x03\x12\x12\n\nread_bytes\x18\x11 \x01(\x03\x12\x13\n\x0bwrite_bytes\x18\x12 \x01(\x03\"s\n\x06\x41\x63tion\x12\x1c\n\x14observation_event_id\x18\x01 \x01(\t\x12\x11\n\taction_id\x18\x02 \x01(\t\x12\x16\n\x0e\x61\x63tion_details\x18\x03 \x01(\t\x12\x0f\n\x07success\x18\x04 \x01(\x08\x12\x0f\n\x07message\x18\x05 \x01(\t2]\n\x0f\x41iActionService\x12J\n\x13SendTaskObservation\x12\x1c.nf_ai_comms.TaskObservation\x1a\x13.nf_ai_comms.Action\"\x00\x42,\n\x1a\x63om.yourorg.bioflowml.grpcB\x0eNfAiCommsProtob\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x17proto/nf_ai_comms.proto\x12\x0bnf_ai_comms\"\x85\x03\n\x0fTaskObservation\x12\x10\n\x08\x65vent_id\x18\x01 \x01(\t\x12\x12\n\nevent_type\x18\x02 \x01(\t\x12\x15\n\rtimestamp_iso\x18\x03 \x01(\t\x12\x15\n\rpipeline_name\x18\x04 \x01(\t\x12\x14\n\x0cprocess_name\x18\x05 \x01(\t\x12\x13\n\x0btask_id_num\x18\x06 \x01(\x03\x12\x11\n\ttask_hash\x18\x07 \x01(\t\x12\x11\n\ttask_name\x18\x08 \x01(\t\x12\x11\n\tnative_id\x18\t \x01(\t\x12\x0e\n\x06status\x18\n \x01(\t\x12\x11\n\texit_code\x18\x0b \x01(\x05\x12\x13\n\x0b\x64uration_ms\x18\x0c \x01(\x03\x12\x13\n\x0brealtime_ms\x18\r \x01(\x03\x12\x13\n\x0b\x63pu_percent\x18\x0e \x01(\t\x12\x16\n\x0epeak_rss_bytes\x18\x0f \x01(\x03\x12\x17\n\x0fpeak_vmem_bytes\x18\x10 \x01(\x03\x12\x12\n\nread_bytes\x18\x11 \x01(\x03\x12\x13\n\x0bwrite_bytes\x18\x12 \x01(\x03\"\x85\x01\n\x06\x41\x63tion\x12\x1c\n\x14observation_event_id\x18\x01 \x01(\t\x12\x11\n\taction_id\x18\x02 \x01(\t\x12\x16\n\x0e\x61\x63tion_details\x18\x03 \x01(\t\x12\x0f\n\x07success\x18\x04 \x01(\x08\x12\x0f\n\x07message\x18\x05 \x01(\t\x12\x10\n\x08sequence\x18\x06 \x01(\x04\"a\n\x0bSessionInfo\x12\x12\n\nsession_id\x18\x01 \x01(\t\x12\x15\n\rpipeline_name\x18\x02 \x01(\t\x12\x14\n\x0cresume_after\x18\x03 \x01(\x04\x12\x11\n\tmax_batch\x18\x04 \x01(\r\"/\n\x0bSessionOpen\x12\x0f\n\x07session\x18\x01 \x01(\x04\x12\x0f\n\x07strings\x18\x02 \x03(\t\"-\n\rSessionHandle\x12\x0f\n\x07session\x18\x01 \x01(\x04\x12\x0b\n\x03ids\x18\x02 \x03(\r\"\x1f\n\x0cSessionClose\x12\x0f\n\x07session\x18\x01 \x01(\x04\"!\n\rSessionClosed\x12\x10\n\x08was_open\x18\x01 \x01(\x08\"\xc4\x03\n\x16\x43ompactTaskObservation\x12\x0f\n\x07session\x18\x01 \x01(\x04\x12\x10\n\x08\x65vent_id\x18\x02 \x01(\t\x12\x15\n\revent_type_id\x18\x03 \x01(\r\x12\x1a\n\x12timestamp_epoch_ms\x18\x04 \x01(\x03\x12\x18\n\x10pipeline_name_id\x18\x05 \x01(\r\x12\x17\n\x0fprocess_name_id\x18\x06 \x01(\r\x12\x13\n\x0btask_id_num\x18\x07 \x01(\x03\x12\x11\n\ttask_hash\x18\x08 \x01(\t\x12\x14\n\x0ctask_name_id\x18\t \x01(\r\x12\x11\n\tnative_id\x18\n \x01(\t\x12\x11\n\tstatus_id\x18\x0b \x01(\r\x12\x11\n\texit_code\x18\x0c \x01(\x05\x12\x13\n\x0b\x64uration_ms\x18\r \x01(\x03\x12\x13\n\x0brealtime_ms\x18\x0e \x01(\x03\x12\x13\n\x0b\x63pu_percent\x18\x0f \x01(\x02\x12\x16\n\x0epeak_rss_bytes\x18\x10 \x01(\x03\x12\x17\n\x0fpeak_vmem_bytes\x18\x11 \x01(\x03\x12\x12\n\nread_bytes\x18\x12 \x01(\x03\x12\x13\n\x0bwrite_bytes\x18\x13 \x01(\x03\x12\x11\n\ttask_name\x18\x14 \x01(\t\"d\n\x0eProfileRequest\x12\x12\n\nduration_s\x18\x01 \x01(\x02\x12\r\n\x05top_n\x18\x02 \x01(\r\x12\x15\n\rskip_cprofile\x18\x03 \x01(\x08\x12\x18\n\x10skip_tracemalloc\x18\x04 \x01(\x08\".\n\x0cProfileChunk\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\x32\xd1\x03\n\x0f\x41iActionService\x12J\n\x13SendTaskObservation\x12\x1c.nf_ai_comms.TaskObservation\x1a\x13.nf_ai_comms.Action\"\x00\x12\x45\n\x10SubscribeActions\x12\x18.nf_ai_comms.SessionInfo\x1a\x13.nf_ai_comms.Action\"\x00\x30\x01\x12\x45\n\x0bOpenSession\x12\x18.nf_ai_comms.SessionOpen\x1a\x1a.nf_ai_comms.SessionHandle\"\x00\x12T\n\x16SendCompactObservation\x12#.nf_ai_comms.CompactTaskObservation\x1a\x13.nf_ai_comms.Action\"\x00\x12G\n\x0c\x43loseSession\x12\x19.nf_ai_comms.SessionClose\x1a\x1a.nf_ai_comms.SessionClosed\"\x00\x12\x45\n\x07Profile\x12\x1b.nf_ai_comms.ProfileRequest\x1a\x19.nf_ai_comms.ProfileChunk\"\x00\x30\x01\x42,\n\x1a\x63om.yourorg.bioflowml.grpcB\x0eNfAiCommsProtob\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
-_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'nf_ai_comms_pb2', _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'proto.nf_ai_comms_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   _globals['DESCRIPTOR']._loaded_options = None
   _globals['DESCRIPTOR']._serialized_options = b'\n\032com.yourorg.bioflowml.grpcB\016NfAiCommsProto'
-  _globals['_TASKOBSERVATION']._serialized_start=35
-  _globals['_TASKOBSERVATION']._serialized_end=424
-  _globals['_ACTION']._serialized_start=426
-  _globals['_ACTION']._serialized_end=541
-  _globals['_AIACTIONSERVICE']._serialized_start=543
-  _globals['_AIACTIONSERVICE']._serialized_end=636
+  _globals['_TASKOBSERVATION']._serialized_start=41
+  _globals['_TASKOBSERVATION']._serialized_end=430
+  _globals['_ACTION']._serialized_start=433
+  _globals['_ACTION']._serialized_end=566
+  _globals['_SESSIONINFO']._serialized_start=568
+  _globals['_SESSIONINFO']._serialized_end=665
+  _globals['_SESSIONOPEN']._serialized_start=667
+  _globals['_SESSIONOPEN']._serialized_end=714
+  _globals['_SESSIONHANDLE']._serialized_start=716
+  _globals['_SESSIONHANDLE']._serialized_end=761
+  _globals['_SESSIONCLOSE']._serialized_start=763
+  _globals['_SESSIONCLOSE']._serialized_end=794
+  _globals['_SESSIONCLOSED']._serialized_start=796
+  _globals['_SESSIONCLOSED']._serialized_end=829
+  _globals['_COMPACTTASKOBSERVATION']._serialized_start=832
+  _globals['_COMPACTTASKOBSERVATION']._serialized_end=1284
+  _globals['_PROFILEREQUEST']._serialized_start=1286
+  _globals['_PROFILEREQUEST']._serialized_end=1386
+  _globals['_PROFILECHUNK']._serialized_start=1388
+  _globals['_PROFILECHUNK']._serialized_end=1434
+  _globals['_AIACTIONSERVICE']._serialized_start=1437
+  _globals['_AIACTIONSERVICE']._serialized_end=1902
 # @@protoc_insertion_point(module_scope)
@@ -3,7 +3,7 @@
 import grpc
 import warnings
 
-import nf_ai_comms_pb2 as nf__ai__comms__pb2
+from proto import nf_ai_comms_pb2 as proto_dot_nf__ai__comms__pb2
 
 GRPC_GENERATED_VERSION = '1.71.0'
 GRPC_VERSION = grpc.__version__
@@ -18,7 +18,7 @@ except ImportError:
 if _version_not_supported:
     raise RuntimeError(
         f'The grpc package installed is at version {GRPC_VERSION},'
-        + f' but the generated code in nf_ai_comms_pb2_grpc.py depends on'
+        + f' but the generated code in proto/nf_ai_comms_pb2_grpc.py depends on'
         + f' grpcio>={GRPC_GENERATED_VERSION}.'
         + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
         + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
@@ -37,8 +37,33 @@ class AiActionServiceStub(object):
         """
         self.SendTaskObservation = channel.unary_unary(
                 '/nf_ai_comms.AiActionService/SendTaskObservation',
-                request_serializer=nf__ai__comms__pb2.TaskObservation.SerializeToString,
-                response_deserializer=nf__ai__comms__pb2.Action.FromString,
+                request_serializer=proto_dot_nf__ai__comms__pb2.TaskObservation.SerializeToString,
+                response_deserializer=proto_dot_nf__ai__comms__pb2.Action.FromString,
+                _registered_method=True)
+        self.SubscribeActions = channel.unary_stream(
+                '/nf_ai_comms.AiActionService/SubscribeActions',
+                request_serializer=proto_dot_nf__ai__comms__pb2.SessionInfo.SerializeToString,
+                response_deserializer=proto_dot_nf__ai__comms__pb2.Action.FromString,
+                _registered_method=True)
+        self.OpenSession = channel.unary_unary(
+                '/nf_ai_comms.AiActionService/OpenSession',
+                request_serializer=proto_dot_nf__ai__comms__pb2.SessionOpen.SerializeToString,
+                response_deserializer=proto_dot_nf__ai__comms__pb2.SessionHandle.FromString,
+                _registered_method=True)
+        self.SendCompactObservation = channel.unary_unary(
+                '/nf_ai_comms.AiActionService/SendCompactObservation',
+                request_serializer=proto_dot_nf__ai__comms__pb2.CompactTaskObservation.SerializeToString,
+                response_deserializer=proto_dot_nf__ai__comms__pb2.Action.FromString,
+                _registered_method=True)
+        self.CloseSession = channel.unary_unary(
+                '/nf_ai_comms.AiActionService/CloseSession',
+                request_serializer=proto_dot_nf__ai__comms__pb2.SessionClose.SerializeToString,
+                response_deserializer=proto_dot_nf__ai__comms__pb2.SessionClosed.FromString,
+                _registered_method=True)
+        self.Profile = channel.unary_stream(
+                '/nf_ai_comms.AiActionService/Profile',
+                request_serializer=proto_dot_nf__ai__comms__pb2.ProfileRequest.SerializeToString,
+                response_deserializer=proto_dot_nf__ai__comms__pb2.ProfileChunk.FromString,
                 _registered_method=True)
 
 
@@ -53,13 +78,79 @@ class AiActionServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def SubscribeActions(self, request, context):
+        """Nextflow subscribes once per run; AiActionStreamer pushes actions it decides on
+        its own (e.g. kill a straggler, pre-scale a process) without waiting for an event.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def OpenSession(self, request, context):
+        """Registers strings a Nextflow run keeps repeating (pipeline, process and task
+        names, event types, statuses) and returns their integer ids. Call again with
+        the returned session to register more.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SendCompactObservation(self, request, context):
+        """Same as SendTaskObservation, with interned strings and a numeric timestamp.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CloseSession(self, request, context):
+        """Drops a session's intern table; Nextflow calls it when the run ends.
+        Sessions that are never closed expire after an idle timeout.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Profile(self, request, context):
+        """Admin: profiles the server for a bounded time (event-loop lag, per-handler
+        wall/CPU time, tracemalloc top-N, cProfile) and streams back the report, a
+        zip archive, in chunks. One profile runs at a time.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_AiActionServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
             'SendTaskObservation': grpc.unary_unary_rpc_method_handler(
                     servicer.SendTaskObservation,
-                    request_deserializer=nf__ai__comms__pb2.TaskObservation.FromString,
-                    response_serializer=nf__ai__comms__pb2.Action.SerializeToString,
+                    request_deserializer=proto_dot_nf__ai__comms__pb2.TaskObservation.FromString,
+                    response_serializer=proto_dot_nf__ai__comms__pb2.Action.SerializeToString,
+            ),
+            'SubscribeActions': grpc.unary_stream_rpc_method_handler(
+                    servicer.SubscribeActions,
+                    request_deserializer=proto_dot_nf__ai__comms__pb2.SessionInfo.FromString,
+                    response_serializer=proto_dot_nf__ai__comms__pb2.Action.SerializeToString,
+            ),
+            'OpenSession': grpc.unary_unary_rpc_method_handler(
+                    servicer.OpenSession,
+                    request_deserializer=proto_dot_nf__ai__comms__pb2.SessionOpen.FromString,
+                    response_serializer=proto_dot_nf__ai__comms__pb2.SessionHandle.SerializeToString,
+            ),
+            'SendCompactObservation': grpc.unary_unary_rpc_method_handler(
+                    servicer.SendCompactObservation,
+                    request_deserializer=proto_dot_nf__ai__comms__pb2.CompactTaskObservation.FromString,
+                    response_serializer=proto_dot_nf__ai__comms__pb2.Action.SerializeToString,
+            ),
+            'CloseSession': grpc.unary_unary_rpc_method_handler(
+                    servicer.CloseSession,
+                    request_deserializer=proto_dot_nf__ai__comms__pb2.SessionClose.FromString,
+                    response_serializer=proto_dot_nf__ai__comms__pb2.SessionClosed.SerializeToString,
+            ),
+            'Profile': grpc.unary_stream_rpc_method_handler(
+                    servicer.Profile,
+                    request_deserializer=proto_dot_nf__ai__comms__pb2.ProfileRequest.FromString,
+                    response_serializer=proto_dot_nf__ai__comms__pb2.ProfileChunk.SerializeToString,
             ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
@@ -88,8 +179,143 @@ class AiActionService(object):
             request,
             target,
             '/nf_ai_comms.AiActionService/SendTaskObservation',
-            nf__ai__comms__pb2.TaskObservation.SerializeToString,
-            nf__ai__comms__pb2.Action.FromString,
+            proto_dot_nf__ai__comms__pb2.TaskObservation.SerializeToString,
+            proto_dot_nf__ai__comms__pb2.Action.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SubscribeActions(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/nf_ai_comms.AiActionService/SubscribeActions',
+            proto_dot_nf__ai__comms__pb2.SessionInfo.SerializeToString,
+            proto_dot_nf__ai__comms__pb2.Action.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def OpenSession(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/nf_ai_comms.AiActionService/OpenSession',
+            proto_dot_nf__ai__comms__pb2.SessionOpen.SerializeToString,
+            proto_dot_nf__ai__comms__pb2.SessionHandle.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SendCompactObservation(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/nf_ai_comms.AiActionService/SendCompactObservation',
+            proto_dot_nf__ai__comms__pb2.CompactTaskObservation.SerializeToString,
+            proto_dot_nf__ai__comms__pb2.Action.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CloseSession(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/nf_ai_comms.AiActionService/CloseSession',
+            proto_dot_nf__ai__comms__pb2.SessionClose.SerializeToString,
+            proto_dot_nf__ai__comms__pb2.SessionClosed.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Profile(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/nf_ai_comms.AiActionService/Profile',
+            proto_dot_nf__ai__comms__pb2.ProfileRequest.SerializeToString,
+            proto_dot_nf__ai__comms__pb2.ProfileChunk.FromString,
             options,
             channel_credentials,
             insecure,
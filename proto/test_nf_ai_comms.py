@@ -2,7 +2,7 @@ import unittest
 import time
 
 # Import the generated message classes
-from nf_ai_comms_pb2 import TaskObservation, Action
+from proto.nf_ai_comms_pb2 import TaskObservation, Action
 
 class TestNfAiCommsMessages(unittest.TestCase):
 
@@ -0,0 +1,252 @@
+"""
+Prioritized experience replay backed by preallocated shared memory.
+
+All storage (transitions plus the sum-tree of priorities) lives in a single
+multiprocessing.shared_memory block allocated up front, so the memory cap is
+fixed at construction and co-located worker processes can attach by name.
+Priorities are kept in an array-backed sum-tree: updates and prefix-sum
+sampling are O(log n) and vectorized across a whole batch with NumPy.
+
+Concurrency: writers hold `lock` only while reserving slots, copying a batch in
+and repairing the touched tree paths, so appends should be batched (see
+ai_action_streamer.transitions.TransitionAssembler). Sampling does not take the
+lock; it may observe a batch mid-update, which only perturbs sampling
+probabilities for that batch.
+
+For Ray training workers, ReplayBufferActor owns a buffer and serves sample()
+results through the object store (NumPy arrays are read zero-copy by workers).
+"""
+from multiprocessing import shared_memory
+import threading
+
+import numpy as np
+import ray
+
+_HEADER_SLOTS = 4  # next_index, size, max_priority, (reserved)
+
+
+def _tree_leaves(capacity):
+    leaves = 1
+    while leaves < capacity:
+        leaves *= 2
+    return leaves
+
+
+def _layout(capacity, obs_dim):
+    """Returns ({field: (offset, dtype, shape)}, total_bytes) for the shared block."""
+    leaves = _tree_leaves(capacity)
+    fields = (
+        ("header", np.float64, (_HEADER_SLOTS,)),
+        ("tree", np.float64, (2 * leaves,)),
+        ("obs", np.float32, (capacity, obs_dim)),
+        ("next_obs", np.float32, (capacity, obs_dim)),
+        ("actions", np.int64, (capacity,)),
+        ("rewards", np.float32, (capacity,)),
+        ("dones", np.bool_, (capacity,)),
+    )
+    layout = {}
+    offset = 0
+    for name, dtype, shape in fields:
+        offset = (offset + 63) // 64 * 64  # cache-line align each array
+        layout[name] = (offset, dtype, shape)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return layout, offset
+
+
+def buffer_nbytes(capacity, obs_dim):
+    """Bytes of shared memory a buffer of this shape occupies."""
+    return _layout(capacity, obs_dim)[1]
+
+
+def capacity_for_memory(max_bytes, obs_dim):
+    """Largest capacity whose buffer fits in `max_bytes` of shared memory."""
+    lo, hi = 0, max(1, max_bytes)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if buffer_nbytes(mid, obs_dim) <= max_bytes:
+            lo = mid
+        else:
+            hi = mid - 1
+    if lo == 0:
+        raise ValueError(f"{max_bytes} bytes cannot hold a single transition of obs_dim={obs_dim}")
+    return lo
+
+
+class PrioritizedReplayBuffer:
+    """
+    Args:
+        capacity (int): Number of transitions kept; the oldest are overwritten.
+        obs_dim (int): Length of each encoded observation.
+        alpha (float): Priority exponent (0 = uniform sampling).
+        name (str): Shared memory block name. Generated if None and create=True.
+        create (bool): Allocate a new block (True) or attach to an existing one.
+        lock: Lock used by writers; pass a multiprocessing.Lock when several
+            processes append to the same block. Defaults to a threading.Lock.
+    """
+
+    def __init__(self, capacity, obs_dim, alpha=0.6, name=None, create=True, lock=None):
+        self.capacity = capacity
+        self.obs_dim = obs_dim
+        self.alpha = alpha
+        self.lock = lock if lock is not None else threading.Lock()
+        self._leaves = _tree_leaves(capacity)
+        self._depth = self._leaves.bit_length() - 1
+        layout, nbytes = _layout(capacity, obs_dim)
+        self.nbytes = nbytes
+        self._owner = create
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=nbytes)
+        self.name = self._shm.name
+        for field, (offset, dtype, shape) in layout.items():
+            setattr(self, "_" + field, np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset))
+        if create:
+            self._header[:] = 0.0
+            self._header[2] = 1.0  # max priority seen so far
+            self._tree[:] = 0.0
+
+    @classmethod
+    def attach(cls, name, capacity, obs_dim, alpha=0.6, lock=None):
+        """Attaches to a buffer created by another process."""
+        return cls(capacity, obs_dim, alpha=alpha, name=name, create=False, lock=lock)
+
+    def __len__(self):
+        return int(self._header[1])
+
+    @property
+    def total_priority(self):
+        return float(self._tree[1])
+
+    def add_batch(self, obs, actions, rewards, next_obs, dones, priorities=None):
+        """
+        Appends a batch of transitions. New transitions get the maximum priority
+        seen so far unless `priorities` is given, so each is sampled at least once
+        with high probability.
+
+        Returns:
+            np.ndarray: Buffer indices the transitions were written to.
+        """
+        n = len(actions)
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+        if n > self.capacity:
+            obs, actions, rewards, next_obs, dones = (
+                a[-self.capacity:] for a in (obs, actions, rewards, next_obs, dones)
+            )
+            if priorities is not None:
+                priorities = priorities[-self.capacity:]
+            n = self.capacity
+        with self.lock:
+            start = int(self._header[0])
+            indices = (start + np.arange(n)) % self.capacity
+            self._obs[indices] = obs
+            self._next_obs[indices] = next_obs
+            self._actions[indices] = actions
+            self._rewards[indices] = rewards
+            self._dones[indices] = dones
+            if priorities is None:
+                scaled = np.full(n, self._header[2] ** self.alpha)
+            else:
+                priorities = np.asarray(priorities, dtype=np.float64)
+                self._header[2] = max(self._header[2], float(priorities.max()))
+                scaled = np.power(priorities, self.alpha)
+            self._set_leaves(indices, scaled)
+            self._header[0] = (start + n) % self.capacity
+            self._header[1] = min(self.capacity, int(self._header[1]) + n)
+        return indices
+
+    def update_priorities(self, indices, priorities):
+        """Sets new priorities (e.g. |TD error| + eps) for previously sampled indices."""
+        indices = np.asarray(indices, dtype=np.int64)
+        priorities = np.asarray(priorities, dtype=np.float64)
+        with self.lock:
+            self._header[2] = max(self._header[2], float(priorities.max()))
+            self._set_leaves(indices, np.power(priorities, self.alpha))
+
+    def _set_leaves(self, indices, values):
+        tree = self._tree
+        nodes = indices + self._leaves
+        tree[nodes] = values
+        nodes = np.unique(nodes >> 1)
+        for _ in range(self._depth):
+            tree[nodes] = tree[2 * nodes] + tree[2 * nodes + 1]
+            nodes = np.unique(nodes >> 1)
+
+    def sample(self, batch_size, beta=0.4, rng=None):
+        """
+        Draws a stratified prioritized batch.
+
+        Returns:
+            dict: obs, actions, rewards, next_obs, dones, indices and importance
+            sampling `weights` (normalized to a max of 1).
+        """
+        size = len(self)
+        if size == 0:
+            raise ValueError("Cannot sample from an empty replay buffer")
+        rng = rng if rng is not None else np.random.default_rng()
+        tree = self._tree
+        total = tree[1]
+        segment = total / batch_size
+        targets = (np.arange(batch_size) + rng.random(batch_size)) * segment
+        nodes = np.ones(batch_size, dtype=np.int64)
+        for _ in range(self._depth):
+            left = 2 * nodes
+            left_sum = tree[left]
+            go_right = targets >= left_sum
+            targets = np.where(go_right, targets - left_sum, targets)
+            nodes = left + go_right
+        indices = np.minimum(nodes - self._leaves, size - 1)
+        probabilities = tree[indices + self._leaves] / total
+        weights = np.power(size * np.maximum(probabilities, 1e-12), -beta)
+        weights /= weights.max()
+        return {
+            "obs": self._obs[indices],
+            "actions": self._actions[indices],
+            "rewards": self._rewards[indices],
+            "next_obs": self._next_obs[indices],
+            "dones": self._dones[indices],
+            "indices": indices,
+            "weights": weights.astype(np.float32),
+        }
+
+    def close(self):
+        """Detaches from the block, freeing it if this instance created it."""
+        for field in ("_header", "_tree", "_obs", "_next_obs", "_actions", "_rewards", "_dones"):
+            setattr(self, field, None)
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+@ray.remote
+class ReplayBufferActor:
+    """
+    Ray actor owning a PrioritizedReplayBuffer. The action service sends it
+    batches (add_batch.remote) and rollout/training workers sample from it.
+    """
+
+    def __init__(self, capacity=None, obs_dim=None, max_bytes=None, alpha=0.6):
+        if capacity is None:
+            if max_bytes is None:
+                raise ValueError("Either capacity or max_bytes is required")
+            capacity = capacity_for_memory(max_bytes, obs_dim)
+        self.buffer = PrioritizedReplayBuffer(capacity, obs_dim, alpha=alpha)
+
+    def add_batch(self, obs, actions, rewards, next_obs, dones, priorities=None):
+        self.buffer.add_batch(obs, actions, rewards, next_obs, dones, priorities)
+        return len(self.buffer)
+
+    def sample(self, batch_size, beta=0.4):
+        return self.buffer.sample(batch_size, beta=beta)
+
+    def update_priorities(self, indices, priorities):
+        self.buffer.update_priorities(indices, priorities)
+
+    def stats(self):
+        return {
+            "size": len(self.buffer),
+            "capacity": self.buffer.capacity,
+            "nbytes": self.buffer.nbytes,
+            "total_priority": self.buffer.total_priority,
+        }
+
+    def shutdown(self):
+        self.buffer.close()
@@ -0,0 +1,226 @@
+"""
+CPU-only multi-agent training harness.
+
+One linear softmax agent per decision domain (executor choice, memory sizing,
+retry; see ai_action_streamer.policy.DEFAULT_AGENTS) is trained with REINFORCE
+against state_simulation.cluster_env.ClusterEnv. Rollouts run in parallel Ray
+actors, each stepping a whole batch of simulated tasks per policy call; the
+driver aggregates gradients and broadcasts new parameters through the object
+store. Checkpoints are written with MultiAgentPolicy.save(), the format
+AiActionStreamer loads via `policy_checkpoint=`.
+
+Training is on-policy and simulator-only: it does not sample the live
+transitions collected in replay_buffer.ReplayBufferActor, which are kept for
+an off-policy learner that is not part of this harness.
+
+Usage (from the project root):
+    python ray-multiagent/trainer.py --actors 4 --iterations 50 --checkpoint /tmp/policy.npz
+    python ray-multiagent/trainer.py --traces logs/ --checkpoint /tmp/policy.npz
+    python ray-multiagent/trainer.py --scaling 1,2,4,8
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import ray
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from ai_action_streamer.policy import MultiAgentPolicy
+from state_simulation.cluster_env import ClusterEnv
+
+
+def reinforce_gradients(policy, rollout):
+    """
+    Policy-gradient estimate for every agent from one rollout.
+
+    Uses the batch-mean episode return as baseline. Returns
+    {agent: (grad_weights, grad_bias)} for gradient *ascent*, plus the number
+    of decisions each agent contributed.
+    """
+    returns = rollout["returns"]
+    advantages = returns - returns.mean()
+    scale = returns.std() + 1e-8
+    grads = {}
+    counts = {}
+    for agent, (obs, actions, episodes) in rollout["decisions"].items():
+        if len(actions) == 0:
+            continue
+        probs = policy.probabilities(agent, obs)
+        coeff = -probs
+        coeff[np.arange(len(actions)), actions.astype(np.int64)] += 1.0
+        coeff *= (advantages[episodes] / scale)[:, None]
+        grads[agent] = (obs.T @ coeff, coeff.sum(axis=0))
+        counts[agent] = len(actions)
+    return grads, counts
+
+
+@ray.remote(num_cpus=1)
+class RolloutWorker:
+    """Owns a ClusterEnv and returns gradients computed on its own rollouts."""
+
+    def __init__(self, seed, batch_size=1024, env_kwargs=None):
+        self.env = ClusterEnv(batch_size=batch_size, seed=seed, **(env_kwargs or {}))
+        self.policy = MultiAgentPolicy()
+        self.rng = np.random.default_rng(seed + 1)
+
+    def rollout(self, params, batches=1):
+        """Runs `batches` vectorized rollouts with `params` and returns summed gradients and stats."""
+        self.policy.set_params(params)
+        totals = {}
+        counts = {}
+        episodes = 0
+        stats = {"return": 0.0, "cost": 0.0, "makespan_s": 0.0, "failed": 0.0}
+        for _ in range(batches):
+            result = self.env.run_batch(lambda agent, obs: self.policy.act(agent, obs, rng=self.rng))
+            grads, batch_counts = reinforce_gradients(self.policy, result)
+            for agent, (gw, gb) in grads.items():
+                if agent in totals:
+                    totals[agent] = (totals[agent][0] + gw, totals[agent][1] + gb)
+                else:
+                    totals[agent] = (gw, gb)
+                counts[agent] = counts.get(agent, 0) + batch_counts[agent]
+            episodes += len(result["returns"])
+            stats["return"] += float(result["returns"].sum())
+            stats["cost"] += float(result["cost"].sum())
+            stats["makespan_s"] += float(result["makespan_s"].sum())
+            stats["failed"] += float(result["failed"].sum())
+        return totals, counts, episodes, stats
+
+
+class MultiAgentTrainer:
+    """
+    Args:
+        num_actors (int): Parallel RolloutWorker actors.
+        batch_size (int): Simulated tasks per vectorized rollout.
+        batches_per_actor (int): Rollouts each actor runs per iteration.
+        learning_rate (float): Step size for the averaged policy gradient.
+        seed (int): Base seed; actor i uses seed + 1000 * i.
+        policy (MultiAgentPolicy): Starting policy (uniform if None).
+    """
+
+    def __init__(self, num_actors=2, batch_size=1024, batches_per_actor=1, learning_rate=0.05,
+                 seed=0, policy=None, env_kwargs=None):
+        self.policy = policy if policy is not None else MultiAgentPolicy()
+        self.learning_rate = learning_rate
+        self.batches_per_actor = batches_per_actor
+        self.workers = [
+            RolloutWorker.remote(seed + 1000 * i, batch_size, env_kwargs) for i in range(num_actors)
+        ]
+        self.iteration = 0
+
+    def train_iteration(self):
+        """Runs one synchronous iteration; returns a dict of metrics including samples_per_s."""
+        start = time.perf_counter()
+        params_ref = ray.put(self.policy.get_params())
+        results = ray.get([w.rollout.remote(params_ref, self.batches_per_actor) for w in self.workers])
+
+        episodes = sum(r[2] for r in results)
+        params = self.policy.get_params()
+        for agent, (weights, bias) in params.items():
+            count = sum(r[1].get(agent, 0) for r in results)
+            if count == 0:
+                continue
+            gw = sum(r[0][agent][0] for r in results if agent in r[0]) / count
+            gb = sum(r[0][agent][1] for r in results if agent in r[0]) / count
+            params[agent] = (weights + self.learning_rate * gw, bias + self.learning_rate * gb)
+        self.policy.set_params(params)
+        self.iteration += 1
+
+        elapsed = time.perf_counter() - start
+        totals = {key: sum(r[3][key] for r in results) for key in results[0][3]}
+        return {
+            "iteration": self.iteration,
+            "episodes": episodes,
+            "samples_per_s": episodes / elapsed,
+            "mean_return": totals["return"] / episodes,
+            "mean_cost": totals["cost"] / episodes,
+            "mean_makespan_s": totals["makespan_s"] / episodes,
+            "failure_rate": totals["failed"] / episodes,
+        }
+
+    def save_checkpoint(self, path):
+        # The iteration alone repeats across training runs.
+        self.policy.version = f"iter-{self.iteration}-{self.policy.fingerprint()[:12]}"
+        self.policy.save(path)
+
+    def shutdown(self):
+        for worker in self.workers:
+            ray.kill(worker)
+        self.workers = []
+
+
+def measure_scaling(actor_counts, iterations=5, batch_size=4096, batches_per_actor=4):
+    """
+    Reports rollout samples/sec for each number of rollout actors.
+
+    The first iteration of each configuration is a warm-up and is not timed.
+
+    Returns:
+        list of (num_actors, samples_per_s, speedup over the first configuration).
+    """
+    report = []
+    for count in actor_counts:
+        trainer = MultiAgentTrainer(num_actors=count, batch_size=batch_size, batches_per_actor=batches_per_actor)
+        trainer.train_iteration()
+        rates = [trainer.train_iteration()["samples_per_s"] for _ in range(iterations)]
+        trainer.shutdown()
+        rate = float(np.median(rates))
+        report.append((count, rate, rate / report[0][1] if report else 1.0))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actors", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--learning-rate", type=float, default=0.05)
+    parser.add_argument("--checkpoint", default=None, help="Where to write the trained policy (.npz)")
+    parser.add_argument("--scaling", default=None, help="Comma-separated actor counts to benchmark, e.g. 1,2,4")
+    parser.add_argument("--num-cpus", type=int, default=None,
+                        help="CPUs for the local Ray cluster (each rollout actor reserves one)")
+    parser.add_argument("--traces", nargs="+", default=None,
+                        help="Trace files/directories to calibrate the simulator workload from")
+    parser.add_argument("--calibration-cache", default=".calibration_cache")
+    args = parser.parse_args(argv)
+
+    env_kwargs = None
+    if args.traces:
+        from state_simulation.calibration import calibrate
+        from state_simulation.evaluation import find_traces
+        workload = calibrate(find_traces(args.traces), args.calibration_cache)
+        print(f"Calibrated workload for processes: {', '.join(workload.process_names)}")
+        env_kwargs = {"workload": workload}
+
+    if not ray.is_initialized():
+        ray.init(num_cpus=args.num_cpus, ignore_reinit_error=True, log_to_driver=False, include_dashboard=False)
+    try:
+        if args.scaling:
+            counts = [int(c) for c in args.scaling.split(",")]
+            print(f"{'actors':>6} {'samples/s':>12} {'speedup':>8}")
+            for count, rate, speedup in measure_scaling(counts):
+                print(f"{count:>6} {rate:>12,.0f} {speedup:>8.2f}")
+            return
+
+        trainer = MultiAgentTrainer(num_actors=args.actors, batch_size=args.batch_size,
+                                    learning_rate=args.learning_rate, env_kwargs=env_kwargs)
+        for _ in range(args.iterations):
+            m = trainer.train_iteration()
+            print(f"iter {m['iteration']:4d}  return {m['mean_return']:8.3f}  cost ${m['mean_cost']:.3f}  "
+                  f"makespan {m['mean_makespan_s']:7.0f}s  failures {m['failure_rate']:.1%}  "
+                  f"{m['samples_per_s']:,.0f} samples/s")
+        if args.checkpoint:
+            trainer.save_checkpoint(args.checkpoint)
+            print(f"Policy checkpoint written to {args.checkpoint}")
+        trainer.shutdown()
+    finally:
+        ray.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Calibration of the cluster simulator from recorded Nextflow traces.
+
+For every process_name, the duration, peak memory and IO volume seen in the
+traces are fitted as a lognormal body plus a Pareto tail above the 95th
+percentile (Hill estimator), and duration / memory are regressed on input size
+(log-log) so that large inputs produce long, memory-hungry tasks. A process
+requests the same CPUs for every task, so its CPU count is the median usage
+rounded up rather than a fitted distribution.
+
+Work is cached under `cache_dir`:
+    files/<trace sha256>.npz        per-file extracted samples (only new or changed files are parsed)
+    fits/<trace set sha256>.json    fitted models for exactly that set of files
+
+Fitting runs one process_name per worker in a process pool. The result,
+CalibratedWorkload, has the `sample(n, rng)` interface ClusterEnv expects:
+
+    workload = calibrate(find_traces(["logs/"]), ".calibration_cache")
+    env = ClusterEnv(workload=workload)
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from state_simulation.traces import file_sha256, read_trace
+
+METRICS = ("duration_s", "peak_rss_bytes", "cpus", "io_bytes")
+# Metrics fitted as lognormal body plus Pareto tail.
+FITTED = ("duration_s", "peak_rss_bytes", "io_bytes")
+# Metrics regressed on input size (read_bytes).
+INPUT_DEPENDENT = ("duration_s", "peak_rss_bytes")
+
+CALIBRATION_REVISION = 2
+_TAIL_QUANTILE = 0.95
+_MIN_TAIL_SAMPLES = 10
+_MAX_TAIL_XI = 0.9  # keep the tail's mean finite
+
+
+def extract_samples(path):
+    """Per-process sample arrays from one trace file (completed tasks only)."""
+    columns = {}
+    for r in read_trace(path):
+        if r.status not in ("COMPLETED", "CACHED") or r.exit_code not in (0, -1):
+            continue
+        duration_ms = r.realtime_ms or r.duration_ms
+        if duration_ms <= 0 or r.peak_rss_bytes <= 0:
+            continue
+        c = columns.setdefault(r.process_name, {m: [] for m in METRICS + ("input_bytes",)})
+        c["duration_s"].append(duration_ms / 1000.0)
+        c["peak_rss_bytes"].append(float(r.peak_rss_bytes))
+        c["cpus"].append(max(r.cpu_percent, 1.0) / 100.0)
+        c["io_bytes"].append(float(max(r.read_bytes + r.write_bytes, 1)))
+        c["input_bytes"].append(float(r.read_bytes))
+    return {name: {k: np.asarray(v) for k, v in c.items()} for name, c in columns.items()}
+
+
+def _load_file_samples(path, sha, cache_dir):
+    cached = os.path.join(cache_dir, "files", f"{sha}.npz")
+    if os.path.exists(cached):
+        with np.load(cached, allow_pickle=False) as data:
+            samples = {}
+            for key in data.files:
+                process, column = key.rsplit("/", 1)
+                samples.setdefault(process, {})[column] = data[key]
+        return samples
+    samples = extract_samples(path)
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp = cached + ".tmp.npz"
+    np.savez(tmp, **{f"{p}/{k}": v for p, cols in samples.items() for k, v in cols.items()})
+    os.replace(tmp, cached)
+    return samples
+
+
+def fit_marginal(values):
+    """Lognormal body plus Hill-estimated Pareto tail above the 95th percentile."""
+    logs = np.log(values)
+    fit = {
+        "mu": float(logs.mean()),
+        "sigma": float(logs.std()) if len(logs) > 1 else 0.0,
+        "tail_threshold": None,
+        "tail_xi": 0.0,
+        "tail_fraction": 0.0,
+    }
+    threshold = float(np.quantile(values, _TAIL_QUANTILE))
+    tail = values[values > threshold]
+    if len(tail) >= _MIN_TAIL_SAMPLES and threshold > 0:
+        xi = float(np.mean(np.log(tail / threshold)))
+        fit.update(tail_threshold=threshold, tail_xi=min(xi, _MAX_TAIL_XI),
+                   tail_fraction=len(tail) / len(values))
+    return fit
+
+
+def fit_input_regression(log_input, log_values):
+    """log(value) = intercept + slope * log(input) + N(0, residual_sigma)."""
+    if len(log_input) < 3 or np.ptp(log_input) == 0:
+        return None
+    slope, intercept = np.polyfit(log_input, log_values, 1)
+    residual = log_values - (intercept + slope * log_input)
+    return {
+        "slope": float(slope),
+        "intercept": float(intercept),
+        "residual_sigma": float(residual.std()),
+        "correlation": float(np.corrcoef(log_input, log_values)[0, 1]),
+    }
+
+
+def fit_process(name, columns):
+    """Fits every metric of one process. Runs in a worker process."""
+    n = len(columns["duration_s"])
+    model = {"process_name": name, "samples": n, "metrics": {}, "input": None,
+             "cpus": max(1, int(np.ceil(np.median(columns["cpus"]))))}
+    for metric in FITTED:
+        model["metrics"][metric] = fit_marginal(columns[metric])
+    positive = columns["input_bytes"] > 0
+    if positive.sum() >= 3:
+        log_input = np.log(columns["input_bytes"][positive])
+        model["input"] = {
+            "mu": float(log_input.mean()),
+            "sigma": float(log_input.std()),
+            "regressions": {
+                metric: fit_input_regression(log_input, np.log(columns[metric][positive]))
+                for metric in INPUT_DEPENDENT
+            },
+        }
+    return model
+
+
+def _sample_marginal(fit, n, rng, log_center=None, log_sigma=None):
+    # Draws are made around the fitted median and then scaled by exp(log_center - mu), so a
+    # regression center moves the body, the threshold and the tail together: a large input
+    # keeps its larger runtime / memory instead of saturating at the unconditional threshold.
+    mu = fit["mu"]
+    sigma = fit["sigma"] if log_sigma is None else log_sigma
+    values = np.exp(mu + sigma * rng.standard_normal(n))
+    threshold = fit["tail_threshold"]
+    if threshold is not None and fit["tail_fraction"] > 0:
+        # Body draws stay below the threshold (a few rejection rounds, then clip)...
+        for _ in range(5):
+            over = np.flatnonzero(values > threshold)
+            if len(over) == 0:
+                break
+            values[over] = np.exp(mu + sigma * rng.standard_normal(len(over)))
+        np.minimum(values, threshold, out=values)
+        # ...and tail_fraction of the draws come from the Pareto tail (index 1/xi) above it.
+        in_tail = rng.random(n) < fit["tail_fraction"]
+        k = int(in_tail.sum())
+        if k:
+            values[in_tail] = threshold * rng.random(k) ** (-fit["tail_xi"])
+    if log_center is not None:
+        values *= np.exp(log_center - mu)
+    return values
+
+
+class CalibratedWorkload:
+    """
+    Simulator workload drawn from fitted per-process models.
+
+    Args:
+        models (list): fit_process() outputs.
+        trace_set_sha256 (str): Hash of the trace set the models were fitted on.
+    """
+
+    def __init__(self, models, trace_set_sha256=None):
+        self.models = sorted(models, key=lambda m: m["process_name"])
+        self.trace_set_sha256 = trace_set_sha256
+        self.process_names = [m["process_name"] for m in self.models]
+        counts = np.array([m["samples"] for m in self.models], dtype=np.float64)
+        self.weights = counts / counts.sum()
+
+    def sample(self, n, rng):
+        process = rng.choice(len(self.models), size=n, p=self.weights)
+        out = {
+            "process": process,
+            "cpus": np.empty(n, dtype=np.int64),
+            "duration_s": np.empty(n),
+            "peak_rss_bytes": np.empty(n),
+            "read_bytes": np.zeros(n),
+            "write_bytes": np.zeros(n),
+            "est_duration_s": np.empty(n),
+            "est_rss_bytes": np.empty(n),
+        }
+        for p, model in enumerate(self.models):
+            idx = np.flatnonzero(process == p)
+            k = len(idx)
+            if k == 0:
+                continue
+            metrics = model["metrics"]
+            log_input = None
+            if model["input"] is not None:
+                log_input = model["input"]["mu"] + model["input"]["sigma"] * rng.standard_normal(k)
+                out["read_bytes"][idx] = np.exp(log_input)
+            for metric in INPUT_DEPENDENT:
+                regression = model["input"]["regressions"][metric] if model["input"] else None
+                if regression is not None:
+                    center = regression["intercept"] + regression["slope"] * log_input
+                    out[metric][idx] = _sample_marginal(metrics[metric], k, rng, center, regression["residual_sigma"])
+                else:
+                    out[metric][idx] = _sample_marginal(metrics[metric], k, rng)
+            io = _sample_marginal(metrics["io_bytes"], k, rng)
+            out["write_bytes"][idx] = np.maximum(io - out["read_bytes"][idx], 0)
+            out["cpus"][idx] = model["cpus"]
+            out["est_duration_s"][idx] = np.exp(metrics["duration_s"]["mu"])
+            out["est_rss_bytes"][idx] = np.exp(metrics["peak_rss_bytes"]["mu"])
+        return out
+
+    def to_dict(self):
+        return {"revision": CALIBRATION_REVISION, "trace_set_sha256": self.trace_set_sha256, "models": self.models}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["models"], data.get("trace_set_sha256"))
+
+
+def trace_set_sha256(file_hashes):
+    digest = hashlib.sha256(f"calibration-r{CALIBRATION_REVISION}".encode())
+    for sha in sorted(file_hashes):
+        digest.update(sha.encode())
+    return digest.hexdigest()
+
+
+def calibrate(trace_paths, cache_dir, max_workers=None):
+    """
+    Fits (or loads cached fits for) the given trace files.
+
+    Returns:
+        CalibratedWorkload
+    """
+    hashes = [file_sha256(path) for path in trace_paths]
+    set_sha = trace_set_sha256(hashes)
+    fit_path = os.path.join(cache_dir, "fits", f"{set_sha}.json")
+    if os.path.exists(fit_path):
+        with open(fit_path) as f:
+            return CalibratedWorkload.from_dict(json.load(f))
+
+    merged = {}
+    for path, sha in zip(trace_paths, hashes):
+        samples = _load_file_samples(path, sha, cache_dir)
+        for process, columns in samples.items():
+            merged.setdefault(process, []).append(columns)
+    merged = {
+        process: {k: np.concatenate([c[k] for c in parts]) for k in parts[0]}
+        for process, parts in merged.items()
+    }
+    if not merged:
+        raise ValueError("No completed tasks found in the given traces")
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+        models = list(pool.map(fit_process, merged.keys(), merged.values()))
+
+    workload = CalibratedWorkload(models, set_sha)
+    os.makedirs(os.path.dirname(fit_path), exist_ok=True)
+    tmp = fit_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(workload.to_dict(), f)
+    os.replace(tmp, fit_path)
+    return workload
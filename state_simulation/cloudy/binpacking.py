@@ -0,0 +1,313 @@
+"""
+Cost-aware bin-packing baseline: places pending tasks (cpus, memory, expected
+duration) onto cloud instances priced by state_simulation.pricing.
+
+Tasks are quantized (millicores, `memory_quantum` bytes, power-of-two duration
+buckets) and grouped into shape classes, so the packing loop runs once per
+distinct shape rather than once per task. Classes are placed longest first,
+then largest first (dominant resource), each in a single vectorized pass over
+the open instances:
+
+    "ffd"   first fit decreasing: lowest-numbered instances with room first
+    "bfd"   best fit decreasing: instances with the least room left first
+
+Tasks that do not fit open new instances of the type that hosts the rest of the
+class most cheaply; later (smaller, shorter) classes fill the holes. Placing
+long tasks first means short tasks only ever land on instances that outlive
+them, so they never extend an instance's lifetime.
+
+PlacementEngine is incremental: add() places newly pending tasks around the
+current placement and remove() releases finished tasks (and instances that
+become empty), without re-solving. Instance ids stay valid for the engine's
+lifetime, so released and full instances are kept out of the scans by an index
+of the live instances with room left rather than by compacting the arrays.
+
+    engine = PlacementEngine(heuristic="bfd")
+    instances = engine.add(cpus, memory_bytes, duration_s, task_ids)
+    engine.remove(finished_ids, now=600.0)
+    engine.summary(now=600.0)
+"""
+import numpy as np
+
+from state_simulation.pricing.catalog import DEFAULT_CATALOG, catalog_arrays
+
+HEURISTICS = ("ffd", "bfd")
+
+_MILLI = 1000
+# Class key layout: duration bucket | millicores | memory quanta.
+_CPU_SHIFT = 33
+_BUCKET_SHIFT = 57
+_CPU_MASK = (1 << 24) - 1
+_MEM_MASK = (1 << 33) - 1
+
+
+class PlacementEngine:
+    """
+    Args:
+        catalog (tuple): InstanceTypes to choose from (defaults to pricing.catalog.DEFAULT_CATALOG).
+        heuristic (str): "ffd" (first fit decreasing) or "bfd" (best fit decreasing).
+        memory_quantum (int): Task memory is rounded up to a multiple of this many bytes.
+        duration_buckets (bool): Place tasks longest first by power-of-two expected
+            duration; if False, only size decides the order.
+    """
+
+    def __init__(self, catalog=None, heuristic="ffd", memory_quantum=256 * 1024 ** 2, duration_buckets=True):
+        if heuristic not in HEURISTICS:
+            raise ValueError(f"Unknown heuristic '{heuristic}', expected one of {HEURISTICS}")
+        self.catalog = tuple(catalog or DEFAULT_CATALOG)
+        self.heuristic = heuristic
+        self.memory_quantum = int(memory_quantum)
+        self.duration_buckets = duration_buckets
+        cpus, memory_bytes, price = catalog_arrays(self.catalog)
+        self._type_cpu = cpus * _MILLI
+        self._type_mem = memory_bytes // self.memory_quantum
+        self._type_price = price
+        self.reset()
+
+    def reset(self):
+        """Drops every task and instance."""
+        self._n_bins = 0
+        self._bin_type = np.empty(0, dtype=np.int64)
+        self._bin_cpu = np.empty(0, dtype=np.int64)  # free millicores
+        self._bin_mem = np.empty(0, dtype=np.int64)  # free memory quanta
+        self._bin_tasks = np.empty(0, dtype=np.int64)
+        self._bin_start = np.empty(0)
+        self._bin_end = np.empty(0)  # expected finish of the longest task
+        self._bin_stop = np.empty(0)  # release time, NaN while live
+        self._roomy = np.empty(0, dtype=np.int64)  # sorted ids of live instances with room left
+        self._task_id = np.empty(0, dtype=np.int64)
+        self._task_bin = np.empty(0, dtype=np.int64)
+        self._task_cpu = np.empty(0, dtype=np.int64)
+        self._task_mem = np.empty(0, dtype=np.int64)
+        self._task_end = np.empty(0)
+        self._next_task_id = 0
+        self.unplaced = 0
+
+    def solve(self, cpus, memory_bytes, duration_s, task_ids=None, now=0.0):
+        """Packs a set of pending tasks from scratch. Same arguments and result as add()."""
+        self.reset()
+        return self.add(cpus, memory_bytes, duration_s, task_ids, now)
+
+    def add(self, cpus, memory_bytes, duration_s, task_ids=None, now=0.0):
+        """
+        Places newly pending tasks, reusing free room on running instances first.
+
+        Args:
+            cpus (array): CPUs requested per task (fractions allowed).
+            memory_bytes (array): Memory requested per task.
+            duration_s (array): Expected run time per task.
+            task_ids (array): Integer task ids (consecutive ids are assigned if omitted).
+            now (float): Current time in seconds; instances opened now start billing here.
+
+        Returns:
+            np.ndarray: Instance id per task, -1 where no instance type is large enough.
+        """
+        cpu_u = np.maximum(np.ceil(np.asarray(cpus, dtype=np.float64) * _MILLI), 1).astype(np.int64)
+        mem_u = np.maximum(-(-np.asarray(memory_bytes, dtype=np.int64) // self.memory_quantum), 1)
+        duration = np.asarray(duration_s, dtype=np.float64)
+        n = len(cpu_u)
+        if task_ids is None:
+            task_ids = np.arange(self._next_task_id, self._next_task_id + n, dtype=np.int64)
+            self._next_task_id += n
+        else:
+            task_ids = np.asarray(task_ids, dtype=np.int64)
+        assignment = np.full(n, -1, dtype=np.int64)
+        if n == 0:
+            return assignment
+        if (cpu_u > _CPU_MASK).any() or (mem_u > _MEM_MASK).any():
+            raise ValueError("Task request exceeds the packing range")
+
+        if self.duration_buckets:
+            bucket = np.ceil(np.log2(np.maximum(duration, 1.0))).astype(np.int64)
+        else:
+            bucket = np.zeros(n, dtype=np.int64)
+        key = (bucket << _BUCKET_SHIFT) | (cpu_u << _CPU_SHIFT) | mem_u
+        classes, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+        members = np.argsort(inverse, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        class_end = now + np.maximum.reduceat(duration[members], offsets[:-1])
+        class_bucket = classes >> _BUCKET_SHIFT
+        class_cpu = (classes >> _CPU_SHIFT) & _CPU_MASK
+        class_mem = classes & _MEM_MASK
+        size = np.maximum(class_cpu / self._type_cpu.max(), class_mem / self._type_mem.max())
+        first_new = self._n_bins
+
+        # Only instances with room for the smallest new shape are worth scanning;
+        # instances opened below are appended as they come.
+        min_cpu, min_mem = class_cpu.min(), class_mem.min()
+        open_bins = self._roomy[(self._bin_cpu[self._roomy] >= min_cpu) & (self._bin_mem[self._roomy] >= min_mem)]
+        for c in np.lexsort((-size, -class_bucket)).tolist():
+            cpu, mem, need = int(class_cpu[c]), int(class_mem[c]), int(counts[c])
+            bins, take = self._fill(cpu, mem, need, open_bins)
+            placed = int(take.sum())
+            if placed < need:
+                new_bins, new_take = self._open(cpu, mem, need - placed, now)
+                bins = np.concatenate((bins, new_bins))
+                take = np.concatenate((take, new_take))
+                open_bins = np.concatenate((open_bins, new_bins))
+                open_bins = open_bins[(self._bin_cpu[open_bins] >= min_cpu) & (self._bin_mem[open_bins] >= min_mem)]
+            if len(bins) == 0:
+                continue
+            self._bin_end[bins] = np.maximum(self._bin_end[bins], class_end[c])
+            tasks = members[offsets[c]:offsets[c + 1]]
+            assignment[tasks[:int(take.sum())]] = np.repeat(bins, take)
+
+        self._roomy = self._with_room(np.union1d(self._roomy, np.arange(first_new, self._n_bins)))
+        placed = assignment >= 0
+        self.unplaced += int(n - placed.sum())
+        self._task_id = np.concatenate((self._task_id, task_ids[placed]))
+        self._task_bin = np.concatenate((self._task_bin, assignment[placed]))
+        self._task_cpu = np.concatenate((self._task_cpu, cpu_u[placed]))
+        self._task_mem = np.concatenate((self._task_mem, mem_u[placed]))
+        self._task_end = np.concatenate((self._task_end, now + duration[placed]))
+        return assignment
+
+    def remove(self, task_ids, now=0.0):
+        """
+        Releases finished (or cancelled) tasks and shuts down instances left empty.
+
+        Returns:
+            int: Number of instances released.
+        """
+        hit = np.isin(self._task_id, np.asarray(task_ids, dtype=np.int64))
+        if not hit.any():
+            return 0
+        # Work is proportional to the affected instances and live tasks, not to every
+        # instance ever opened.
+        affected, slot = np.unique(self._task_bin[hit], return_inverse=True)
+        k = len(affected)
+        self._bin_cpu[affected] += np.bincount(slot, weights=self._task_cpu[hit], minlength=k).astype(np.int64)
+        self._bin_mem[affected] += np.bincount(slot, weights=self._task_mem[hit], minlength=k).astype(np.int64)
+        self._bin_tasks[affected] -= np.bincount(slot, minlength=k)
+        keep = ~hit
+        for name in ("_task_id", "_task_bin", "_task_cpu", "_task_mem", "_task_end"):
+            setattr(self, name, getattr(self, name)[keep])
+
+        empty = affected[self._bin_tasks[affected] == 0]
+        self._bin_cpu[empty] = 0  # never offered to new tasks again
+        self._bin_mem[empty] = 0
+        self._bin_stop[empty] = now
+        # Instances that lost their longest task may now finish earlier.
+        busy = affected[self._bin_tasks[affected] > 0]
+        if len(busy):
+            on_busy = np.isin(self._task_bin, busy)
+            latest = np.zeros(len(busy))
+            np.maximum.at(latest, np.searchsorted(busy, self._task_bin[on_busy]), self._task_end[on_busy])
+            self._bin_end[busy] = latest
+        self._roomy = self._with_room(np.union1d(self._roomy, busy))
+        return len(empty)
+
+    def placements(self):
+        """Returns (task_ids, instance_ids, expected end times) of every placed, unfinished task."""
+        return self._task_id.copy(), self._task_bin.copy(), self._task_end.copy()
+
+    def instances(self):
+        """Live instances as a dict of arrays (id, type, free_cpus, free_memory_bytes, tasks, start_s, end_s)."""
+        live = np.flatnonzero(np.isnan(self._bin_stop[:self._n_bins]))
+        return {
+            "id": live,
+            "type": self._bin_type[live],
+            "free_cpus": self._bin_cpu[live] / _MILLI,
+            "free_memory_bytes": self._bin_mem[live] * self.memory_quantum,
+            "tasks": self._bin_tasks[live],
+            "start_s": self._bin_start[live],
+            "end_s": self._bin_end[live],
+        }
+
+    def summary(self, now=0.0):
+        """
+        Returns:
+            dict: instances, by_type, hourly_cost, expected_cost (until every live
+            instance's longest task finishes), incurred_cost (released instances),
+            cpu_utilization, memory_utilization, unplaced.
+        """
+        n = self._n_bins
+        live = np.isnan(self._bin_stop[:n])
+        types = self._bin_type[:n][live]
+        price = self._type_price[types]
+        capacity_cpu = self._type_cpu[types].sum()
+        capacity_mem = self._type_mem[types].sum()
+        released = ~live
+        return {
+            "instances": int(live.sum()),
+            "by_type": {self.catalog[t].name: int(k) for t, k in zip(*np.unique(types, return_counts=True))},
+            "hourly_cost": float(price.sum()),
+            "expected_cost": float((price * np.maximum(self._bin_end[:n][live] - now, 0)).sum() / 3600.0),
+            "incurred_cost": float((self._type_price[self._bin_type[:n][released]]
+                                    * (self._bin_stop[:n][released] - self._bin_start[:n][released])).sum() / 3600.0),
+            "cpu_utilization": float(1 - self._bin_cpu[:n][live].sum() / capacity_cpu) if capacity_cpu else 0.0,
+            "memory_utilization": float(1 - self._bin_mem[:n][live].sum() / capacity_mem) if capacity_mem else 0.0,
+            "unplaced": self.unplaced,
+        }
+
+    def _with_room(self, bins):
+        return bins[(self._bin_cpu[bins] > 0) & (self._bin_mem[bins] > 0)]
+
+    def _fill(self, cpu, mem, need, open_bins):
+        """Puts up to `need` tasks of one shape on `open_bins`; returns (instance ids, tasks per instance)."""
+        free_cpu = self._bin_cpu[open_bins]
+        free_mem = self._bin_mem[open_bins]
+        room = np.flatnonzero((free_cpu >= cpu) & (free_mem >= mem))
+        candidates = open_bins[room]
+        if len(candidates) == 0:
+            return candidates, candidates
+        free_cpu = free_cpu[room]
+        free_mem = free_mem[room]
+        fit = np.minimum(free_cpu // cpu, free_mem // mem)
+        if self.heuristic == "bfd" and fit.sum() > need:
+            # Every candidate takes at least one task, so the `need` tightest suffice.
+            slack = free_cpu / self._type_cpu.max() + free_mem / self._type_mem.max()
+            if len(candidates) > need:
+                tightest = np.argpartition(slack, need - 1)[:need]
+                order = tightest[np.argsort(slack[tightest], kind="stable")]
+            else:
+                order = np.argsort(slack, kind="stable")
+            candidates = candidates[order]
+            fit = fit[order]
+        take = np.clip(need - (np.cumsum(fit) - fit), 0, fit)
+        used = take > 0
+        candidates = candidates[used]
+        take = take[used]
+        self._bin_cpu[candidates] -= take * cpu
+        self._bin_mem[candidates] -= take * mem
+        self._bin_tasks[candidates] += take
+        return candidates, take
+
+    def _open(self, cpu, mem, count, now):
+        """Opens the cheapest set of same-type instances for `count` tasks of one shape."""
+        per_instance = np.minimum(self._type_cpu // cpu, self._type_mem // mem)
+        feasible = per_instance > 0
+        if not feasible.any():
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        n_instances = -(-count // np.maximum(per_instance, 1))
+        cost = np.where(feasible, n_instances * self._type_price, np.inf)
+        # Ties go to the larger type: its spare room is there for later classes.
+        t = int(np.lexsort((-per_instance, cost))[0])
+        k, n_new = int(per_instance[t]), int(n_instances[t])
+        take = np.full(n_new, k, dtype=np.int64)
+        take[-1] = count - k * (n_new - 1)
+
+        start = self._n_bins
+        self._grow(start + n_new)
+        ids = np.arange(start, start + n_new)
+        self._bin_type[ids] = t
+        self._bin_cpu[ids] = self._type_cpu[t] - take * cpu
+        self._bin_mem[ids] = self._type_mem[t] - take * mem
+        self._bin_tasks[ids] = take
+        self._bin_start[ids] = now
+        self._bin_end[ids] = now
+        self._bin_stop[ids] = np.nan
+        self._n_bins = start + n_new
+        return ids, take
+
+    def _grow(self, size):
+        capacity = len(self._bin_type)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 1024)
+        for name in ("_bin_type", "_bin_cpu", "_bin_mem", "_bin_tasks", "_bin_start", "_bin_end", "_bin_stop"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
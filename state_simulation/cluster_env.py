@@ -0,0 +1,230 @@
+"""
+Vectorized cluster simulator for task-level scheduling decisions.
+
+Each episode is one Nextflow task. Before its first attempt the `executor` and
+`memory` agents pick where to run it and how much memory to request relative to
+the process's historical estimate; if an attempt fails (out of memory, or a spot
+preemption) the `retry` agent decides whether and how to retry. All agents share
+the episode reward:
+
+    -(cost in dollars + time_value_per_hour * elapsed hours + failure_penalty * gave_up_or_exhausted)
+
+A ClusterEnv simulates `batch_size` independent episodes at once with NumPy, so
+a policy is evaluated on whole batches of observations per call.
+
+Workloads are pluggable: anything with `sample(n, rng) -> dict of arrays` (see
+SyntheticWorkload for the keys) can drive the simulator.
+"""
+import numpy as np
+
+from ai_action_streamer.features import encode_batch
+
+# Executors: relative speed, mean queue wait (s), $ per cpu-hour, $ per GB-hour,
+# preemptions per hour.
+EXECUTORS = {
+    "local": {"speed": 1.0, "queue_s": 600.0, "cpu_hour": 0.0, "gb_hour": 0.0, "preempt_per_hour": 0.0},
+    "cluster": {"speed": 1.0, "queue_s": 120.0, "cpu_hour": 0.02, "gb_hour": 0.003, "preempt_per_hour": 0.0},
+    "cloud_spot": {"speed": 1.2, "queue_s": 30.0, "cpu_hour": 0.012, "gb_hour": 0.0015, "preempt_per_hour": 0.05},
+}
+MEMORY_SCALES = (0.5, 0.75, 1.0, 1.5, 2.0)
+RETRY_ACTIONS = ("give_up", "retry_same", "retry_double_memory")
+
+EXIT_OOM = 137
+EXIT_PREEMPTED = 143
+
+_GB = 1024.0 ** 3
+
+
+class SyntheticWorkload:
+    """
+    Tasks drawn from a mixture of per-process lognormal profiles.
+
+    sample() returns a dict of arrays of length n:
+        process (int), cpus, duration_s, peak_rss_bytes, read_bytes, write_bytes,
+        est_duration_s, est_rss_bytes (the historical estimates agents see).
+    """
+
+    DEFAULT_PROFILES = (
+        # name, weight, median duration s, sigma, median rss GB, sigma, cpus, median read GB
+        ("ALIGN", 0.35, 1800.0, 0.6, 12.0, 0.35, 8, 6.0),
+        ("SORT", 0.25, 600.0, 0.5, 6.0, 0.30, 4, 4.0),
+        ("CALL_VARIANTS", 0.20, 3600.0, 0.8, 16.0, 0.45, 4, 2.0),
+        ("QC", 0.20, 120.0, 0.4, 1.0, 0.25, 1, 0.5),
+    )
+
+    def __init__(self, profiles=None):
+        profiles = profiles or self.DEFAULT_PROFILES
+        self.process_names = [p[0] for p in profiles]
+        weights = np.array([p[1] for p in profiles], dtype=np.float64)
+        self.weights = weights / weights.sum()
+        self.duration_median = np.array([p[2] for p in profiles])
+        self.duration_sigma = np.array([p[3] for p in profiles])
+        self.rss_median = np.array([p[4] for p in profiles]) * _GB
+        self.rss_sigma = np.array([p[5] for p in profiles])
+        self.cpus = np.array([p[6] for p in profiles], dtype=np.int64)
+        self.read_median = np.array([p[7] for p in profiles]) * _GB
+
+    def sample(self, n, rng):
+        process = rng.choice(len(self.weights), size=n, p=self.weights)
+        return {
+            "process": process,
+            "cpus": self.cpus[process],
+            "duration_s": self.duration_median[process] * np.exp(rng.standard_normal(n) * self.duration_sigma[process]),
+            "peak_rss_bytes": self.rss_median[process] * np.exp(rng.standard_normal(n) * self.rss_sigma[process]),
+            "read_bytes": self.read_median[process] * np.exp(rng.standard_normal(n) * 0.5),
+            "write_bytes": self.read_median[process] * 0.3 * np.exp(rng.standard_normal(n) * 0.5),
+            "est_duration_s": self.duration_median[process],
+            "est_rss_bytes": self.rss_median[process],
+        }
+
+
+def simulate_attempts(tasks, executor_idx, alloc_bytes, rng):
+    """
+    Simulates one attempt for every task in the batch.
+
+    Args:
+        tasks (dict): Workload arrays (see SyntheticWorkload.sample).
+        executor_idx (np.ndarray): Index into EXECUTORS per task.
+        alloc_bytes (np.ndarray): Memory requested per task.
+        rng (np.random.Generator): Randomness for queueing, failure points and preemption.
+
+    Returns:
+        dict of arrays: elapsed_s (queue + run), run_s, cost, exit_code, peak_rss_bytes (as measured).
+    """
+    executors = list(EXECUTORS.values())
+    speed = np.array([e["speed"] for e in executors])[executor_idx]
+    queue_mean = np.array([e["queue_s"] for e in executors])[executor_idx]
+    cpu_hour = np.array([e["cpu_hour"] for e in executors])[executor_idx]
+    gb_hour = np.array([e["gb_hour"] for e in executors])[executor_idx]
+    preempt_rate = np.array([e["preempt_per_hour"] for e in executors])[executor_idx]
+
+    n = len(executor_idx)
+    full_run_s = tasks["duration_s"] / speed
+    oom = tasks["peak_rss_bytes"] > alloc_bytes
+    preempted = rng.random(n) < 1.0 - np.exp(-preempt_rate * full_run_s / 3600.0)
+    failed = oom | preempted
+    # Failed attempts die part-way through the run.
+    run_s = np.where(failed, full_run_s * rng.uniform(0.1, 1.0, n), full_run_s)
+    queue_s = rng.exponential(queue_mean)
+    cost = run_s / 3600.0 * (cpu_hour * tasks["cpus"] + gb_hour * alloc_bytes / _GB)
+    exit_code = np.where(oom, EXIT_OOM, np.where(preempted, EXIT_PREEMPTED, 0))
+    return {
+        "elapsed_s": queue_s + run_s,
+        "run_s": run_s,
+        "cost": cost,
+        "exit_code": exit_code,
+        "peak_rss_bytes": np.minimum(tasks["peak_rss_bytes"], alloc_bytes),
+    }
+
+
+def encode_history(tasks):
+    """Observation for start-of-task agents: the process's historical completed run."""
+    n = len(tasks["process"])
+    est_ms = tasks["est_duration_s"] * 1000.0
+    return encode_batch(
+        n, task_complete=1, status_completed=1, duration_ms=est_ms, realtime_ms=est_ms,
+        cpu_percent=tasks["cpus"] * 100.0, peak_rss_bytes=tasks["est_rss_bytes"],
+        peak_vmem_bytes=tasks["est_rss_bytes"], read_bytes=tasks["read_bytes"], write_bytes=tasks["write_bytes"],
+    )
+
+
+def encode_failure(tasks, attempt):
+    """Observation for the retry agent: the failed attempt as Nextflow would report it."""
+    n = len(attempt["exit_code"])
+    run_ms = attempt["run_s"] * 1000.0
+    return encode_batch(
+        n, task_complete=1, status_failed=1, exit_code=attempt["exit_code"], duration_ms=attempt["elapsed_s"] * 1000.0,
+        realtime_ms=run_ms, cpu_percent=tasks["cpus"] * 100.0, peak_rss_bytes=attempt["peak_rss_bytes"],
+        peak_vmem_bytes=attempt["peak_rss_bytes"], read_bytes=tasks["read_bytes"],
+    )
+
+
+class ClusterEnv:
+    """
+    Args:
+        batch_size (int): Episodes (tasks) simulated per run_batch() call.
+        workload: Object with sample(n, rng); SyntheticWorkload() if None.
+        seed (int): RNG seed.
+        max_attempts (int): Attempts per task including the first.
+        time_value_per_hour (float): Dollar value of one hour of task latency.
+        failure_penalty (float): Dollar penalty when a task ultimately fails.
+    """
+
+    AGENTS = ("executor", "memory", "retry")
+
+    def __init__(self, batch_size=256, workload=None, seed=None, max_attempts=3,
+                 time_value_per_hour=0.05, failure_penalty=2.0):
+        self.batch_size = batch_size
+        self.workload = workload if workload is not None else SyntheticWorkload()
+        self.rng = np.random.default_rng(seed)
+        self.max_attempts = max_attempts
+        self.time_value_per_hour = time_value_per_hour
+        self.failure_penalty = failure_penalty
+
+    def run_batch(self, policy_fn, tasks=None):
+        """
+        Runs one batch of episodes.
+
+        Args:
+            policy_fn (callable): policy_fn(agent_name, obs) -> action indices, where
+                obs has shape (n, OBSERVATION_DIM). Called once per agent per attempt.
+            tasks (dict): Optional explicit workload arrays instead of sampling.
+
+        Returns:
+            dict: "decisions" {agent: (obs, actions, episode_index)}, and per-episode
+            arrays "returns", "makespan_s", "cost", "failed", "attempts".
+        """
+        if tasks is None:
+            tasks = self.workload.sample(self.batch_size, self.rng)
+        n = len(tasks["process"])
+        decisions = {agent: ([], [], []) for agent in self.AGENTS}
+
+        def decide(agent, obs, episodes):
+            actions = np.asarray(policy_fn(agent, obs))
+            decisions[agent][0].append(obs)
+            decisions[agent][1].append(actions)
+            decisions[agent][2].append(episodes)
+            return actions
+
+        everyone = np.arange(n)
+        history = encode_history(tasks)
+        executor_idx = decide("executor", history, everyone)
+        alloc = tasks["est_rss_bytes"] * np.asarray(MEMORY_SCALES)[decide("memory", history, everyone)]
+
+        makespan = np.zeros(n)
+        cost = np.zeros(n)
+        attempts = np.zeros(n, dtype=np.int64)
+        failed = np.zeros(n, dtype=bool)
+        active = everyone
+        for attempt_no in range(self.max_attempts):
+            sub = {k: v[active] for k, v in tasks.items()}
+            result = simulate_attempts(sub, executor_idx[active], alloc[active], self.rng)
+            makespan[active] += result["elapsed_s"]
+            cost[active] += result["cost"]
+            attempts[active] += 1
+            bad = result["exit_code"] != 0
+            failed[active] = bad
+            if not bad.any():
+                break
+            active = active[bad]
+            result = {k: v[bad] for k, v in result.items()}
+            if attempt_no == self.max_attempts - 1:
+                break
+            retry = decide("retry", encode_failure({k: v[active] for k, v in tasks.items()}, result), active)
+            alloc[active] = np.where(retry == 2, alloc[active] * 2.0, alloc[active])
+            active = active[retry != 0]
+            if len(active) == 0:
+                break
+
+        returns = -(cost + self.time_value_per_hour * makespan / 3600.0 + self.failure_penalty * failed)
+        return {
+            "decisions": {
+                agent: tuple(np.concatenate(parts) if parts else np.empty(0) for parts in lists)
+                for agent, lists in decisions.items() if lists[0]
+            },
+            "returns": returns,
+            "makespan_s": makespan,
+            "cost": cost,
+            "failed": failed,
+            "attempts": attempts,
+        }
@@ -0,0 +1,237 @@
+"""
+Offline evaluation of scheduling policies against recorded Nextflow traces.
+
+Every trace file (one pipeline run) is replayed in the ClusterEnv simulator under
+each policy, keeping the recorded submission times, task durations and memory
+peaks, and scored on counterfactual makespan, cost and failure rate. Runs are
+spread over a process pool; each result is cached as JSON under the trace file's
+SHA-256, a fingerprint of the policy's parameters and a hash of the simulator
+settings, so re-evaluating after new traces arrive only simulates the new files. Both policies see the same per-trace random seed (common random numbers),
+so differences come from the decisions rather than from simulation noise.
+
+Usage (from the project root):
+    python -m state_simulation.evaluation --traces logs/ --policy policy.npz --cache-dir .eval_cache
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from state_simulation.cluster_env import ClusterEnv
+from state_simulation.traces import file_sha256, read_trace, records_to_workload
+
+# Bump when simulator behaviour changes so stale cached results are not reused.
+SIMULATOR_REVISION = 1
+
+
+class StaticPolicy:
+    """Fixed per-agent decisions; the default mirrors a typical hand-written config."""
+
+    def __init__(self, decisions=None, version="static-cluster-mem1.0-retry2x"):
+        self.decisions = decisions or {"executor": 1, "memory": 2, "retry": 2}
+        self.version = version
+
+    def act(self, agent, obs, rng=None, greedy=True):
+        return np.full(len(obs), self.decisions[agent], dtype=np.int64)
+
+    def fingerprint(self):
+        return hashlib.sha256(json.dumps(self.decisions, sort_keys=True).encode()).hexdigest()
+
+
+def evaluate_trace(path, policy, trace_sha256=None, env_kwargs=None):
+    """
+    Replays one trace file under `policy` (greedy decisions).
+
+    Returns:
+        dict: trace, trace_sha256, policy_version, tasks, makespan_s, cost,
+        failures, failure_rate, attempts.
+    """
+    trace_sha256 = trace_sha256 or file_sha256(path)
+    tasks = records_to_workload(read_trace(path))
+    n = len(tasks["process"])
+    result = {"trace": path, "trace_sha256": trace_sha256, "policy_version": policy.version, "tasks": n}
+    if n == 0:
+        result.update(makespan_s=0.0, cost=0.0, failures=0, failure_rate=0.0, attempts=0)
+        return result
+    env = ClusterEnv(batch_size=n, seed=int(trace_sha256[:16], 16), **(env_kwargs or {}))
+    outcome = env.run_batch(lambda agent, obs: policy.act(agent, obs, greedy=True), tasks=tasks)
+    failures = int(outcome["failed"].sum())
+    result.update(
+        makespan_s=float((tasks["submit_s"] + outcome["makespan_s"]).max()),
+        cost=float(outcome["cost"].sum()),
+        failures=failures,
+        failure_rate=failures / n,
+        attempts=int(outcome["attempts"].sum()),
+    )
+    return result
+
+
+def _canonical(value):
+    # json.dumps fallback for ClusterEnv settings: workloads and NumPy values.
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, "to_dict"):
+        return {"__class__": type(value).__name__, **value.to_dict()}
+    if hasattr(value, "__dict__"):
+        return {"__class__": type(value).__name__, **vars(value)}
+    return repr(value)
+
+
+def env_kwargs_sha256(env_kwargs):
+    """Hash of canonicalized ClusterEnv settings, part of the result cache key."""
+    canonical = json.dumps(env_kwargs or {}, sort_keys=True, default=_canonical)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _policy_key(policy):
+    # Versions are free-form and repeat across training runs; parameters do not.
+    if hasattr(policy, "fingerprint"):
+        return policy.fingerprint()
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", policy.version)
+
+
+def _cache_path(cache_dir, trace_sha256, policy_key, env_sha256):
+    return os.path.join(cache_dir, f"sim{SIMULATOR_REVISION}", policy_key, env_sha256[:16], f"{trace_sha256}.json")
+
+
+def find_traces(paths):
+    """Expands files and directories (recursively) into a sorted list of trace files."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, f) for f in files if f.endswith((".log", ".txt", ".tsv")))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+class PolicyEvaluator:
+    """
+    Args:
+        cache_dir (str): Where per-(trace, policy, settings) results are cached.
+        max_workers (int): Process pool size (defaults to os.cpu_count()).
+        env_kwargs (dict): Extra ClusterEnv settings (e.g. failure_penalty).
+    """
+
+    def __init__(self, cache_dir, max_workers=None, env_kwargs=None):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.env_kwargs = env_kwargs
+        self.env_sha256 = env_kwargs_sha256(env_kwargs)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def evaluate(self, trace_paths, policies):
+        """
+        Evaluates every policy on every trace, reusing cached results.
+
+        Returns:
+            dict: policy_version -> list of per-trace result dicts (in trace order).
+
+        Raises:
+            ValueError: If two policies share a version, as their results would collide.
+        """
+        versions = [policy.version for policy in policies]
+        duplicates = sorted({v for v in versions if versions.count(v) > 1})
+        if duplicates:
+            raise ValueError(f"Policies must have distinct versions; repeated: {', '.join(duplicates)}")
+        hashes = {path: file_sha256(path) for path in trace_paths}
+        keys = {policy.version: _policy_key(policy) for policy in policies}
+        results = {policy.version: {} for policy in policies}
+        jobs = []
+        for policy in policies:
+            for path in trace_paths:
+                cached = _cache_path(self.cache_dir, hashes[path], keys[policy.version], self.env_sha256)
+                if os.path.exists(cached):
+                    with open(cached) as f:
+                        result = json.load(f)
+                    result["trace"] = path
+                    results[policy.version][path] = result
+                    self.cache_hits += 1
+                else:
+                    jobs.append((path, policy))
+                    self.cache_misses += 1
+
+        if jobs:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {
+                    pool.submit(evaluate_trace, path, policy, hashes[path], self.env_kwargs): (path, policy)
+                    for path, policy in jobs
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    path, policy = futures[future]
+                    result = future.result()
+                    results[policy.version][path] = result
+                    cached = _cache_path(self.cache_dir, hashes[path], keys[policy.version], self.env_sha256)
+                    os.makedirs(os.path.dirname(cached), exist_ok=True)
+                    tmp = cached + ".tmp"
+                    with open(tmp, "w") as f:
+                        json.dump(result, f)
+                    os.replace(tmp, cached)
+
+        return {version: [by_path[p] for p in trace_paths] for version, by_path in results.items()}
+
+
+def summarize(per_trace):
+    """Aggregates per-trace results of one policy."""
+    tasks = sum(r["tasks"] for r in per_trace)
+    return {
+        "runs": len(per_trace),
+        "tasks": tasks,
+        "mean_makespan_s": float(np.mean([r["makespan_s"] for r in per_trace])) if per_trace else 0.0,
+        "total_cost": float(sum(r["cost"] for r in per_trace)),
+        "failure_rate": sum(r["failures"] for r in per_trace) / tasks if tasks else 0.0,
+        "attempts_per_task": sum(r["attempts"] for r in per_trace) / tasks if tasks else 0.0,
+    }
+
+
+def compare(candidate_summary, baseline_summary):
+    """Relative change of the candidate against the baseline (negative is better)."""
+    def rel(key):
+        base = baseline_summary[key]
+        return (candidate_summary[key] - base) / base if base else 0.0
+    return {
+        "makespan_change": rel("mean_makespan_s"),
+        "cost_change": rel("total_cost"),
+        "failure_rate_change": candidate_summary["failure_rate"] - baseline_summary["failure_rate"],
+    }
+
+
+def main(argv=None):
+    from ai_action_streamer.policy import MultiAgentPolicy
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--traces", nargs="+", required=True, help="Trace files or directories")
+    parser.add_argument("--policy", required=True, help="Candidate MultiAgentPolicy checkpoint (.npz)")
+    parser.add_argument("--baseline", default=None, help="Baseline checkpoint; StaticPolicy() if omitted")
+    parser.add_argument("--cache-dir", default=".eval_cache")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    candidate = MultiAgentPolicy.load(args.policy)
+    baseline = MultiAgentPolicy.load(args.baseline) if args.baseline else StaticPolicy()
+    if candidate.version == baseline.version:
+        parser.error(f"Candidate and baseline share policy version '{candidate.version}'")
+    traces = find_traces(args.traces)
+    evaluator = PolicyEvaluator(args.cache_dir, max_workers=args.workers)
+    results = evaluator.evaluate(traces, [candidate, baseline])
+    print(f"{len(traces)} traces, {evaluator.cache_hits} cached, {evaluator.cache_misses} simulated")
+
+    summaries = {version: summarize(per_trace) for version, per_trace in results.items()}
+    for version, s in summaries.items():
+        print(f"{version:>32}: makespan {s['mean_makespan_s']:9.0f}s  cost ${s['total_cost']:10.2f}  "
+              f"failures {s['failure_rate']:6.2%}  attempts/task {s['attempts_per_task']:.2f}")
+    delta = compare(summaries[candidate.version], summaries[baseline.version])
+    print(f"candidate vs baseline: makespan {delta['makespan_change']:+.1%}, cost {delta['cost_change']:+.1%}, "
+          f"failure rate {delta['failure_rate_change']:+.2%}")
+
+
+if __name__ == "__main__":
+    main()
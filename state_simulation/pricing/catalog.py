@@ -0,0 +1,53 @@
+"""
+Instance type catalog with hourly prices.
+
+The built-in catalog is a small, representative set of general purpose, compute
+and memory optimized on-demand types (us-east-1 list prices, USD/hour). Load a
+site-specific catalog from JSON with load_catalog():
+
+    [{"name": "m6i.large", "cpus": 2, "memory_gib": 8, "hourly_price": 0.096}, ...]
+"""
+import collections
+import json
+
+import numpy as np
+
+InstanceType = collections.namedtuple("InstanceType", ["name", "cpus", "memory_bytes", "hourly_price"])
+
+_GIB = 1024 ** 3
+
+DEFAULT_CATALOG = tuple(InstanceType(name, cpus, int(mem_gib * _GIB), price) for name, cpus, mem_gib, price in (
+    ("m6i.large", 2, 8, 0.096),
+    ("m6i.xlarge", 4, 16, 0.192),
+    ("m6i.2xlarge", 8, 32, 0.384),
+    ("m6i.4xlarge", 16, 64, 0.768),
+    ("m6i.8xlarge", 32, 128, 1.536),
+    ("m6i.16xlarge", 64, 256, 3.072),
+    ("c6i.large", 2, 4, 0.085),
+    ("c6i.2xlarge", 8, 16, 0.34),
+    ("c6i.8xlarge", 32, 64, 1.36),
+    ("c6i.16xlarge", 64, 128, 2.72),
+    ("r6i.large", 2, 16, 0.126),
+    ("r6i.2xlarge", 8, 64, 0.504),
+    ("r6i.8xlarge", 32, 256, 2.016),
+    ("r6i.16xlarge", 64, 512, 4.032),
+))
+
+
+def load_catalog(path):
+    """Reads a JSON list of {"name", "cpus", "memory_gib", "hourly_price"} objects."""
+    with open(path) as f:
+        entries = json.load(f)
+    return tuple(
+        InstanceType(e["name"], int(e["cpus"]), int(float(e["memory_gib"]) * _GIB), float(e["hourly_price"]))
+        for e in entries
+    )
+
+
+def catalog_arrays(catalog):
+    """Returns (cpus, memory_bytes, hourly_price) NumPy arrays for a catalog."""
+    return (
+        np.array([t.cpus for t in catalog], dtype=np.int64),
+        np.array([t.memory_bytes for t in catalog], dtype=np.int64),
+        np.array([t.hourly_price for t in catalog], dtype=np.float64),
+    )
@@ -0,0 +1,248 @@
+"""
+Synthetic Nextflow-shaped workflows for load and scale testing.
+
+A workflow is a sequence of blocks, each shaped like a common Nextflow pattern:
+
+    chain            A -> B -> C ...                     (per-sample pipelines)
+    scatter_gather   SPLIT -> WORK x width -> MERGE      (chunked alignment, sharded calling)
+    diamond          A -> (B, C) -> D                     (QC branches rejoined)
+
+Every block's roots depend on the previous block's sink. Everything is a
+generator: tasks are produced in topological order and only the current and
+previous block are ever held in memory, so a million-task workflow streams in
+constant memory (O(max_width)).
+
+Task resources are heavy-tailed: each process template has a lognormal
+duration/memory profile and a small fraction of tasks draw a Pareto multiplier.
+
+Consumers:
+    generate_workflow(...)        -> SyntheticTask stream
+    observation_events(tasks)     -> dicts accepted by utilities.nf_client.send_task_observation
+    task_observations(tasks)      -> nf_ai_comms_pb2.TaskObservation messages
+    DagWorkload(tasks)            -> ClusterEnv workload consuming the stream
+"""
+import collections
+import datetime
+import heapq
+
+import numpy as np
+
+SyntheticTask = collections.namedtuple("SyntheticTask", [
+    "task_id", "block", "process_name", "task_name", "task_hash", "deps",
+    "cpus", "memory_bytes", "duration_s", "input_bytes",
+])
+
+SHAPES = ("chain", "scatter_gather", "diamond")
+
+_GB = 1024.0 ** 3
+
+
+class _ProcessTemplate:
+    __slots__ = ("name", "cpus", "duration_mu", "duration_sigma", "memory_mu", "memory_sigma", "input_mu")
+
+    def __init__(self, name, rng):
+        self.name = name
+        self.cpus = int(rng.choice((1, 2, 4, 8, 16), p=(0.3, 0.25, 0.2, 0.15, 0.1)))
+        self.duration_mu = rng.normal(np.log(300.0), 1.2)
+        self.duration_sigma = rng.uniform(0.2, 0.9)
+        self.memory_mu = rng.normal(np.log(2.0 * _GB), 1.0)
+        self.memory_sigma = rng.uniform(0.1, 0.6)
+        self.input_mu = rng.normal(np.log(1.0 * _GB), 1.0)
+
+
+def _task_hash(task_id):
+    mixed = (task_id * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFF
+    return f"{mixed >> 40:02x}/{mixed & 0xFFFFFF:06x}"
+
+
+def generate_workflow(n_tasks, shapes=SHAPES, max_width=1000, chain_length=(2, 6),
+                      n_processes=50, tail_fraction=0.02, tail_xi=0.7, seed=None):
+    """
+    Lazily yields the SyntheticTasks of one workflow in topological order.
+
+    Args:
+        n_tasks (int): Total number of tasks (the last block is truncated to fit).
+        shapes (tuple): Block shapes to draw from uniformly.
+        max_width (int): Upper bound on scatter width.
+        chain_length (tuple): (min, max) length of chain blocks.
+        n_processes (int): Size of the pool of process templates blocks draw from.
+        tail_fraction (float): Fraction of tasks with a Pareto resource multiplier.
+        tail_xi (float): Pareto shape (1/tail index) for that multiplier.
+        seed (int): RNG seed; the same seed always yields the same workflow.
+    """
+    rng = np.random.default_rng(seed)
+    templates = [_ProcessTemplate(f"PROC_{i:03d}", rng) for i in range(n_processes)]
+    counters = collections.Counter()
+    next_id = 1
+    previous_sink = None
+    block = 0
+
+    def make(template, deps):
+        nonlocal next_id
+        counters[template.name] += 1
+        multiplier = rng.random() ** -tail_xi if rng.random() < tail_fraction else 1.0
+        task = SyntheticTask(
+            task_id=next_id,
+            block=block,
+            process_name=template.name,
+            task_name=f"{template.name} ({counters[template.name]})",
+            task_hash=_task_hash(next_id),
+            deps=deps,
+            cpus=template.cpus,
+            memory_bytes=int(np.exp(rng.normal(template.memory_mu, template.memory_sigma)) * min(multiplier, 8.0)),
+            duration_s=float(np.exp(rng.normal(template.duration_mu, template.duration_sigma)) * multiplier),
+            input_bytes=int(np.exp(rng.normal(template.input_mu, 0.5))),
+        )
+        next_id += 1
+        return task
+
+    while next_id <= n_tasks:
+        remaining = n_tasks - next_id + 1
+        shape = shapes[rng.integers(len(shapes))]
+        roots = () if previous_sink is None else (previous_sink,)
+        pick = lambda: templates[rng.integers(n_processes)]  # noqa: E731
+
+        if shape == "chain" or remaining < 4:
+            length = min(int(rng.integers(chain_length[0], chain_length[1] + 1)), remaining)
+            deps = roots
+            for _ in range(length):
+                task = make(pick(), deps)
+                deps = (task.task_id,)
+                yield task
+        elif shape == "scatter_gather":
+            width = min(int(rng.integers(2, max_width + 1)), remaining - 2)
+            split = make(pick(), roots)
+            yield split
+            work = pick()
+            first = next_id
+            for _ in range(width):
+                yield make(work, (split.task_id,))
+            task = make(pick(), range(first, first + width))
+            yield task
+        else:  # diamond
+            top = make(pick(), roots)
+            yield top
+            left = make(pick(), (top.task_id,))
+            yield left
+            right = make(pick(), (top.task_id,))
+            yield right
+            task = make(pick(), (left.task_id, right.task_id))
+            yield task
+
+        previous_sink = next_id - 1
+        block += 1
+
+
+def _timed_events(tasks, start_epoch_s):
+    """Yields (time_s, kind, task) in time order, holding at most two blocks in memory."""
+    finish = {}
+    current_block = None
+    pending = []
+    for task in tasks:
+        if task.block != current_block:
+            # Blocks only depend on the previous block's sink, which finishes last:
+            # everything pending can be flushed before the new block starts.
+            while pending:
+                time_s, _, kind, pending_task = heapq.heappop(pending)
+                yield time_s, kind, pending_task
+            if current_block is not None:
+                sink_finish = finish[task.task_id - 1] if task.deps else None
+                finish = {} if sink_finish is None else {task.task_id - 1: sink_finish}
+            current_block = task.block
+        start = max((finish[d] for d in task.deps), default=start_epoch_s)
+        end = start + task.duration_s
+        finish[task.task_id] = end
+        heapq.heappush(pending, (start, task.task_id * 2, "task_start", task))
+        heapq.heappush(pending, (end, task.task_id * 2 + 1, "task_complete", task))
+    while pending:
+        time_s, _, kind, task = heapq.heappop(pending)
+        yield time_s, kind, task
+
+
+def observation_events(tasks, pipeline_name="synthetic_pipeline", start_epoch_s=None):
+    """
+    Turns a task stream into task_start / task_complete observation dicts in
+    event-time order, with the keys utilities.nf_client.send_task_observation
+    reads, plus "timestamp_epoch_s" for consumers that prefer a number.
+
+    Tasks are assumed to start as soon as their dependencies finish.
+    """
+    if start_epoch_s is None:
+        start_epoch_s = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+    for time_s, kind, task in _timed_events(tasks, start_epoch_s):
+        event = {
+            "event_id": f"{pipeline_name}-{task.task_id}-{kind}",
+            "event_type": kind,
+            "timestamp_iso": datetime.datetime.fromtimestamp(time_s, datetime.timezone.utc)
+                                     .isoformat().replace("+00:00", "Z"),
+            "timestamp_epoch_s": time_s,
+            "pipeline_name": pipeline_name,
+            "process_name": task.process_name,
+            "task_id_num": task.task_id,
+            "task_hash": task.task_hash,
+            "task_name": task.task_name,
+            "native_id": str(100_000 + task.task_id),
+        }
+        if kind == "task_start":
+            event["status"] = "RUNNING"
+        else:
+            duration_ms = int(task.duration_s * 1000)
+            event.update(
+                status="COMPLETED", exit_code=0, duration_ms=duration_ms, realtime_ms=duration_ms,
+                cpu_percent=f"{task.cpus * 90.0:.1f}%", peak_rss_bytes=task.memory_bytes,
+                peak_vmem_bytes=int(task.memory_bytes * 1.3), read_bytes=task.input_bytes,
+                write_bytes=task.input_bytes // 3,
+            )
+        yield event
+
+
+def task_observations(tasks, pipeline_name="synthetic_pipeline", start_epoch_s=None):
+    """Like observation_events() but yields nf_ai_comms_pb2.TaskObservation messages."""
+    from proto import nf_ai_comms_pb2
+    for event in observation_events(tasks, pipeline_name, start_epoch_s):
+        event.pop("timestamp_epoch_s")
+        yield nf_ai_comms_pb2.TaskObservation(**event)
+
+
+class DagWorkload:
+    """
+    ClusterEnv workload that consumes a (possibly endless) SyntheticTask stream.
+
+    Each sample(n, rng) call takes the next n tasks; the per-process estimates
+    agents see are running means of the tasks of that process seen so far (a
+    process's first task falls back to its own values).
+    """
+
+    def __init__(self, tasks):
+        self._tasks = iter(tasks)
+        self._process_ids = {}
+        self._sums = collections.defaultdict(lambda: [0.0, 0.0, 0])
+
+    def sample(self, n, rng=None):
+        batch = [task for _, task in zip(range(n), self._tasks)]
+        if not batch:
+            raise ValueError("Synthetic workflow exhausted")
+        k = len(batch)
+        out = {
+            "process": np.empty(k, dtype=np.int64),
+            "cpus": np.array([t.cpus for t in batch], dtype=np.int64),
+            "duration_s": np.array([t.duration_s for t in batch]),
+            "peak_rss_bytes": np.array([t.memory_bytes for t in batch], dtype=np.float64),
+            "read_bytes": np.array([t.input_bytes for t in batch], dtype=np.float64),
+            "write_bytes": np.array([t.input_bytes // 3 for t in batch], dtype=np.float64),
+            "est_duration_s": np.empty(k),
+            "est_rss_bytes": np.empty(k),
+        }
+        for i, task in enumerate(batch):
+            out["process"][i] = self._process_ids.setdefault(task.process_name, len(self._process_ids))
+            sums = self._sums[task.process_name]
+            if sums[2]:
+                out["est_duration_s"][i] = sums[0] / sums[2]
+                out["est_rss_bytes"][i] = sums[1] / sums[2]
+            else:
+                out["est_duration_s"][i] = task.duration_s
+                out["est_rss_bytes"][i] = task.memory_bytes
+            sums[0] += task.duration_s
+            sums[1] += task.memory_bytes
+            sums[2] += 1
+        return out
@@ -0,0 +1,170 @@
+"""
+Parsing of Nextflow trace files (the TSV written by `trace { enabled = true }`,
+see nextflow.config) into task records and simulator workloads.
+
+Nextflow renders values for humans ("1.5 GB", "2m 3s", "87.5%"); the helpers
+here turn them back into bytes, milliseconds and floats. Raw numeric values
+(`trace.raw = true`) are accepted as well.
+"""
+import collections
+import csv
+import datetime
+import hashlib
+import re
+
+import numpy as np
+
+TaskRecord = collections.namedtuple("TaskRecord", [
+    "task_id", "hash", "name", "process_name", "status", "exit_code", "submit_ms",
+    "duration_ms", "realtime_ms", "cpu_percent", "peak_rss_bytes", "peak_vmem_bytes",
+    "read_bytes", "write_bytes",
+])
+
+_DURATION_UNITS = {"ms": 1, "s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}
+_MEMORY_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4, "PB": 1024 ** 5}
+_DURATION_RE = re.compile(r"([\d.]+)\s*(ms|s|m|h|d)")
+_PROCESS_RE = re.compile(r"^(.*?)\s*\(.*\)\s*$")
+# Estimates for the first task of a trace, before any outcome has been seen.
+_PRIOR_DURATION_S = 60.0
+_PRIOR_RSS_BYTES = float(1 << 30)
+
+
+def parse_duration_ms(value):
+    """'1h 2m 3s' / '350ms' / '12345' (raw ms) -> int milliseconds; 0 for '-' or empty."""
+    value = (value or "").strip()
+    if not value or value == "-":
+        return 0
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    return int(sum(float(n) * _DURATION_UNITS[unit] for n, unit in _DURATION_RE.findall(value)))
+
+
+def parse_memory_bytes(value):
+    """'1.5 GB' / '512 KB' / '1048576' (raw bytes) -> int bytes; 0 for '-' or empty."""
+    value = (value or "").strip()
+    if not value or value == "-":
+        return 0
+    parts = value.split()
+    try:
+        number = float(parts[0])
+    except ValueError:
+        return 0
+    unit = parts[1].upper() if len(parts) > 1 else "B"
+    return int(number * _MEMORY_UNITS.get(unit, 1))
+
+
+def parse_percent(value):
+    value = (value or "").strip().rstrip("%")
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def parse_submit_ms(value):
+    """'2024-05-01 10:00:00.123' or raw epoch ms -> epoch milliseconds (0 if missing)."""
+    value = (value or "").strip()
+    if not value or value == "-":
+        return 0
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"):
+        try:
+            parsed = datetime.datetime.strptime(value, fmt).replace(tzinfo=datetime.timezone.utc)
+            return int(parsed.timestamp() * 1000)
+        except ValueError:
+            continue
+    return 0
+
+
+def process_name_of(task_name):
+    """'ALIGN (sample_1)' -> 'ALIGN'."""
+    match = _PROCESS_RE.match(task_name)
+    return match.group(1) if match else task_name
+
+
+def read_trace(path):
+    """Reads a Nextflow trace TSV into a list of TaskRecord."""
+    records = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            name = row.get("name", "")
+            exit_value = (row.get("exit") or "").strip()
+            records.append(TaskRecord(
+                task_id=int(row.get("task_id") or 0),
+                hash=row.get("hash", ""),
+                name=name,
+                process_name=row.get("process") or process_name_of(name),
+                status=row.get("status", ""),
+                exit_code=int(exit_value) if exit_value.lstrip("-").isdigit() else -1,
+                submit_ms=parse_submit_ms(row.get("submit")),
+                duration_ms=parse_duration_ms(row.get("duration")),
+                realtime_ms=parse_duration_ms(row.get("realtime")),
+                cpu_percent=parse_percent(row.get("%cpu")),
+                peak_rss_bytes=parse_memory_bytes(row.get("peak_rss")),
+                peak_vmem_bytes=parse_memory_bytes(row.get("peak_vmem")),
+                read_bytes=parse_memory_bytes(row.get("rchar")),
+                write_bytes=parse_memory_bytes(row.get("wchar")),
+            ))
+    return records
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def records_to_workload(records):
+    """
+    Converts trace records to the array dict ClusterEnv.run_batch(tasks=...) expects,
+    plus "submit_s" (seconds since the first submission; 0 where the trace has no
+    submit time) for makespan replay.
+
+    The estimates agents see (est_duration_s, est_rss_bytes) are the running mean
+    of earlier tasks of the same process, so no task's own outcome leaks into its
+    decision. A process's first task falls back to the mean of all earlier tasks in
+    the trace, and the trace's first task to a fixed default (1 minute, 1 GiB).
+    """
+    n = len(records)
+    process_ids = {}
+    process = np.empty(n, dtype=np.int64)
+    for i, r in enumerate(records):
+        process[i] = process_ids.setdefault(r.process_name, len(process_ids))
+    duration_s = np.array([max(r.realtime_ms or r.duration_ms, 1) for r in records], dtype=np.float64) / 1000.0
+    rss = np.array([max(r.peak_rss_bytes, 1) for r in records], dtype=np.float64)
+    submit = np.array([r.submit_ms for r in records], dtype=np.float64)
+    known = submit > 0
+    base = submit[known].min() if known.any() else 0.0
+    submit_s = np.where(known, (submit - base) / 1000.0, 0.0)
+
+    est_duration = np.empty(n)
+    est_rss = np.empty(n)
+    for values, out, default in ((duration_s, est_duration, _PRIOR_DURATION_S), (rss, est_rss, _PRIOR_RSS_BYTES)):
+        earlier = np.empty(n)  # mean of every task before i, whatever its process
+        earlier[:1] = default
+        earlier[1:] = (np.cumsum(values) / np.arange(1, n + 1))[:-1]
+        for p in range(len(process_ids)):
+            idx = np.flatnonzero(process == p)
+            v = values[idx]
+            running = np.cumsum(v) / np.arange(1, len(v) + 1)
+            out[idx[0]] = earlier[idx[0]]
+            out[idx[1:]] = running[:-1]
+
+    return {
+        "process": process,
+        "cpus": np.maximum(np.ceil(np.array([r.cpu_percent for r in records]) / 100.0), 1).astype(np.int64),
+        "duration_s": duration_s,
+        "peak_rss_bytes": rss,
+        "read_bytes": np.array([r.read_bytes for r in records], dtype=np.float64),
+        "write_bytes": np.array([r.write_bytes for r in records], dtype=np.float64),
+        "est_duration_s": est_duration,
+        "est_rss_bytes": est_rss,
+        "submit_s": submit_s,
+    }
@@ -0,0 +1,143 @@
+import asyncio
+import unittest
+
+import grpc
+
+from proto import nf_ai_comms_pb2
+
+from ai_action_streamer.action_broker import ActionBroker
+from ai_action_streamer.ai_action_streamer_server import AiActionServicer, nf_ai_comms_pb2_grpc
+
+
+def _action(details):
+    return nf_ai_comms_pb2.Action(action_id=details, action_details=details, success=True)
+
+
+async def _take(stream, n):
+    """Collects n actions from a broker.subscribe() stream, keeping batch sizes."""
+    batches = []
+    while sum(len(b) for b in batches) < n:
+        batches.append(await asyncio.wait_for(stream.__anext__(), 1.0))
+    return batches
+
+
+class TestActionBroker(unittest.TestCase):
+
+    def test_backlog_is_delivered_on_subscribe(self):
+        async def run():
+            broker = ActionBroker()
+            for i in range(3):
+                self.assertEqual(broker.publish("run_a", _action(f"a{i}")), i + 1)
+            stream = broker.subscribe("run_a")
+            batches = await _take(stream, 3)
+            await stream.aclose()
+            return batches
+
+        batches = asyncio.run(run())
+        self.assertEqual(len(batches), 1, "queued actions should arrive as one batch")
+        self.assertEqual([a.sequence for a in batches[0]], [1, 2, 3])
+
+    def test_live_push_and_batching(self):
+        async def run():
+            broker = ActionBroker(max_batch=4)
+            stream = broker.subscribe("run_a", max_batch=0)
+            pending = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0)
+            broker.publish("run_a", _action("first"))
+            first = await asyncio.wait_for(pending, 1.0)
+            for i in range(10):  # a burst while the subscriber is busy
+                broker.publish("run_a", _action(f"burst{i}"))
+            rest = await _take(stream, 10)
+            await stream.aclose()
+            return first, rest, broker.metrics()
+
+        first, rest, metrics = asyncio.run(run())
+        self.assertEqual([a.action_details for a in first], ["first"])
+        self.assertEqual([len(b) for b in rest], [4, 4, 2])
+        self.assertEqual(metrics["delivered"], 11)
+        self.assertEqual(metrics["subscribers"], 0)
+
+    def test_resume_from_cursor(self):
+        async def run():
+            broker = ActionBroker(retain=5)
+            for i in range(8):
+                broker.publish("run_a", _action(f"a{i}"))
+            resumed = await _take(broker.subscribe("run_a", resume_after=6), 2)
+            rolled_over = await _take(broker.subscribe("run_a", resume_after=1), 5)
+            # A cursor from before a server restart restarts the session's sequence.
+            stale = broker.subscribe("run_b", resume_after=42)
+            broker.publish("run_b", _action("b0"))
+            fresh = await _take(stale, 1)
+            return resumed, rolled_over, fresh
+
+        resumed, rolled_over, fresh = asyncio.run(run())
+        self.assertEqual([a.sequence for b in resumed for a in b], [7, 8])
+        self.assertEqual([a.sequence for b in rolled_over for a in b], [4, 5, 6, 7, 8])
+        self.assertEqual([a.sequence for b in fresh for a in b], [1])
+
+    def test_fan_out_and_close(self):
+        async def run():
+            broker = ActionBroker()
+            streams = [broker.subscribe(s, pipeline_name=p) for s, p in
+                       (("run_a", "rnaseq"), ("run_b", "rnaseq"), ("run_c", "sarek"))]
+            firsts = [asyncio.ensure_future(s.__anext__()) for s in streams]
+            await asyncio.sleep(0)
+            self.assertEqual(broker.broadcast(_action("scale_up"), pipeline_name="rnaseq"), 2)
+            self.assertEqual(broker.broadcast(_action("pause")), 3)
+            got = [await asyncio.wait_for(f, 1.0) for f in firsts]
+            broker.close_session("run_c")
+            ended = [a async for batch in streams[2] for a in batch]
+            return got, ended, broker.metrics()
+
+        got, ended, metrics = asyncio.run(run())
+        self.assertEqual([a.action_details for a in got[0]], ["scale_up", "pause"])
+        self.assertEqual([a.action_details for a in got[2]], ["pause"])
+        self.assertEqual(ended, [])
+        self.assertEqual(metrics["sessions"], 2)
+
+    def test_idle_sessions_expire(self):
+        broker = ActionBroker(idle_ttl_s=0.0)
+        broker.publish("old", _action("x"))
+        broker.publish("new", _action("y"))
+        self.assertNotIn("old", broker.sessions)
+
+
+class TestSubscribeActionsRpc(unittest.TestCase):
+
+    def test_stream_and_resume_over_grpc(self):
+        async def run():
+            broker = ActionBroker()
+            server = grpc.aio.server()
+            nf_ai_comms_pb2_grpc.add_AiActionServiceServicer_to_server(AiActionServicer(broker=broker), server)
+            port = server.add_insecure_port("127.0.0.1:0")
+            await server.start()
+            try:
+                async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                    stub = nf_ai_comms_pb2_grpc.AiActionServiceStub(channel)
+                    call = stub.SubscribeActions(nf_ai_comms_pb2.SessionInfo(session_id="run_a"))
+                    for i in range(3):
+                        broker.publish("run_a", _action(f"a{i}"))
+                    first = [await asyncio.wait_for(call.read(), 1.0) for _ in range(2)]
+                    call.cancel()  # client drops after two actions
+                    for i in range(3, 5):
+                        broker.publish("run_a", _action(f"a{i}"))
+                    call = stub.SubscribeActions(nf_ai_comms_pb2.SessionInfo(
+                        session_id="run_a", resume_after=first[-1].sequence))
+                    resumed = [await asyncio.wait_for(call.read(), 1.0) for _ in range(3)]
+                    call.cancel()
+
+                    with self.assertRaises(grpc.aio.AioRpcError) as error:
+                        await stub.SubscribeActions(nf_ai_comms_pb2.SessionInfo()).read()
+                    self.assertEqual(error.exception.code(), grpc.StatusCode.INVALID_ARGUMENT)
+            finally:
+                await server.stop(None)
+            return first, resumed
+
+        first, resumed = asyncio.run(run())
+        self.assertEqual([a.action_details for a in first], ["a0", "a1"])
+        self.assertEqual([a.action_details for a in resumed], ["a2", "a3", "a4"])
+        self.assertEqual([a.sequence for a in resumed], [3, 4, 5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,22 +2,9 @@ import grpc
 import asyncio
 import uuid # For event_id
 
-# Assuming your generated proto files are in a 'proto' subdirectory
-# relative to where you run this client, or BioWorkFlowML is in PYTHONPATH.
-try:
-    from proto import nf_ai_comms_pb2
-    from proto import nf_ai_comms_pb2_grpc
-except ImportError:
-    # Fallback if running directly and proto is a sibling or needs path adjustment
-    import sys
-    import os
-    # Adjust this path if your 'proto' directory is located elsewhere relative to this script
-    sys.path.append(os.path.join(os.path.dirname(__file__), '.')) # Current dir for proto
-    # Or if proto is in parent and this script is in a subdir:
-    # sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-    from proto import nf_ai_comms_pb2
-    from proto import nf_ai_comms_pb2_grpc
-
+# The generated modules are the proto package; run from the project root.
+from proto import nf_ai_comms_pb2
+from proto import nf_ai_comms_pb2_grpc
 
 async def run_client(server_address="localhost:50051"):
     """
@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from state_simulation.cloudy.binpacking import PlacementEngine
+from state_simulation.cluster_env import SyntheticWorkload
+from state_simulation.pricing.catalog import InstanceType, load_catalog
+
+_GIB = 1024 ** 3
+
+CATALOG = (
+    InstanceType("small", 2, 4 * _GIB, 0.10),
+    InstanceType("large", 8, 16 * _GIB, 0.30),
+)
+
+
+def _check_capacity(test, engine, cpus, memory_bytes, assignment):
+    instances = engine.instances()
+    quantum = engine.memory_quantum
+    for instance_id, instance_type in zip(instances["id"], instances["type"]):
+        on = assignment == instance_id
+        test.assertLessEqual(cpus[on].sum(), engine.catalog[instance_type].cpus)
+        test.assertLessEqual((-(-memory_bytes[on] // quantum) * quantum).sum(),
+                             engine.catalog[instance_type].memory_bytes)
+
+
+class TestPlacementEngine(unittest.TestCase):
+
+    def test_picks_cheapest_instance_set(self):
+        # Eight 1-CPU tasks: one "large" ($0.30) beats four "small" ($0.40).
+        engine = PlacementEngine(CATALOG)
+        assignment = engine.solve(np.ones(8), np.full(8, _GIB), np.full(8, 600.0))
+        self.assertEqual(len(set(assignment.tolist())), 1)
+        self.assertEqual(engine.summary()["by_type"], {"large": 1})
+        self.assertAlmostEqual(engine.summary()["expected_cost"], 0.30 / 6)
+
+    def test_small_tasks_fill_holes(self):
+        for heuristic in ("ffd", "bfd"):
+            engine = PlacementEngine(CATALOG, heuristic=heuristic)
+            cpus = np.array([6, 2, 1, 1, 6])
+            memory = np.full(5, _GIB)
+            assignment = engine.solve(cpus, memory, np.full(5, 600.0))
+            self.assertEqual(engine.summary()["instances"], 2, heuristic)
+            self.assertEqual(engine.summary()["cpu_utilization"], 1.0)
+            _check_capacity(self, engine, cpus, memory, assignment)
+
+    def test_first_fit_and_best_fit(self):
+        for heuristic in ("ffd", "bfd"):
+            engine = PlacementEngine(CATALOG, heuristic=heuristic)
+            roomy = engine.solve([4], [_GIB], [60.0])[0]
+            tight = engine.add([7], [_GIB], [60.0])[0]
+            self.assertNotEqual(roomy, tight)
+            placed = engine.add([1], [_GIB], [60.0])[0]
+            self.assertEqual(placed, roomy if heuristic == "ffd" else tight, heuristic)
+
+    def test_oversized_tasks_are_unplaced(self):
+        engine = PlacementEngine(CATALOG)
+        assignment = engine.solve([1, 32], [_GIB, _GIB], [60.0, 60.0])
+        self.assertGreaterEqual(assignment[0], 0)
+        self.assertEqual(assignment[1], -1)
+        self.assertEqual(engine.summary()["unplaced"], 1)
+
+    def test_incremental_remove_and_add(self):
+        engine = PlacementEngine(CATALOG)
+        ids = np.arange(100, 116)
+        assignment = engine.solve(np.ones(16), np.full(16, _GIB), np.full(16, 3600.0), task_ids=ids)
+        self.assertEqual(engine.summary()["instances"], 2)
+        first_instance = assignment[0]
+        released = engine.remove(ids[assignment == first_instance], now=1800.0)
+        self.assertEqual(released, 1)
+        summary = engine.summary(now=1800.0)
+        self.assertEqual(summary["instances"], 1)
+        self.assertAlmostEqual(summary["incurred_cost"], 0.15)
+
+        # Freed room on the surviving instance is reused before opening new ones.
+        survivor = assignment[-1]
+        engine.remove(ids[assignment == survivor][:3], now=1800.0)
+        again = engine.add(np.ones(3), np.full(3, _GIB), np.full(3, 600.0), now=1800.0)
+        self.assertTrue((again == survivor).all())
+        self.assertEqual(engine.summary(now=1800.0)["instances"], 1)
+        task_ids, instance_ids, _ = engine.placements()
+        self.assertEqual(len(task_ids), 8)
+        self.assertTrue((instance_ids == survivor).all())
+
+    def test_scans_only_live_instances_with_room(self):
+        engine = PlacementEngine(CATALOG)
+        rng = np.random.default_rng(0)
+        next_id = 0
+        for step in range(50):
+            ids = np.arange(next_id, next_id + 40)
+            next_id += 40
+            engine.add(rng.integers(1, 4, 40), np.full(40, _GIB), np.full(40, 600.0), task_ids=ids, now=step * 60.0)
+            task_ids, _, end_s = engine.placements()
+            engine.remove(task_ids[end_s <= (step + 1) * 60.0], now=(step + 1) * 60.0)
+        live = engine.instances()
+        self.assertGreater(engine._n_bins, 2 * len(live["id"]))  # many instances have come and gone
+        roomy = live["id"][(live["free_cpus"] > 0) & (live["free_memory_bytes"] > 0)]
+        self.assertEqual(engine._roomy.tolist(), roomy.tolist())
+
+    def test_long_tasks_do_not_share_with_short_ones_needlessly(self):
+        engine = PlacementEngine(CATALOG)
+        cpus = np.ones(16)
+        duration = np.array([36_000.0] * 8 + [60.0] * 8)
+        assignment = engine.solve(cpus, np.full(16, _GIB), duration)
+        self.assertEqual(len(set(assignment[:8].tolist())), 1)
+        self.assertTrue(set(assignment[:8].tolist()).isdisjoint(assignment[8:].tolist()))
+
+    def test_hundred_thousand_tasks(self):
+        tasks = SyntheticWorkload().sample(100_000, np.random.default_rng(0))
+        for heuristic in ("ffd", "bfd"):
+            engine = PlacementEngine(heuristic=heuristic)
+            start = time.perf_counter()
+            assignment = engine.solve(tasks["cpus"], tasks["peak_rss_bytes"], tasks["duration_s"])
+            elapsed = time.perf_counter() - start
+            self.assertLess(elapsed, 1.0, heuristic)
+            self.assertTrue((assignment >= 0).all())
+            self.assertGreater(engine.summary()["cpu_utilization"], 0.9)
+
+    def test_load_catalog(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "catalog.json")
+            with open(path, "w") as f:
+                json.dump([{"name": "x", "cpus": 4, "memory_gib": 16, "hourly_price": 0.2}], f)
+            self.assertEqual(load_catalog(path), (InstanceType("x", 4, 16 * _GIB, 0.2),))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from state_simulation.calibration import calibrate, fit_marginal
+from state_simulation.cluster_env import ClusterEnv
+
+TRACE_HEADER = "task_id\thash\tname\tstatus\texit\tduration\trealtime\t%cpu\tpeak_rss\tpeak_vmem\trchar\twchar\n"
+
+
+def write_trace(path, seed, n=300):
+    """ALIGN scales with input size; QC does not."""
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write(TRACE_HEADER)
+        for i in range(n):
+            input_bytes = int(np.exp(rng.normal(np.log(2e9), 0.8)))
+            if i % 2:
+                name = f"ALIGN (s{i})"
+                realtime_ms = int(0.5 * input_bytes / 1e6 * np.exp(rng.normal(0, 0.1)) * 1000)
+                rss = int(4 * input_bytes * np.exp(rng.normal(0, 0.1)))
+            else:
+                name = f"QC (s{i})"
+                realtime_ms = int(np.exp(rng.normal(np.log(60_000), 0.3)))
+                rss = int(np.exp(rng.normal(np.log(5e8), 0.2)))
+            f.write(f"{i}\tab/{i:06x}\t{name}\tCOMPLETED\t0\t{realtime_ms}\t{realtime_ms}\t"
+                    f"95.0%\t{rss}\t{rss}\t{input_bytes}\t{input_bytes // 10}\n")
+
+
+class TestCalibration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp, "cache")
+        self.traces = []
+        for seed in range(2):
+            path = os.path.join(self.tmp, f"run_{seed}.log")
+            write_trace(path, seed)
+            self.traces.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_fits_input_correlation_and_plugs_into_simulator(self):
+        workload = calibrate(self.traces, self.cache_dir, max_workers=2)
+        self.assertEqual(workload.process_names, ["ALIGN", "QC"])
+        align = workload.models[0]
+        self.assertEqual(align["samples"], 300)
+        regression = align["input"]["regressions"]["duration_s"]
+        self.assertAlmostEqual(regression["slope"], 1.0, delta=0.1)
+        self.assertGreater(regression["correlation"], 0.9)
+
+        env = ClusterEnv(batch_size=2000, workload=workload, seed=0)
+        result = env.run_batch(lambda agent, obs: np.full(len(obs), 4 if agent == "memory" else 1))
+        self.assertEqual(result["returns"].shape, (2000,))
+        self.assertLess(result["failed"].mean(), 0.5)
+
+    def test_large_inputs_scale_past_the_tail_threshold(self):
+        workload = calibrate(self.traces, self.cache_dir, max_workers=1)
+        align = workload.models[0]
+        out = workload.sample(20_000, np.random.default_rng(0))
+        is_align = out["process"] == 0
+        log_input = np.log(out["read_bytes"][is_align])
+        duration = out["duration_s"][is_align]
+        self.assertGreater(np.corrcoef(log_input, np.log(duration))[0, 1], 0.8)
+        large = log_input > align["input"]["mu"] + 2 * align["input"]["sigma"]
+        self.assertGreater(np.median(duration[large]), align["metrics"]["duration_s"]["tail_threshold"])
+        self.assertTrue((out["cpus"][is_align] == align["cpus"]).all())
+
+    def test_cache_is_incremental(self):
+        first = calibrate(self.traces[:1], self.cache_dir, max_workers=1)
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir, "files"))), 1)
+        both = calibrate(self.traces, self.cache_dir, max_workers=1)
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir, "files"))), 2)
+        self.assertNotEqual(first.trace_set_sha256, both.trace_set_sha256)
+        again = calibrate(self.traces, self.cache_dir, max_workers=1)
+        self.assertEqual(again.to_dict(), both.to_dict())
+
+    def test_heavy_tail_detected(self):
+        rng = np.random.default_rng(0)
+        pareto = 10.0 * rng.random(20_000) ** -0.5  # tail index 2 -> xi 0.5
+        fit = fit_marginal(pareto)
+        self.assertIsNotNone(fit["tail_threshold"])
+        self.assertAlmostEqual(fit["tail_xi"], 0.5, delta=0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,254 @@
+import asyncio
+import collections
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from proto import nf_ai_comms_pb2
+
+from ai_action_streamer.action_broker import ActionBroker
+from ai_action_streamer.checkpoint import StateCheckpointer, read_snapshot, write_snapshot
+from ai_action_streamer.fair_scheduler import WeightedFairScheduler
+from ai_action_streamer.features import encode_observation
+from ai_action_streamer.transitions import TransitionAssembler
+from state_simulation.synthetic import generate_workflow, observation_events
+
+
+def _observations(n_tasks, seed=3):
+    events = observation_events(generate_workflow(n_tasks, max_width=50, seed=seed), pipeline_name="ckpt")
+    for event in events:
+        event.pop("timestamp_epoch_s")
+        yield nf_ai_comms_pb2.TaskObservation(**event)
+
+
+def _running(task_hash):
+    return nf_ai_comms_pb2.TaskObservation(task_hash=task_hash, status="RUNNING", event_type="task_start")
+
+
+def _complete(task_hash):
+    return nf_ai_comms_pb2.TaskObservation(task_hash=task_hash, status="COMPLETED", event_type="task_complete",
+                                           realtime_ms=1000)
+
+
+class TestSnapshotFormat(unittest.TestCase):
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "1.full.snap")
+            matrix = np.arange(12, dtype=np.float32).reshape(3, 4)
+            write_snapshot(path, {"a": 1}, {"m": matrix, "blob": [b"ab", np.frombuffer(b"cde", np.uint8)],
+                                            "empty": np.zeros(0, np.int64)})
+            meta, arrays = read_snapshot(path)
+            self.assertEqual(meta, {"a": 1})
+            np.testing.assert_array_equal(arrays["m"], matrix)
+            self.assertEqual(arrays["blob"].tobytes(), b"abcde")
+            self.assertEqual(arrays["empty"].shape, (0,))
+            with open(os.path.join(tmp, "bad.snap"), "wb") as f:
+                f.write(b"not a snapshot")
+            with self.assertRaises(ValueError):
+                read_snapshot(os.path.join(tmp, "bad.snap"))
+
+
+class TestTransitionCheckpoints(unittest.TestCase):
+
+    def test_restored_assembler_continues_identically(self):
+        observations = list(_observations(300))
+        cut_full, cut_delta = len(observations) // 3, len(observations) // 2
+        with tempfile.TemporaryDirectory() as tmp:
+            reference_batches, restored_batches = [], []
+            reference = TransitionAssembler(lambda *b: reference_batches.append(b), batch_size=16, max_open_tasks=20)
+            checkpointer = StateCheckpointer(tmp, {"transitions": reference})
+            for i, observation in enumerate(observations):
+                if i == cut_full:
+                    checkpointer.snapshot_now()
+                if i == cut_delta:
+                    checkpointer.snapshot_now(full=False)
+                reference.observe(observation, i % 7)
+            checkpointer.close()
+
+            # Restart from the full snapshot plus the delta (max_open_tasks forces evictions
+            # from the restored tier) and compare with an assembler that never stopped.
+            restored = TransitionAssembler(lambda *b: restored_batches.append(b), batch_size=16, max_open_tasks=20)
+            self.assertEqual(StateCheckpointer(tmp, {"transitions": restored}).restore(), 2)
+            self.assertGreater(len(reference_batches), 0)
+            replay = TransitionAssembler(lambda *b: reference_batches.append(b), batch_size=16, max_open_tasks=20)
+            for i, observation in enumerate(observations[:cut_delta]):
+                replay.observe(observation, i % 7)
+            reference_batches.clear()
+            for i, observation in enumerate(observations[cut_delta:], cut_delta):
+                replay.observe(observation, i % 7)
+                restored.observe(observation, i % 7)
+            self.assertEqual(restored.open_tasks, replay.open_tasks)
+            self.assertEqual(restored.emitted, replay.emitted)
+            self.assertEqual(len(restored_batches), len(reference_batches))
+            for got, expected in zip(restored_batches, reference_batches):
+                for a, b in zip(got, expected):
+                    np.testing.assert_array_equal(a, b)
+
+    def test_full_snapshot_of_restored_tasks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first = TransitionAssembler(lambda *b: None)
+            for i in range(10):
+                first.observe(_running(f"aa/{i:04d}"), i)
+            StateCheckpointer(tmp, {"transitions": first}).snapshot_now()
+
+            second = TransitionAssembler(lambda *b: None)
+            checkpointer = StateCheckpointer(tmp, {"transitions": second})
+            checkpointer.restore()
+            second.observe(_complete("aa/0003"), 0)
+            second.observe(_running("bb/0001"), 5)
+            checkpointer.snapshot_now(full=True)  # merges restored and live tasks
+            self.assertEqual(len(os.listdir(tmp)), 1)
+
+            batches = []
+            third = TransitionAssembler(lambda *b: batches.append(b), batch_size=1)
+            StateCheckpointer(tmp, {"transitions": third}).restore()
+            self.assertEqual(third.open_tasks, 10)
+            # The pending aa/0003 transition was saved too and fills a batch of 1 at once.
+            self.assertEqual([int(b[1][0]) for b in batches], [3])
+            third.observe(_complete("aa/0003"), 0)  # finished before the snapshot
+            third.observe(_complete("aa/0007"), 0)
+            third.observe(_complete("bb/0001"), 0)
+            self.assertEqual([int(b[1][0]) for b in batches], [3, 7, 5])
+            np.testing.assert_array_equal(batches[1][0][0], encode_observation(_running("aa/0007")))
+
+    def test_observations_while_a_full_snapshot_is_written(self):
+        observations = list(_observations(300))
+        cut = len(observations) // 2
+        with tempfile.TemporaryDirectory() as tmp:
+            batches, reference_batches = [], []
+            assembler = TransitionAssembler(lambda *b: batches.append(b), batch_size=4, max_open_tasks=15)
+            reference = TransitionAssembler(lambda *b: reference_batches.append(b), batch_size=4, max_open_tasks=15)
+            checkpointer = StateCheckpointer(tmp, {"transitions": assembler})
+            for i, observation in enumerate(observations[:cut - 5]):
+                assembler.observe(observation, i % 5)
+                reference.observe(observation, i % 5)
+            checkpointer.snapshot_now()
+            for i, observation in enumerate(observations[cut - 5:cut + 1], cut - 5):
+                assembler.observe(observation, i % 5)  # partly against the tier folded back from the file
+                reference.observe(observation, i % 5)
+            at_capture = TransitionAssembler(lambda *b: None, batch_size=4, max_open_tasks=15)
+            for i, observation in enumerate(observations[:cut + 1]):
+                at_capture.observe(observation, i % 5)
+
+            # Updates, completions and evictions of frozen and restored tasks between
+            # the capture and the end of the write.
+            capture = checkpointer._capture(True)
+            for i, observation in enumerate(observations[cut + 1:cut + 40], cut + 1):
+                assembler.observe(observation, i % 5)
+                reference.observe(observation, i % 5)
+            self.assertEqual(assembler.open_tasks, reference.open_tasks)
+            self.assertTrue(assembler._frozen[0].gone)
+            self.assertFalse(assembler._restored.alive.all())
+            checkpointer._written(checkpointer._write(*capture), True)
+            self.assertEqual(assembler._frozen, [])
+            self.assertEqual(len(os.listdir(tmp)), 1)
+            for i, observation in enumerate(observations[cut + 40:], cut + 40):
+                assembler.observe(observation, i % 5)
+                reference.observe(observation, i % 5)
+            self.assertEqual(assembler.open_tasks, reference.open_tasks)
+            self.assertEqual(len(batches), len(reference_batches))
+            for got, expected in zip(batches, reference_batches):
+                for a, b in zip(got, expected):
+                    np.testing.assert_array_equal(a, b)
+
+            # The file holds the state as of the capture.
+            restored = TransitionAssembler(lambda *b: None, batch_size=4, max_open_tasks=15)
+            StateCheckpointer(tmp, {"transitions": restored}).restore()
+            self.assertEqual(restored.open_tasks, at_capture.open_tasks)
+            self.assertEqual(restored._fill, at_capture._fill)
+            for i, observation in enumerate(observations[cut + 1:], cut + 1):
+                restored.observe(observation, i % 5)
+                at_capture.observe(observation, i % 5)
+            self.assertEqual((restored.open_tasks, restored.emitted), (at_capture.open_tasks, at_capture.emitted))
+
+    def test_delta_without_a_full_snapshot_is_written_full(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            assembler = TransitionAssembler(lambda *b: None)
+            checkpointer = StateCheckpointer(tmp, {"transitions": assembler})
+            assembler.observe(_running("aa/0001"), 1)
+            self.assertTrue(checkpointer.snapshot_now(full=False).endswith("1.full.snap"))
+            assembler.observe(_running("aa/0002"), 1)
+            self.assertTrue(checkpointer.snapshot_now(full=False).endswith("2.delta.snap"))
+            checkpointer._failed()
+            assembler.observe(_running("aa/0003"), 1)
+            self.assertTrue(checkpointer.snapshot_now(full=False).endswith("3.full.snap"))
+            checkpointer.close()
+
+            restored = TransitionAssembler(lambda *b: None)
+            self.assertEqual(StateCheckpointer(tmp, {"transitions": restored}).restore(), 3)
+            self.assertEqual(restored.open_tasks, 3)
+
+    def test_restore_removes_interrupted_writes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            assembler = TransitionAssembler(lambda *b: None)
+            assembler.observe(_running("aa/0001"), 1)
+            StateCheckpointer(tmp, {"transitions": assembler}).snapshot_now()
+            for name in ("000000000002.delta.snap.tmp", "000000000003.full.snap.tmp"):
+                with open(os.path.join(tmp, name), "wb") as f:
+                    f.write(b"partial")
+            restored = TransitionAssembler(lambda *b: None)
+            self.assertEqual(StateCheckpointer(tmp, {"transitions": restored}).restore(), 1)
+            self.assertEqual(os.listdir(tmp), ["000000000001.full.snap"])
+            self.assertEqual(restored.open_tasks, 1)
+
+    def test_restore_time_for_a_million_tasks(self):
+        n = 1_000_000
+        with tempfile.TemporaryDirectory() as tmp:
+            big = TransitionAssembler(lambda *b: None, max_open_tasks=2 * n)
+            value = (_running("x"), encode_observation(_running("x")), 1)
+            # Filled directly: a million observe() calls would dominate the test.
+            big._open = collections.OrderedDict((f"{i % 256:02x}/{i:07x}", value) for i in range(n))
+            checkpointer = StateCheckpointer(tmp, {"transitions": big})
+            start = time.perf_counter()
+            capture = checkpointer._capture(True)
+            self.assertLess(time.perf_counter() - start, 0.05)  # the event loop's share
+            checkpointer._written(checkpointer._write(*capture), True)
+            self.assertEqual((len(big._open), big.open_tasks), (0, n))
+            del big, checkpointer
+
+            restored = TransitionAssembler(lambda *b: None, max_open_tasks=2 * n)
+            start = time.perf_counter()
+            StateCheckpointer(tmp, {"transitions": restored}).restore()
+            elapsed = time.perf_counter() - start
+            self.assertLess(elapsed, 1.0)
+            self.assertEqual(restored.open_tasks, n)
+            self.assertEqual(restored._restored.pop("2a/00a452a")[2], 1)
+
+
+class TestStreamerComponents(unittest.TestCase):
+
+    def test_broker_and_scheduler_round_trip(self):
+        async def run(tmp):
+            broker = ActionBroker(retain=4)
+            scheduler = WeightedFairScheduler(weights={"rnaseq": 3.0})
+            for _ in range(3):
+                async with scheduler.slot("rnaseq"):
+                    pass
+            for i in range(6):
+                broker.publish("run-1", nf_ai_comms_pb2.Action(action_id=f"a{i}"))
+            checkpointer = StateCheckpointer(tmp, {"broker": broker, "scheduler": scheduler})
+            await checkpointer.snapshot()
+            checkpointer.close()
+
+            broker, scheduler = ActionBroker(retain=4), WeightedFairScheduler()
+            StateCheckpointer(tmp, {"broker": broker, "scheduler": scheduler}).restore()
+            self.assertEqual(broker.publish("run-1", nf_ai_comms_pb2.Action(action_id="a6")), 7)
+            stream = broker.subscribe("run-1", resume_after=4)
+            batch = await stream.__anext__()
+            await stream.aclose()
+            return [a.sequence for a in batch], [a.action_id for a in batch], scheduler.metrics()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sequences, ids, metrics = asyncio.run(run(tmp))
+        self.assertEqual(sequences, [5, 6, 7])
+        self.assertEqual(ids, ["a4", "a5", "a6"])
+        self.assertEqual(metrics["pipelines"]["rnaseq"]["weight"], 3.0)
+        self.assertEqual(metrics["pipelines"]["rnaseq"]["admitted"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+import grpc
+
+from proto import nf_ai_comms_pb2
+
+from ai_action_streamer.ai_action_streamer_server import AiActionServicer, nf_ai_comms_pb2_grpc
+from ai_action_streamer.features import encode_observation
+from ai_action_streamer.observation_log import KIND_OBSERVATION, ObservationLog, decode_record
+from ai_action_streamer.sessions import SessionRegistry, format_epoch_ms
+from state_simulation.synthetic import generate_workflow, observation_events
+from utilities.ai_server import AiServer
+from utilities.nf_client import CompactSession, compact_observation
+
+
+def _events(n_tasks=50):
+    return list(observation_events(generate_workflow(n_tasks, max_width=10, seed=11), pipeline_name="compact_test"))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestSessionRegistry(unittest.TestCase):
+
+    def test_intern_is_stable_and_per_session(self):
+        registry = SessionRegistry()
+        session, ids = registry.open(["rnaseq", "ALIGN", "rnaseq"])
+        self.assertEqual(ids, [1, 2, 1])
+        same, more = registry.open(["ALIGN", "SORT"], session)
+        self.assertEqual((same, more), (session, [2, 3]))
+        other, other_ids = registry.open(["SORT"])
+        self.assertNotEqual(other, session)
+        self.assertEqual(other_ids, [1])
+        with self.assertRaises(KeyError):
+            registry.open(["x"], session=12345)
+
+    def test_table_size_is_bounded(self):
+        registry = SessionRegistry(max_strings_per_session=3)
+        session, _ = registry.open(["a", "b"])
+        with self.assertRaises(ValueError):
+            registry.open(["c", "d"], session)
+        registry.open(["a", "c"], session)
+
+    def test_expand_round_trip(self):
+        registry = SessionRegistry()
+        events = _events()
+        strings = {e[k] for e in events for k in ("pipeline_name", "process_name", "event_type", "status")}
+        strings |= {e["task_name"] for e in events[::2]}  # half the task names go inline
+        session, ids = registry.open(sorted(strings))
+        ids = dict(zip(sorted(strings), ids))
+        for event in events:
+            compact = compact_observation(event, session, ids)
+            expanded = registry.expand(nf_ai_comms_pb2.CompactTaskObservation.FromString(compact.SerializeToString()))
+            full = dict(event)
+            full.pop("timestamp_epoch_s")
+            expected = nf_ai_comms_pb2.TaskObservation(**full)
+            got_time = datetime.datetime.fromisoformat(expanded.timestamp_iso.replace("Z", "+00:00"))
+            self.assertAlmostEqual(got_time.timestamp(), event["timestamp_epoch_s"], delta=0.001)
+            expanded.timestamp_iso = expected.timestamp_iso
+            self.assertEqual(expanded, expected)
+            self.assertLess(compact.ByteSize(), expected.ByteSize())
+
+            resolved = registry.resolve(compact)
+            for field in ("event_id", "event_type", "pipeline_name", "process_name", "task_name", "status",
+                          "task_hash", "task_id_num", "exit_code", "realtime_ms", "peak_rss_bytes"):
+                self.assertEqual(getattr(resolved, field), getattr(expected, field), field)
+            self.assertEqual(encode_observation(resolved).tolist(), encode_observation(expected).tolist())
+
+    def test_unparsable_cpu_percent(self):
+        event = dict(_events(1)[0], cpu_percent="-")  # as in Nextflow's trace for tasks without a value
+        self.assertEqual(compact_observation(event, 1, {}).cpu_percent, 0.0)
+        self.assertEqual(compact_observation(dict(event, cpu_percent="150.5%"), 1, {}).cpu_percent, 150.5)
+
+    def test_expand_errors(self):
+        registry = SessionRegistry()
+        session, _ = registry.open(["rnaseq"])
+        with self.assertRaises(KeyError):
+            registry.expand(nf_ai_comms_pb2.CompactTaskObservation(session=session + 1))
+        with self.assertRaises(ValueError):
+            registry.expand(nf_ai_comms_pb2.CompactTaskObservation(session=session, process_name_id=7))
+        derived = registry.expand(nf_ai_comms_pb2.CompactTaskObservation(
+            session=session, pipeline_name_id=1, task_id_num=4))
+        self.assertEqual(derived.event_id, "rnaseq-4-")
+
+    def test_close_and_idle_expiry(self):
+        registry = SessionRegistry(idle_timeout_s=0.2)
+        closed, _ = registry.open(["a"])
+        self.assertTrue(registry.close(closed))
+        self.assertFalse(registry.close(closed))
+        idle, _ = registry.open(["a"])
+        active, _ = registry.open(["b"])
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            registry.resolve(nf_ai_comms_pb2.CompactTaskObservation(session=active))
+            time.sleep(0.02)
+        registry.open(["c"])  # new sessions trigger the sweep
+        self.assertEqual(len(registry), 2)
+        with self.assertRaises(KeyError):
+            registry.open(["a"], idle)
+        registry.open(["b"], active)
+
+    def test_format_epoch_ms(self):
+        self.assertEqual(format_epoch_ms(1704067200123), "2024-01-01T00:00:00.123Z")
+
+
+class TestCompactObservationRpc(unittest.TestCase):
+
+    def test_async_servicer(self):
+        log_dir = tempfile.mkdtemp()
+        log = ObservationLog(log_dir)
+        self.addCleanup(shutil.rmtree, log_dir)
+
+        async def run():
+            server = grpc.aio.server()
+            nf_ai_comms_pb2_grpc.add_AiActionServiceServicer_to_server(AiActionServicer(observation_log=log), server)
+            port = server.add_insecure_port("127.0.0.1:0")
+            await server.start()
+            try:
+                async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                    stub = nf_ai_comms_pb2_grpc.AiActionServiceStub(channel)
+                    handle = await stub.OpenSession(nf_ai_comms_pb2.SessionOpen(strings=["rnaseq", "task_start"]))
+                    action = await stub.SendCompactObservation(nf_ai_comms_pb2.CompactTaskObservation(
+                        session=handle.session, pipeline_name_id=handle.ids[0], event_type_id=handle.ids[1],
+                        task_id_num=9))
+                    with self.assertRaises(grpc.aio.AioRpcError) as error:
+                        await stub.SendCompactObservation(nf_ai_comms_pb2.CompactTaskObservation(
+                            session=handle.session + 1))
+                    close = nf_ai_comms_pb2.SessionClose(session=handle.session)
+                    closed = [(await stub.CloseSession(close)).was_open for _ in range(2)]
+                    return action, error.exception.code(), closed
+            finally:
+                await server.stop(None)
+
+        action, code, closed = asyncio.run(run())
+        self.assertEqual(action.observation_event_id, "rnaseq-9-task_start")
+        self.assertEqual(code, grpc.StatusCode.NOT_FOUND)
+        self.assertEqual(closed, [True, False])
+        self.assertTrue(log.sync(timeout=5))
+        logged = [decode_record(r) for r in log.lookup("rnaseq-9-task_start") if r.kind == KIND_OBSERVATION]
+        log.close()
+        self.assertEqual(logged, [nf_ai_comms_pb2.TaskObservation(
+            event_id="rnaseq-9-task_start", event_type="task_start", pipeline_name="rnaseq", task_id_num=9)])
+
+    def test_compact_session_against_ai_server(self):
+        port = _free_port()
+        with tempfile.TemporaryDirectory() as tmp:
+            server = AiServer(port=port, log_file=os.path.join(tmp, "ai_server.log"))
+            server.start()
+            session = CompactSession(f"localhost:{port}")
+            try:
+                events = _events(5)
+                start = events[0]
+                action = session.send(start).result(timeout=5)
+                self.assertEqual(action.observation_event_id, start["event_id"])
+                for event in events[1:]:
+                    self.assertTrue(session.send(event).result(timeout=5).success)
+                # Only the repeated strings are interned; task names always go inline.
+                self.assertEqual(set(session.ids), {e[k] for e in events for k in ("pipeline_name", "process_name",
+                                                                                   "event_type", "status")})
+
+                server.stop(0)
+                server = AiServer(port=port, log_file=os.path.join(tmp, "ai_server.log"))
+                server.start()
+                with self.assertRaises(grpc.RpcError) as error:
+                    session.send(start).result(timeout=5)
+                self.assertEqual(error.exception.code(), grpc.StatusCode.NOT_FOUND)
+                session.reopen()
+                self.assertTrue(session.send(start).result(timeout=5).success)
+                self.assertEqual(len(server.servicer.sessions), 1)
+                session.close()
+                self.assertEqual(len(server.servicer.sessions), 0)
+            finally:
+                session.close()
+                server.stop(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from ai_action_streamer.fair_scheduler import WeightedFairScheduler
+
+
+class TestWeightedFairScheduler(unittest.TestCase):
+
+    def test_uncontended_admits_immediately(self):
+        """With free slots and no waiters, acquire() never queues."""
+        async def run():
+            scheduler = WeightedFairScheduler(max_concurrency=2)
+            for _ in range(5):
+                async with scheduler.slot("solo"):
+                    pass
+            return scheduler.metrics()
+
+        metrics = asyncio.run(run())
+        solo = metrics["pipelines"]["solo"]
+        self.assertEqual(solo["admitted"], 5)
+        self.assertEqual(solo["queue_depth"], 0)
+        self.assertEqual(solo["max_wait_ms"], 0.0)
+        self.assertEqual(metrics["in_flight"], 0)
+
+    def test_weighted_share_under_contention(self):
+        """A weight-2 pipeline gets about twice the admissions of a weight-1 pipeline."""
+        async def run():
+            scheduler = WeightedFairScheduler(max_concurrency=1, weights={"big": 1.0, "small": 2.0})
+            order = []
+
+            async def worker(name):
+                async with scheduler.slot(name):
+                    order.append(name)
+                    await asyncio.sleep(0)
+
+            # Hold the only slot so every worker below queues.
+            await scheduler.acquire("holder")
+            tasks = [asyncio.create_task(worker("big")) for _ in range(30)]
+            tasks += [asyncio.create_task(worker("small")) for _ in range(30)]
+            await asyncio.sleep(0)
+            depth = scheduler.metrics()["pipelines"]["big"]["queue_depth"]
+            scheduler.release("holder")
+            await asyncio.gather(*tasks)
+            return order, depth
+
+        order, big_depth = asyncio.run(run())
+        self.assertEqual(big_depth, 30)
+        first_30 = order[:30]
+        self.assertEqual(first_30.count("small"), 20)
+        self.assertEqual(first_30.count("big"), 10)
+
+    def test_cancelled_waiter_does_not_leak_slot(self):
+        async def run():
+            scheduler = WeightedFairScheduler(max_concurrency=1)
+            await scheduler.acquire("a")
+            waiter = asyncio.create_task(scheduler.acquire("b"))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            scheduler.release("a")
+            await asyncio.wait_for(scheduler.acquire("c"), timeout=1)
+            scheduler.release("c")
+            return scheduler.metrics()
+
+        metrics = asyncio.run(run())
+        self.assertEqual(metrics["in_flight"], 0)
+        self.assertEqual(metrics["queued"], 0)
+
+    def test_idle_pipelines_are_forgotten(self):
+        async def run():
+            scheduler = WeightedFairScheduler(max_concurrency=2, weights={"configured": 3.0}, idle_ttl_s=60.0)
+            for i in range(100):
+                async with scheduler.slot(f"run-{i}"):
+                    pass
+            async with scheduler.slot("configured"):
+                pass
+            await scheduler.acquire("busy")
+            with mock.patch("ai_action_streamer.fair_scheduler.time.monotonic", return_value=time.monotonic() + 120):
+                async with scheduler.slot("live"):
+                    pass
+            remaining = set(scheduler.metrics()["pipelines"])
+            scheduler.release("busy")
+            async with scheduler.slot("configured"):
+                pass
+            return remaining, scheduler.metrics()["pipelines"]["configured"]["weight"]
+
+        remaining, weight = asyncio.run(run())
+        self.assertEqual(remaining, {"busy", "live"})
+        self.assertEqual(weight, 3.0)
+
+    def test_invalid_weight_rejected(self):
+        with self.assertRaises(ValueError):
+            WeightedFairScheduler(weights={"p": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from ai_action_streamer.transport import default_uds_path, ensure_socket_dir, local_address, socket_dir, split_host_port
+from utilities.ai_server import AiServer
+from utilities.nf_client import send_task_observation
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestLocalAddress(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(os.environ, {"NF_AI_COMMS_SOCKET_DIR": self.tmp.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_split_host_port(self):
+        self.assertEqual(split_host_port("localhost:50051"), ("localhost", 50051))
+        self.assertEqual(split_host_port("[::1]:50051"), ("::1", 50051))
+        self.assertEqual(split_host_port("localhost"), ("localhost", None))
+
+    def test_falls_back_to_tcp(self):
+        port = _free_port()
+        self.assertEqual(local_address(f"localhost:{port}"), f"localhost:{port}")  # no socket
+        port = _free_port()  # answers are cached per target
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(default_uds_path(port))
+        stale.close()  # bound but nobody listening, as after a crash
+        self.assertEqual(local_address(f"localhost:{port}"), f"localhost:{port}")
+        self.assertEqual(local_address(f"example.invalid:{port}"), f"example.invalid:{port}")
+        self.assertEqual(local_address(f"ipv4:127.0.0.1:{port}"), f"ipv4:127.0.0.1:{port}")
+
+    def test_ignores_sockets_others_could_plant(self):
+        port = _free_port()
+        listener = socket.socket(socket.AF_UNIX)
+        listener.bind(default_uds_path(port))
+        listener.listen()
+        self.addCleanup(listener.close)
+        with mock.patch("ai_action_streamer.transport.os.getuid", return_value=os.getuid() + 1):
+            self.assertEqual(local_address(f"localhost:{port}"), f"localhost:{port}")  # someone else's socket
+        port = _free_port()
+        os.chmod(self.tmp.name, 0o777)
+        planted = socket.socket(socket.AF_UNIX)
+        planted.bind(default_uds_path(port))
+        planted.listen()
+        self.addCleanup(planted.close)
+        self.assertEqual(local_address(f"localhost:{port}"), f"localhost:{port}")  # writable by anyone
+        with self.assertRaises(PermissionError):
+            ensure_socket_dir()
+        server = AiServer(port=0, log_file=os.path.join(self.tmp.name, "ai_server.log"))
+        with self.assertRaises(RuntimeError):
+            server.start()
+
+    def test_default_socket_dir_is_private(self):
+        with mock.patch.dict(os.environ, {"NF_AI_COMMS_SOCKET_DIR": "", "XDG_RUNTIME_DIR": ""}), \
+                mock.patch("ai_action_streamer.transport.tempfile.gettempdir", return_value=self.tmp.name):
+            path = ensure_socket_dir()
+            self.assertEqual(path, socket_dir())
+            self.assertEqual(os.path.dirname(path), self.tmp.name)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+
+    def test_answer_is_cached_per_target(self):
+        port = _free_port()
+        listener = socket.socket(socket.AF_UNIX)
+        listener.bind(default_uds_path(port))
+        listener.listen()
+        self.addCleanup(listener.close)
+        with mock.patch("ai_action_streamer.transport.socket.socket", wraps=socket.socket) as probe:
+            for _ in range(3):
+                self.assertEqual(local_address(f"localhost:{port}"), f"unix:{default_uds_path(port)}")
+            self.assertEqual(probe.call_count, 1)
+            with mock.patch("ai_action_streamer.transport.time.monotonic", return_value=time.monotonic() + 60):
+                local_address(f"localhost:{port}")
+            self.assertEqual(probe.call_count, 2)
+
+    def test_ai_server_over_unix_socket(self):
+        server = AiServer(port=0, log_file=os.path.join(self.tmp.name, "ai_server.log"))
+        server.start()
+        try:
+            self.assertEqual(server.uds_path, default_uds_path(server.port))
+            for host in ("localhost", "127.0.0.1", socket.gethostname()):
+                self.assertEqual(local_address(f"{host}:{server.port}"), f"unix:{server.uds_path}")
+            action = send_task_observation({"event_id": "uds-1", "event_type": "task_start"},
+                                           f"localhost:{server.port}").result(timeout=5)
+            self.assertEqual(action.observation_event_id, "uds-1")
+        finally:
+            server.stop(0)
+        self.assertFalse(os.path.exists(server.uds_path))
+
+        tcp_only = AiServer(port=0, log_file=os.path.join(self.tmp.name, "ai_server.log"), unix_socket=False)
+        tcp_only.start()
+        try:
+            self.assertIsNone(tcp_only.uds_path)
+            self.assertEqual(local_address(f"localhost:{tcp_only.port}"), f"localhost:{tcp_only.port}")
+        finally:
+            tcp_only.stop(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
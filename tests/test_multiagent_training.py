@@ -0,0 +1,142 @@
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+import ray
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# ray-multiagent is not an importable package name; load its modules directly.
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'ray-multiagent'))
+
+from trainer import MultiAgentTrainer, measure_scaling, reinforce_gradients
+from ai_action_streamer.features import ACTION_NOOP, OBSERVATION_DIM
+from ai_action_streamer.policy import DEFAULT_AGENTS, MultiAgentPolicy
+from state_simulation.cluster_env import ClusterEnv, MEMORY_SCALES
+
+
+class TestClusterEnv(unittest.TestCase):
+
+    def test_run_batch_shapes_and_retry_decisions(self):
+        env = ClusterEnv(batch_size=500, seed=1)
+        # Always under-provision memory and always retry with double memory.
+        policy_fn = {
+            "executor": lambda obs: np.ones(len(obs), dtype=np.int64),
+            "memory": lambda obs: np.zeros(len(obs), dtype=np.int64),
+            "retry": lambda obs: np.full(len(obs), 2),
+        }
+        result = env.run_batch(lambda agent, obs: policy_fn[agent](obs))
+        self.assertEqual(result["returns"].shape, (500,))
+        obs, actions, episodes = result["decisions"]["retry"]
+        self.assertEqual(obs.shape[1], OBSERVATION_DIM)
+        self.assertGreater(len(actions), 0)
+        self.assertTrue((result["attempts"] >= 1).all() and (result["attempts"] <= 3).all())
+        self.assertTrue((result["returns"] < 0).all())
+
+    def test_generous_memory_avoids_failures(self):
+        env = ClusterEnv(batch_size=500, seed=2)
+        biggest = len(MEMORY_SCALES) - 1
+        result = env.run_batch(lambda agent, obs: np.full(len(obs), biggest if agent == "memory" else 1))
+        stingy = ClusterEnv(batch_size=500, seed=2).run_batch(lambda agent, obs: np.zeros(len(obs), dtype=np.int64))
+        self.assertLess(result["failed"].mean(), stingy["failed"].mean())
+
+
+class TestMultiAgentPolicy(unittest.TestCase):
+
+    def test_gradient_step_improves_return(self):
+        policy = MultiAgentPolicy()
+        env = ClusterEnv(batch_size=4096, seed=3)
+        rng = np.random.default_rng(0)
+
+        def mean_return():
+            eval_env = ClusterEnv(batch_size=4096, seed=99)
+            return eval_env.run_batch(lambda agent, obs: policy.act(agent, obs, greedy=True))["returns"].mean()
+
+        before = mean_return()
+        for _ in range(10):
+            rollout = env.run_batch(lambda agent, obs: policy.act(agent, obs, rng=rng))
+            grads, counts = reinforce_gradients(policy, rollout)
+            params = policy.get_params()
+            for agent, (gw, gb) in grads.items():
+                w, b = params[agent]
+                params[agent] = (w + 0.05 * gw / counts[agent], b + 0.05 * gb / counts[agent])
+            policy.set_params(params)
+        self.assertGreater(mean_return(), before)
+
+    def test_checkpoint_round_trip(self):
+        policy = MultiAgentPolicy(version="test-1")
+        w, b = policy.params["memory"]
+        policy.set_params({"memory": (w, b + np.arange(len(b)))})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "policy.npz")
+            policy.save(path)
+            loaded = MultiAgentPolicy.load(path)
+        self.assertEqual(loaded.version, "test-1")
+        self.assertEqual(loaded.agents, {k: tuple(v) for k, v in DEFAULT_AGENTS.items()})
+        np.testing.assert_array_equal(loaded.params["memory"][1], policy.params["memory"][1])
+
+    def test_action_codes(self):
+        policy = MultiAgentPolicy()
+        w, b = policy.params["retry"]
+        policy.set_params({"retry": (w, b + np.array([0.0, 0.0, 1.0], np.float32))})
+        details, code = policy.decide(SimpleNamespace(
+            event_type="task_complete", status="FAILED", exit_code=137, duration_ms=0, realtime_ms=0,
+            cpu_percent="", peak_rss_bytes=0, peak_vmem_bytes=0, read_bytes=0, write_bytes=0,
+        ))
+        self.assertEqual(details, "executor=local;memory=scale_0.5;retry=retry_double_memory")
+        self.assertEqual(policy.split_action_code(code), {"executor": 0, "memory": 0, "retry": 2})
+        self.assertEqual(policy.split_action_code(0), {"executor": 0, "memory": 0, "retry": 0})
+        self.assertIsNone(policy.split_action_code(ACTION_NOOP))
+
+
+class TestMultiAgentTrainer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Ray workers do not inherit the driver's sys.path.
+        pythonpath = os.pathsep.join([PROJECT_ROOT, os.path.join(PROJECT_ROOT, 'ray-multiagent')])
+        ray.init(num_cpus=2, log_to_driver=False, include_dashboard=False,
+                 runtime_env={"env_vars": {"PYTHONPATH": pythonpath}})
+
+    @classmethod
+    def tearDownClass(cls):
+        ray.shutdown()
+
+    def test_train_iteration_and_checkpoint_round_trip(self):
+        trainer = MultiAgentTrainer(num_actors=2, batch_size=256, seed=5)
+        try:
+            before = trainer.policy.get_params()
+            metrics = trainer.train_iteration()
+            self.assertEqual((metrics["iteration"], metrics["episodes"]), (1, 512))
+            self.assertGreater(metrics["samples_per_s"], 0)
+            self.assertTrue(0.0 <= metrics["failure_rate"] <= 1.0)
+            self.assertFalse(np.array_equal(trainer.policy.params["memory"][0], before["memory"][0]))
+
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "policy.npz")
+                trainer.save_checkpoint(path)
+                loaded = MultiAgentPolicy.load(path)
+        finally:
+            trainer.shutdown()
+        self.assertEqual(loaded.version, trainer.policy.version)
+        for agent, (weights, bias) in trainer.policy.params.items():
+            np.testing.assert_array_equal(loaded.params[agent][0], weights)
+            np.testing.assert_array_equal(loaded.params[agent][1], bias)
+
+        resumed = MultiAgentTrainer(num_actors=1, batch_size=128, policy=loaded)
+        try:
+            self.assertEqual(resumed.train_iteration()["episodes"], 128)
+        finally:
+            resumed.shutdown()
+
+    def test_measure_scaling(self):
+        report = measure_scaling([1, 2], iterations=1, batch_size=128, batches_per_actor=1)
+        self.assertEqual([count for count, _, _ in report], [1, 2])
+        self.assertEqual(report[0][2], 1.0)
+        self.assertTrue(all(rate > 0 for _, rate, _ in report))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from proto import nf_ai_comms_pb2
+
+from ai_action_streamer.observation_log import (
+    KIND_ACTION, KIND_OBSERVATION, LogReader, ObservationLog, decode_record,
+)
+
+
+def _pair(i):
+    observation = nf_ai_comms_pb2.TaskObservation(
+        event_id=f"obs_{i}", event_type="task_complete", pipeline_name="wal_pipeline",
+        process_name="wal_process", task_id_num=i, task_name=f"wal_process ({i})",
+    )
+    action = nf_ai_comms_pb2.Action(observation_event_id=f"obs_{i}", action_id=f"act_{i}", success=True)
+    return observation, action
+
+
+class TestObservationLog(unittest.TestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def _write(self, count, segment_bytes=4096):
+        log = ObservationLog(self.log_dir, segment_bytes=segment_bytes)
+        for i in range(count):
+            log.append_pair(*_pair(i))
+        self.assertTrue(log.sync(timeout=5))
+        return log
+
+    def test_roll_segments_and_read_back_in_order(self):
+        self._write(100).close()
+        self.assertGreater(len(LogReader(self.log_dir).segments()), 1)
+
+        records = list(LogReader(self.log_dir))
+        self.assertEqual([r.seq for r in records], list(range(1, 201)))
+        self.assertEqual(records[0].kind, KIND_OBSERVATION)
+        self.assertEqual(records[1].kind, KIND_ACTION)
+        self.assertIsInstance(records[0].payload, memoryview)
+        self.assertEqual(decode_record(records[20]).task_name, "wal_process (10)")
+        self.assertEqual(decode_record(records[21]).action_id, "act_10")
+
+    def test_index_by_event_id_and_time(self):
+        start = time.time()
+        log = self._write(50)
+        try:
+            matches = log.lookup("obs_7")
+            self.assertEqual([r.kind for r in matches], [KIND_OBSERVATION, KIND_ACTION])
+            self.assertEqual(decode_record(matches[1]).action_id, "act_7")
+            self.assertEqual(len(list(log.records_between(start, time.time() + 1))), 100)
+            self.assertEqual(list(log.records_between(0, start - 1)), [])
+        finally:
+            log.close()
+
+    def test_recovery_discards_torn_tail(self):
+        self._write(10, segment_bytes=1 << 20).close()
+        segment_path = LogReader(self.log_dir).segments()[-1]
+
+        # Flip a byte inside the last record's payload to simulate a torn write.
+        with open(segment_path, "r+b") as f:
+            data = f.read()
+            end = data.rstrip(b"\0")
+            f.seek(len(end) - 1)
+            f.write(bytes([end[-1] ^ 0xFF]))
+
+        log = ObservationLog(self.log_dir, segment_bytes=1 << 20)
+        try:
+            self.assertEqual(log.committed_seq, 19)
+            log.append_pair(*_pair(99))
+            self.assertTrue(log.sync(timeout=5))
+            self.assertEqual(log.committed_seq, 21)
+        finally:
+            log.close()
+        seqs = [r.seq for r in LogReader(self.log_dir)]
+        self.assertEqual(seqs, list(range(1, 22)))
+        self.assertEqual(os.path.basename(segment_path), f"{1:020d}.wal")
+
+    def test_oversized_record_is_dropped(self):
+        log = ObservationLog(self.log_dir, segment_bytes=4096)
+        try:
+            big = nf_ai_comms_pb2.TaskObservation(event_id="big", task_name="x" * 8192)
+            log.append(KIND_OBSERVATION, big, big.event_id)
+            self.assertFalse(log.sync(timeout=5))  # lost in the writer
+            log.append_pair(*_pair(1))
+            self.assertTrue(log.sync(timeout=5))
+            self.assertEqual((log.dropped, log.write_errors), (1, 1))
+            self.assertEqual(log.committed_seq, 2)
+            self.assertTrue(log._writer.is_alive())
+        finally:
+            log.close()
+
+    def test_drops_are_counted_across_producer_threads(self):
+        # The writer idles until close(), so exactly max_pending appends are accepted.
+        log = ObservationLog(self.log_dir, commit_interval_s=60.0, max_pending=50)
+        observation, _ = _pair(1)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=lambda: [log.append(KIND_OBSERVATION, observation, "obs_1")
+                                                        for _ in range(5000)]) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+            log.close()
+        self.assertEqual(log.dropped, 4 * 5000 - 50)
+        self.assertEqual(sum(1 for _ in LogReader(self.log_dir)), 50)
+
+    def test_writer_survives_io_error(self):
+        log = ObservationLog(self.log_dir, segment_bytes=4096, retry_interval_s=0.01)
+        try:
+            real_start_segment = log._start_segment
+            failures = []
+
+            def failing_start_segment():
+                if len(failures) < 2:
+                    failures.append(1)
+                    raise OSError(28, "No space left on device")
+                real_start_segment()
+
+            with mock.patch.object(log, "_start_segment", failing_start_segment):
+                for i in range(100):  # rolls over a segment
+                    log.append_pair(*_pair(i))
+                self.assertTrue(log.sync(timeout=5))
+            self.assertTrue(log._writer.is_alive())
+            self.assertEqual(log.write_errors, 2)
+            self.assertIn("No space left", log.last_error)
+            self.assertEqual(log.committed_seq, 200)
+        finally:
+            log.close()
+        self.assertEqual([r.seq for r in LogReader(self.log_dir)], list(range(1, 201)))
+
+    def test_sealed_segments_are_indexed_on_disk(self):
+        start = time.time()
+        self._write(100).close()
+        segments = LogReader(self.log_dir).segments()
+        indexes = sorted(n for n in os.listdir(self.log_dir) if n.endswith(".idx"))
+        self.assertEqual(len(indexes), len(segments) - 1)
+
+        log = ObservationLog(self.log_dir, segment_bytes=4096)
+        try:
+            self.assertIsNone(log._segments[0].by_event_id)  # loaded, not rescanned
+            self.assertEqual(log.committed_seq, 200)
+            matches = log.lookup("obs_3")
+            self.assertEqual(decode_record(matches[1]).action_id, "act_3")
+            self.assertEqual(log.lookup("obs_missing"), [])
+            self.assertEqual(len(list(log.records_between(start, time.time() + 1))), 200)
+        finally:
+            log.close()
+
+    def test_retention_deletes_oldest_segments(self):
+        log = ObservationLog(self.log_dir, segment_bytes=4096, max_segments=2)
+        try:
+            for i in range(100):
+                log.append_pair(*_pair(i))
+            self.assertTrue(log.sync(timeout=5))
+            self.assertEqual(log.lookup("obs_0"), [])
+            self.assertEqual(len(log.lookup("obs_99")), 2)
+        finally:
+            log.close()
+        self.assertEqual(len(LogReader(self.log_dir).segments()), 2)
+        self.assertEqual(len([n for n in os.listdir(self.log_dir) if n.endswith(".idx")]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ai_action_streamer.policy import MultiAgentPolicy
+from state_simulation.evaluation import PolicyEvaluator, StaticPolicy, compare, summarize
+from state_simulation.traces import parse_duration_ms, parse_memory_bytes, read_trace, records_to_workload
+
+TRACE_HEADER = "task_id\thash\tnative_id\tname\tstatus\texit\tsubmit\tduration\trealtime\t%cpu\tpeak_rss\tpeak_vmem\trchar\twchar\n"
+
+
+def write_trace(path, rows):
+    with open(path, "w") as f:
+        f.write(TRACE_HEADER)
+        for i, (name, realtime, rss) in enumerate(rows, start=1):
+            f.write(f"{i}\tab/{i:06x}\t{1000 + i}\t{name}\tCOMPLETED\t0\t2024-05-01 10:00:{i:02d}.000\t"
+                    f"{realtime}\t{realtime}\t180.5%\t{rss}\t{rss}\t1.2 GB\t300 MB\n")
+
+
+class TestTraceParsing(unittest.TestCase):
+
+    def test_human_readable_values(self):
+        self.assertEqual(parse_duration_ms("1h 2m 3s"), 3_723_000)
+        self.assertEqual(parse_duration_ms("350ms"), 350)
+        self.assertEqual(parse_duration_ms("-"), 0)
+        self.assertEqual(parse_memory_bytes("1.5 GB"), int(1.5 * 1024 ** 3))
+        self.assertEqual(parse_memory_bytes("2048"), 2048)
+
+    def test_read_trace(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "run.log")
+            write_trace(path, [("ALIGN (sample_1)", "10m", "8 GB"), ("QC (1)", "30s", "500 MB")])
+            records = read_trace(path)
+            self.assertEqual([r.process_name for r in records], ["ALIGN", "QC"])
+            self.assertEqual(records[0].realtime_ms, 600_000)
+            self.assertEqual(records[1].submit_ms - records[0].submit_ms, 1000)
+            self.assertAlmostEqual(records[0].cpu_percent, 180.5)
+
+            # Estimates only use earlier outcomes: a default, then the earlier ALIGN task.
+            tasks = records_to_workload(records)
+            self.assertEqual(list(tasks["est_duration_s"]), [60.0, 600.0])
+            self.assertEqual(tasks["est_rss_bytes"][1], 8 * 1024 ** 3)
+        finally:
+            shutil.rmtree(tmp)
+
+
+class TestPolicyEvaluator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.traces = []
+        for run in range(3):
+            path = os.path.join(self.tmp, f"run_{run}.log")
+            write_trace(path, [("ALIGN (%d)" % i, f"{5 + i + run}m", f"{4 + (i % 3)} GB") for i in range(20)])
+            self.traces.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_results_are_cached_per_trace_and_policy_version(self):
+        cache_dir = os.path.join(self.tmp, "cache")
+        baseline = StaticPolicy()
+        candidate = MultiAgentPolicy(version="candidate-1")
+
+        first = PolicyEvaluator(cache_dir, max_workers=2)
+        results = first.evaluate(self.traces[:2], [candidate, baseline])
+        self.assertEqual((first.cache_hits, first.cache_misses), (0, 4))
+        self.assertEqual(len(results[baseline.version]), 2)
+        self.assertEqual(results[baseline.version][0]["tasks"], 20)
+
+        second = PolicyEvaluator(cache_dir, max_workers=2)
+        again = second.evaluate(self.traces, [candidate, baseline])
+        self.assertEqual((second.cache_hits, second.cache_misses), (4, 2))
+        self.assertEqual(again[candidate.version][0], results[candidate.version][0])
+
+        summary = summarize(again[baseline.version])
+        self.assertEqual(summary["tasks"], 60)
+        self.assertGreater(summary["mean_makespan_s"], 0)
+        self.assertEqual(compare(summary, summary)["cost_change"], 0.0)
+
+    def test_cache_key_covers_parameters_and_env_kwargs(self):
+        cache_dir = os.path.join(self.tmp, "cache")
+        policy = MultiAgentPolicy(version="iter-1")
+        default = PolicyEvaluator(cache_dir, max_workers=1).evaluate(self.traces[:1], [policy])
+
+        single_attempt = PolicyEvaluator(cache_dir, max_workers=1, env_kwargs={"max_attempts": 1})
+        limited = single_attempt.evaluate(self.traces[:1], [policy])
+        self.assertEqual((single_attempt.cache_hits, single_attempt.cache_misses), (0, 1))
+        self.assertEqual(limited["iter-1"][0]["attempts"], limited["iter-1"][0]["tasks"])
+
+        # Another training run's policy with the same version string.
+        retrained = MultiAgentPolicy(version="iter-1")
+        w, b = retrained.params["memory"]
+        retrained.set_params({"memory": (w, b + 1.0)})
+        evaluator = PolicyEvaluator(cache_dir, max_workers=1)
+        evaluator.evaluate(self.traces[:1], [retrained])
+        self.assertEqual((evaluator.cache_hits, evaluator.cache_misses), (0, 1))
+
+        repeat = PolicyEvaluator(cache_dir, max_workers=1)
+        self.assertEqual(repeat.evaluate(self.traces[:1], [MultiAgentPolicy(version="other")])["other"][0]["cost"],
+                         default["iter-1"][0]["cost"])
+        self.assertEqual((repeat.cache_hits, repeat.cache_misses), (1, 0))
+
+    def test_duplicate_versions_are_rejected(self):
+        evaluator = PolicyEvaluator(os.path.join(self.tmp, "cache"), max_workers=1)
+        with self.assertRaises(ValueError):
+            evaluator.evaluate(self.traces[:1], [MultiAgentPolicy(), MultiAgentPolicy()])
+        self.assertEqual(evaluator.cache_misses, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
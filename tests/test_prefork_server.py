@@ -0,0 +1,127 @@
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+import grpc
+
+from proto import nf_ai_comms_pb2, nf_ai_comms_pb2_grpc
+
+from ai_action_streamer.policy import MultiAgentPolicy
+from utilities.ai_server import AiServer
+
+
+class TestPreforkAiServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.checkpoint = os.path.join(self.tmp.name, "policy.npz")
+        MultiAgentPolicy().save(self.checkpoint)
+        self.server = AiServer(port=0, log_file=os.path.join(self.tmp.name, "ai_server.log"), workers=2,
+                               policy_checkpoint=self.checkpoint)
+        self.server.start()
+        self.addCleanup(self.server.stop, 0)
+
+    def _stub(self):
+        channel = grpc.insecure_channel(f"localhost:{self.server.port}", options=[("grpc.use_local_subchannel_pool", 1)])
+        self.addCleanup(channel.close)
+        return nf_ai_comms_pb2_grpc.AiActionServiceStub(channel)
+
+    def test_workers_share_port_and_metrics_aggregate(self):
+        self.assertIsNone(self.server.uds_path)
+        for _ in range(8):
+            action = self._stub().SendTaskObservation(
+                nf_ai_comms_pb2.TaskObservation(event_id="e1", event_type="task_start"), timeout=5)
+            self.assertIn("executor=", action.action_details)
+        metrics = self.server.metrics()
+        self.assertEqual(metrics["workers"], 2)
+        self.assertEqual(len({w["pid"] for w in metrics["per_worker"]}), 2)
+        self.assertEqual(metrics["methods"]["SendTaskObservation"]["calls"], 8)
+
+    def test_rolling_restart_keeps_serving(self):
+        stub = self._stub()
+        stop = threading.Event()
+        failures = []
+        calls = [0]
+
+        def load():
+            while not stop.is_set():
+                try:
+                    stub.SendTaskObservation(nf_ai_comms_pb2.TaskObservation(event_id="r"), timeout=5)
+                    calls[0] += 1
+                except grpc.RpcError as e:
+                    failures.append(e.code())
+
+        thread = threading.Thread(target=load)
+        thread.start()
+        try:
+            time.sleep(0.2)
+            old = [w["pid"] for w in self.server.metrics()["per_worker"]]
+            new = self.server.rolling_restart(grace=1.0)
+            time.sleep(0.2)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertFalse(set(old) & set(new))
+        # Never UNAVAILABLE; at most the call racing each old worker's shutdown is cancelled.
+        self.assertLessEqual(len(failures), len(old))
+        self.assertEqual(set(failures) - {grpc.StatusCode.CANCELLED}, set())
+        metrics = self.server.metrics()
+        self.assertEqual(metrics["restarts"], 2)
+        # Counts from the retired workers are kept (a cancelled call never reached a handler).
+        self.assertEqual(metrics["methods"]["SendTaskObservation"]["calls"], calls[0])
+
+    def test_metrics_ignore_late_replies(self):
+        stub = self._stub()
+        observation = nf_ai_comms_pb2.TaskObservation(event_id="m")
+        for _ in range(2):
+            stub.SendTaskObservation(observation, timeout=5)
+        for worker in self.server._workers:
+            with worker.conn_lock:
+                worker.conn.send(("metrics", 0))  # as if an earlier metrics() call had given up waiting
+        time.sleep(0.5)  # the late replies are now waiting in the pipes
+        for _ in range(3):
+            stub.SendTaskObservation(observation, timeout=5)
+        self.assertEqual(self.server.metrics()["methods"]["SendTaskObservation"]["calls"], 5)
+
+    def test_metrics_not_blocked_by_rolling_restart(self):
+        spawn = self.server._spawn
+
+        def slow_spawn(index):
+            time.sleep(1.5)  # a worker that is slow to load its policy
+            return spawn(index)
+
+        self.server._spawn = slow_spawn
+        restart = threading.Thread(target=self.server.rolling_restart, kwargs={"grace": 1.0})
+        restart.start()
+        try:
+            deadline = time.monotonic() + 30
+            while self.server.restarts == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)  # the second worker's replacement is starting now
+            start = time.monotonic()
+            metrics = self.server.metrics()
+            self.assertLess(time.monotonic() - start, 0.5)
+            self.assertEqual(metrics["workers"], 2)
+        finally:
+            restart.join()
+        self.assertEqual(self.server.restarts, 2)
+
+    def test_crashed_worker_is_replaced(self):
+        victim = self.server.metrics()["per_worker"][0]["pid"]
+        os.kill(victim, signal.SIGKILL)
+        deadline = time.monotonic() + 15
+        while self.server.restarts == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        pids = [w["pid"] for w in self.server.metrics()["per_worker"]]
+        self.assertEqual(len(pids), 2)
+        self.assertNotIn(victim, pids)
+        self.assertFalse(os.path.exists(f"/proc/{victim}"))  # reaped, not left as a zombie
+        self._stub().SendTaskObservation(nf_ai_comms_pb2.TaskObservation(event_id="after"), timeout=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
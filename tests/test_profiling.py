@@ -0,0 +1,132 @@
+import asyncio
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import tracemalloc
+import unittest
+import zipfile
+
+import grpc
+
+from proto import nf_ai_comms_pb2
+
+from ai_action_streamer.ai_action_streamer_server import AiActionServicer, nf_ai_comms_pb2_grpc
+from ai_action_streamer.profiling import Profiler, profiled
+
+
+async def _serve(servicer):
+    server = grpc.aio.server()
+    nf_ai_comms_pb2_grpc.add_AiActionServiceServicer_to_server(servicer, server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    await server.start()
+    return server, port
+
+
+async def _profile(stub, **options):
+    chunks = [chunk async for chunk in stub.Profile(nf_ai_comms_pb2.ProfileRequest(**options))]
+    return chunks[0].filename, b"".join(chunk.data for chunk in chunks)
+
+
+class TestProfileRpc(unittest.TestCase):
+
+    def test_profile_while_serving(self):
+        async def run():
+            servicer = AiActionServicer()
+            server, port = await _serve(servicer)
+            try:
+                async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                    stub = nf_ai_comms_pb2_grpc.AiActionServiceStub(channel)
+                    profiling = asyncio.ensure_future(_profile(stub, duration_s=0.5, top_n=5))
+                    await asyncio.sleep(0.1)
+                    with self.assertRaises(grpc.aio.AioRpcError) as second:
+                        await _profile(stub, duration_s=0.1)
+                    for i in range(5):
+                        await stub.SendTaskObservation(nf_ai_comms_pb2.TaskObservation(event_id=f"e{i}"))
+                    with self.assertRaises(grpc.aio.AioRpcError):
+                        await stub.SendCompactObservation(nf_ai_comms_pb2.CompactTaskObservation(session=99))
+                    handle = await stub.OpenSession(nf_ai_comms_pb2.SessionOpen(strings=["rnaseq"]))
+                    await stub.SendCompactObservation(nf_ai_comms_pb2.CompactTaskObservation(
+                        session=handle.session, pipeline_name_id=handle.ids[0], task_id_num=1))
+                    result = await profiling
+                    return result, second.exception.code(), servicer.profiler
+            finally:
+                await server.stop(None)
+
+        (filename, archive), second_code, profiler_after = asyncio.run(run())
+        self.assertEqual(second_code, grpc.StatusCode.FAILED_PRECONDITION)
+        self.assertIsNone(profiler_after)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertIsNone(sys.getprofile())
+        self.assertTrue(filename.startswith("streamer-profile-") and filename.endswith(".zip"))
+
+        with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+            self.assertEqual(sorted(zf.namelist()),
+                             ["profile.pstats", "profile.txt", "summary.json", "tracemalloc.txt"])
+            summary = json.loads(zf.read("summary.json"))
+            pstats_data = zf.read("profile.pstats")
+        handlers = summary["handlers"]
+        self.assertEqual(handlers["SendTaskObservation"]["calls"], 5)
+        self.assertEqual(handlers["SendTaskObservation"]["completed"], 5)
+        self.assertGreaterEqual(handlers["SendTaskObservation"]["wall_s"], 5 * 0.01)  # the echo path sleeps 10 ms
+        self.assertLess(handlers["SendTaskObservation"]["cpu_s"], handlers["SendTaskObservation"]["wall_s"])
+        # A compact call is timed under its own handler only, not SendTaskObservation's too.
+        self.assertEqual((handlers["SendCompactObservation"]["calls"], handlers["SendCompactObservation"]["completed"],
+                          handlers["SendCompactObservation"]["errors"]), (2, 2, 1))
+        self.assertGreater(summary["loop_lag_ms"]["samples"], 10)
+        self.assertLessEqual(len(summary["tracemalloc"]["top"]), 5)
+        self.assertGreater(summary["tracemalloc"]["peak_bytes"], 0)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "profile.pstats")
+            with open(path, "wb") as f:
+                f.write(pstats_data)
+            functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn("SendTaskObservation", functions)
+
+    def test_skip_cprofile_and_tracemalloc(self):
+        async def run():
+            server, port = await _serve(AiActionServicer())
+            try:
+                async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                    stub = nf_ai_comms_pb2_grpc.AiActionServiceStub(channel)
+                    return await _profile(stub, duration_s=0.05, skip_cprofile=True, skip_tracemalloc=True)
+            finally:
+                await server.stop(None)
+
+        _, archive = asyncio.run(run())
+        with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+            self.assertEqual(zf.namelist(), ["summary.json"])
+            self.assertIsNone(json.loads(zf.read("summary.json"))["tracemalloc"])
+
+
+class TestProfiled(unittest.TestCase):
+
+    def test_stream_handler_timing(self):
+        class Servicer:
+            profiler = None
+
+            @profiled
+            async def Stream(self, request, context):
+                for i in range(request):
+                    await asyncio.sleep(0)
+                    yield i
+
+        async def run():
+            servicer = Servicer()
+            unprofiled = [i async for i in servicer.Stream(2, None)]
+            servicer.profiler = Profiler(cprofile=False, trace_allocations=False)
+            servicer.profiler.start(asyncio.get_running_loop())
+            profiled_items = [i async for i in servicer.Stream(3, None)]
+            servicer.profiler.stop()
+            return unprofiled, profiled_items, servicer.profiler.handlers["Stream"]
+
+        unprofiled, profiled_items, handler = asyncio.run(run())
+        self.assertEqual(unprofiled, [0, 1])
+        self.assertEqual(profiled_items, [0, 1, 2])
+        self.assertEqual((handler["calls"], handler["completed"], handler["messages"]), (1, 1, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+# ray-multiagent is not an importable package name; load its modules directly.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ray-multiagent'))
+
+from replay_buffer import PrioritizedReplayBuffer, buffer_nbytes, capacity_for_memory
+from ai_action_streamer.features import OBSERVATION_DIM
+from ai_action_streamer.transitions import TransitionAssembler
+
+
+def _observation(task_hash, status, event_type="task_start", realtime_ms=0, exit_code=0):
+    return SimpleNamespace(
+        task_hash=task_hash, status=status, event_type=event_type, exit_code=exit_code,
+        duration_ms=realtime_ms, realtime_ms=realtime_ms, cpu_percent="", peak_rss_bytes=0,
+        peak_vmem_bytes=0, read_bytes=0, write_bytes=0,
+    )
+
+
+def _batch(n, obs_dim=4, offset=0):
+    obs = np.arange(offset, offset + n, dtype=np.float32)[:, None].repeat(obs_dim, axis=1)
+    return obs, np.arange(offset, offset + n), np.zeros(n, np.float32), obs + 1, np.zeros(n, bool)
+
+
+class TestPrioritizedReplayBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = PrioritizedReplayBuffer(capacity=100, obs_dim=4, alpha=1.0)
+
+    def tearDown(self):
+        self.buffer.close()
+
+    def test_wraps_at_capacity(self):
+        self.buffer.add_batch(*_batch(80))
+        indices = self.buffer.add_batch(*_batch(40, offset=80))
+        self.assertEqual(len(self.buffer), 100)
+        self.assertEqual(list(indices[-20:]), list(range(20)))
+        self.assertAlmostEqual(self.buffer.total_priority, 100.0)
+
+    def test_sampling_follows_priorities(self):
+        self.buffer.add_batch(*_batch(10), priorities=np.ones(10))
+        self.buffer.update_priorities([3], [91.0])
+        batch = self.buffer.sample(1000, rng=np.random.default_rng(0))
+        share = np.mean(batch["indices"] == 3)
+        self.assertGreater(share, 0.85)
+        np.testing.assert_array_equal(batch["obs"][:, 0], batch["indices"].astype(np.float32))
+        self.assertAlmostEqual(float(batch["weights"].max()), 1.0)
+
+    def test_attach_shares_storage(self):
+        self.buffer.add_batch(*_batch(5))
+        other = PrioritizedReplayBuffer.attach(self.buffer.name, 100, 4, alpha=1.0)
+        try:
+            self.assertEqual(len(other), 5)
+            self.assertEqual(int(other.sample(8)["actions"].max()), 4)
+        finally:
+            other.close()
+
+    def test_capacity_for_memory_respects_cap(self):
+        capacity = capacity_for_memory(1 << 20, OBSERVATION_DIM)
+        self.assertLessEqual(buffer_nbytes(capacity, OBSERVATION_DIM), 1 << 20)
+        self.assertGreater(buffer_nbytes(capacity + 1, OBSERVATION_DIM), 1 << 20)
+
+
+class TestTransitionAssembler(unittest.TestCase):
+
+    def test_pairs_observations_by_task_hash(self):
+        batches = []
+        assembler = TransitionAssembler(lambda *batch: batches.append(batch), batch_size=2)
+        assembler.observe(_observation("aa/1", "RUNNING"), 1)
+        assembler.observe(_observation("bb/2", "RUNNING"), 2)
+        assembler.observe(_observation("aa/1", "COMPLETED", "task_complete", realtime_ms=3_600_000), 0)
+        assembler.observe(_observation("bb/2", "FAILED", "task_complete", exit_code=1), 0)
+
+        self.assertEqual(len(batches), 1)
+        obs, actions, rewards, next_obs, dones = batches[0]
+        self.assertEqual(obs.shape, (2, OBSERVATION_DIM))
+        self.assertEqual(list(actions), [1, 2])
+        np.testing.assert_allclose(rewards, [-1.0, -1.0])
+        self.assertTrue(dones.all())
+        self.assertEqual(assembler.open_tasks, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import itertools
+import unittest
+
+import numpy as np
+
+from state_simulation.cluster_env import ClusterEnv
+from state_simulation.synthetic import DagWorkload, generate_workflow, observation_events, task_observations
+
+
+class TestSyntheticWorkflow(unittest.TestCase):
+
+    def test_tasks_are_topologically_ordered(self):
+        tasks = list(generate_workflow(3000, max_width=100, seed=7))
+        self.assertEqual([t.task_id for t in tasks], list(range(1, 3001)))
+        for task in tasks:
+            self.assertTrue(all(dep < task.task_id for dep in task.deps))
+        gathers = [t for t in tasks if isinstance(t.deps, range)]
+        self.assertTrue(gathers, "expected at least one scatter/gather block")
+        self.assertTrue(any(len(t.deps) == 2 and not isinstance(t.deps, range) for t in tasks),
+                        "expected at least one diamond join")
+
+    def test_same_seed_same_workflow(self):
+        first = list(generate_workflow(500, seed=1))
+        second = list(generate_workflow(500, seed=1))
+        self.assertEqual(first, second)
+
+    def test_huge_workflow_streams_lazily(self):
+        stream = generate_workflow(10_000_000, seed=3)
+        head = list(itertools.islice(observation_events(stream), 1000))
+        self.assertEqual(len(head), 1000)
+
+    def test_events_are_time_ordered_and_complete(self):
+        events = list(observation_events(generate_workflow(2000, max_width=50, seed=5)))
+        self.assertEqual(len(events), 4000)
+        times = [e["timestamp_epoch_s"] for e in events]
+        self.assertEqual(times, sorted(times))
+        completes = [e for e in events if e["event_type"] == "task_complete"]
+        self.assertTrue(all(e["status"] == "COMPLETED" and e["duration_ms"] > 0 for e in completes))
+
+    def test_task_observation_messages(self):
+        message = next(task_observations(generate_workflow(10, seed=2), pipeline_name="scale_test"))
+        self.assertEqual(message.pipeline_name, "scale_test")
+        self.assertEqual(message.event_type, "task_start")
+        self.assertTrue(message.timestamp_iso.endswith("Z"))
+
+    def test_dag_workload_drives_simulator(self):
+        env = ClusterEnv(batch_size=1000, workload=DagWorkload(generate_workflow(5000, seed=4)), seed=0)
+        result = env.run_batch(lambda agent, obs: np.full(len(obs), 1))
+        self.assertEqual(result["returns"].shape, (1000,))
+
+
+if __name__ == '__main__':
+    unittest.main()
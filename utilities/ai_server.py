@@ -4,67 +4,508 @@ import time
 import uuid
 import grpc
 from concurrent import futures
+import asyncio
+import contextlib
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
 
 # Import the generated classes
-# Assuming 'proto' directory is in PYTHONPATH or handled by the calling script.
-import nf_ai_comms_pb2
-import nf_ai_comms_pb2_grpc
+from proto import nf_ai_comms_pb2
+from proto import nf_ai_comms_pb2_grpc
+
+from ai_action_streamer.sessions import SessionRegistry
+from ai_action_streamer.transport import default_uds_path, ensure_socket_dir
+
+
+def _append_log(log_file, message):
+    with open(log_file, "a") as f:
+        f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+
+
+class HandlerStats:
+    """Calls, errors and handler wall time per RPC method."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def timed(self, method):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self._stats.setdefault(method, [0, 0, 0.0])
+                stats[0] += 1
+                stats[1] += error
+                stats[2] += elapsed
+
+    def snapshot(self):
+        with self._lock:
+            return {method: {"calls": calls, "errors": errors, "seconds": seconds}
+                    for method, (calls, errors, seconds) in self._stats.items()}
+
+
+def merge_stats(snapshots):
+    """Sums HandlerStats.snapshot() dictionaries."""
+    merged = {}
+    for snapshot in snapshots:
+        for method, stats in snapshot.items():
+            total = merged.setdefault(method, {"calls": 0, "errors": 0, "seconds": 0.0})
+            for key in total:
+                total[key] += stats[key]
+    return merged
+
+
+class _Abort(Exception):
+    """Raised by the shared handler bodies; each servicer turns it into its context.abort()."""
+
+    def __init__(self, code, details):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
 
 # AiActionServiceServicer remains largely the same but uses a passed-in logger
 class AiActionServiceServicer(nf_ai_comms_pb2_grpc.AiActionServiceServicer):
-    def __init__(self, logger_callable):
+    def __init__(self, logger_callable, policy=None):
         self.logger = logger_callable
+        # Optional trained MultiAgentPolicy; without one the servicer just echoes.
+        self.policy = policy
+        self.sessions = SessionRegistry()
+        self.stats = HandlerStats()
 
-    def SendTaskObservation(self, request, context):
+    # Handler bodies shared with AsyncAiActionServiceServicer. They raise _Abort
+    # instead of calling context.abort(), which is a coroutine on grpc.aio.
+    def _action(self, request):
         self.logger(f"Received TaskObservation: event_id={request.event_id}, event_type={request.event_type}")
         response = nf_ai_comms_pb2.Action()
         response.observation_event_id = request.event_id
         response.action_id = str(uuid.uuid4())
-        response.action_details = f"Action for event {request.event_id}: Processed event type '{request.event_type}'"
+        if self.policy is not None:
+            response.action_details = self.policy.decide(request)[0]
+        else:
+            response.action_details = f"Action for event {request.event_id}: Processed event type '{request.event_type}'"
         response.success = True
         response.message = "Successfully processed TaskObservation"
         self.logger(f"Sending Action: action_id={response.action_id}")
         return response
 
+    def _open_session(self, request):
+        try:
+            session, ids = self.sessions.open(request.strings, request.session)
+        except KeyError as e:
+            raise _Abort(grpc.StatusCode.NOT_FOUND, e.args[0]) from None
+        except ValueError as e:
+            raise _Abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e)) from None
+        self.logger(f"OpenSession: session={session}, interned {len(ids)} strings")
+        return nf_ai_comms_pb2.SessionHandle(session=session, ids=ids)
+
+    def _compact_action(self, request):
+        try:
+            observation = self.sessions.resolve(request)
+        except KeyError as e:
+            raise _Abort(grpc.StatusCode.NOT_FOUND, f"{e.args[0]}; call OpenSession again") from None
+        except ValueError as e:
+            raise _Abort(grpc.StatusCode.INVALID_ARGUMENT, str(e)) from None
+        return self._action(observation)
+
+    def _close_session(self, request):
+        return nf_ai_comms_pb2.SessionClosed(was_open=self.sessions.close(request.session))
+
+    def _handle(self, method, body, request, context):
+        with self.stats.timed(method):
+            try:
+                return body(request)
+            except _Abort as e:
+                context.abort(e.code, e.details)
+
+    def SendTaskObservation(self, request, context):
+        return self._handle("SendTaskObservation", self._action, request, context)
+
+    def OpenSession(self, request, context):
+        return self._handle("OpenSession", self._open_session, request, context)
+
+    def SendCompactObservation(self, request, context):
+        return self._handle("SendCompactObservation", self._compact_action, request, context)
+
+    def CloseSession(self, request, context):
+        return self._handle("CloseSession", self._close_session, request, context)
+
+
+class AsyncAiActionServiceServicer(AiActionServiceServicer):
+    # The same handlers for the grpc.aio server in worker processes, where
+    # context.abort() is a coroutine. Session tables are per worker; a client
+    # that lands on another worker after a restart gets NOT_FOUND and reopens.
+
+    async def _handle_async(self, method, body, request, context):
+        with self.stats.timed(method):
+            try:
+                return body(request)
+            except _Abort as e:
+                await context.abort(e.code, e.details)
+
+    async def SendTaskObservation(self, request, context):
+        return await self._handle_async("SendTaskObservation", self._action, request, context)
+
+    async def OpenSession(self, request, context):
+        return await self._handle_async("OpenSession", self._open_session, request, context)
+
+    async def SendCompactObservation(self, request, context):
+        return await self._handle_async("SendCompactObservation", self._compact_action, request, context)
+
+    async def CloseSession(self, request, context):
+        return await self._handle_async("CloseSession", self._close_session, request, context)
+
+
+def _load_policy(policy_checkpoint):
+    if not policy_checkpoint:
+        return None
+    from ai_action_streamer.policy import MultiAgentPolicy
+    return MultiAgentPolicy.load(policy_checkpoint)
+
+
+def _worker_main(index, port, log_file, policy_checkpoint, conn):
+    """
+    Runs one worker process: a grpc.aio server on the shared port
+    (SO_REUSEPORT), controlled by the parent AiServer over `conn`.
+
+    The worker sends ("ready", pid, port) once listening, answers
+    ("metrics", request_id) with ("metrics", request_id, snapshot) and answers
+    ("stop", grace) with ("stopped", snapshot) after draining.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is handled by the parent
+
+    def logger(message):
+        _append_log(log_file, f"[worker {index} pid {os.getpid()}] {message}")
+
+    async def serve():
+        servicer = AsyncAiActionServiceServicer(logger, _load_policy(policy_checkpoint))
+        server = grpc.aio.server(options=[("grpc.so_reuseport", 1)])
+        nf_ai_comms_pb2_grpc.add_AiActionServiceServicer_to_server(servicer, server)
+        bound_port = server.add_insecure_port(f"[::]:{port}")
+        await server.start()
+        conn.send(("ready", os.getpid(), bound_port))
+
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+
+        def on_command():
+            try:
+                command, arg = conn.recv()
+            except EOFError:
+                command, arg = "stop", 0  # the parent is gone
+            if command == "metrics":
+                conn.send(("metrics", arg, servicer.stats.snapshot()))
+            elif command == "stop" and not stop.done():
+                stop.set_result(arg)
+
+        loop.add_reader(conn.fileno(), on_command)
+        grace = await stop
+        loop.remove_reader(conn.fileno())
+        await server.stop(grace)
+        with contextlib.suppress(OSError):
+            conn.send(("stopped", servicer.stats.snapshot()))
+
+    asyncio.run(serve())
+
+
+class _Worker:
+    __slots__ = ("index", "process", "conn", "conn_lock", "pid", "stopping")
+
+    def __init__(self, index, process, conn, pid):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        # One request/reply exchange on `conn` at a time (metrics() vs _stop_worker()).
+        self.conn_lock = threading.Lock()
+        self.pid = pid
+        self.stopping = False
+
+
 class AiServer:
-    def __init__(self, port=50052, log_file="/tmp/ai_server.log"):
+    """
+    Args:
+        port (int): TCP port (0 picks a free one; read .port after start()).
+        log_file (str): Log path, truncated on start().
+        unix_socket (bool): Also listen on default_uds_path(port). Single-process mode
+            only: a socket path has one listener, so SO_REUSEPORT balancing is TCP-only.
+        workers (int): None runs the threaded server in this process. N runs N worker
+            processes, each a grpc.aio server bound to the same port with SO_REUSEPORT,
+            so the kernel spreads connections and decision work runs on N cores.
+        policy_checkpoint (str): MultiAgentPolicy checkpoint loaded by the servicer(s);
+            rolling_restart() picks up a new file at the same path.
+    """
+
+    def __init__(self, port=50052, log_file="/tmp/ai_server.log", unix_socket=True, workers=None,
+                 policy_checkpoint=None):
         self.port = port
         self.log_file = log_file
+        # Also listen on default_uds_path(port); nf_client switches to it for local servers.
+        self.unix_socket = unix_socket and not workers
+        self.uds_path = None
+        self.workers = workers
+        self.policy_checkpoint = policy_checkpoint
+        self.restarts = 0
         self.server = None
+        self.servicer = None
+        self._workers = []
+        self._retired = []  # final stats of workers that have been replaced
+        # Guards _workers, _retired and restarts; never held across a worker's start or drain.
+        self._lock = threading.RLock()
+        self._restart_lock = threading.Lock()  # one rolling_restart() at a time
+        self._metrics_requests = itertools.count(1)
+        self._stopped = threading.Event()
+        self._supervisor = None
+        # Workers are spawned rather than forked: gRPC core is not fork-safe once initialised.
+        self._context = multiprocessing.get_context("spawn")
 
     def app_log(self, message):
-        with open(self.log_file, "a") as f:
-            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+        _append_log(self.log_file, message)
 
     def start(self):
         # Initialize logging (clear/create log file)
         with open(self.log_file, "w") as f:
             f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - Log initialized for AiServer.\n")
+        self._stopped.clear()
+        if self.workers:
+            self._start_workers()
+            return
 
         self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
 
         # Instantiate servicer with the app_log method
-        servicer = AiActionServiceServicer(self.app_log)
-        nf_ai_comms_pb2_grpc.add_AiActionServiceServicer_to_server(servicer, self.server)
+        self.servicer = AiActionServiceServicer(self.app_log, _load_policy(self.policy_checkpoint))
+        nf_ai_comms_pb2_grpc.add_AiActionServiceServicer_to_server(self.servicer, self.server)
 
-        self.server.add_insecure_port(f'[::]:{self.port}')
+        self.port = self.server.add_insecure_port(f'[::]:{self.port}')
+        if self.unix_socket:
+            # A failure is fatal rather than TCP only: a socket that is not ours at
+            # this path would receive our local clients' traffic.
+            try:
+                ensure_socket_dir()
+                self.server.add_insecure_port(f'unix:{default_uds_path(self.port)}')
+            except (OSError, RuntimeError) as e:
+                self.app_log(f"Not listening on {default_uds_path(self.port)}: {e}")
+                self.server.stop(None)
+                self.server = None
+                raise RuntimeError(f"cannot listen on {default_uds_path(self.port)} (unix_socket=False "
+                                   f"serves TCP only): {e}") from e
+            self.uds_path = default_uds_path(self.port)
         self.server.start()
-        self.app_log(f"AiServer started. Listening on port {self.port}.")
+        self.app_log(f"AiServer started. Listening on port {self.port}"
+                     + (f" and unix:{self.uds_path}." if self.uds_path else "."))
+
+    def _start_workers(self):
+        # The first worker resolves port 0; the others bind the port it got.
+        for index in range(self.workers):
+            worker = self._spawn(index)
+            with self._lock:
+                self._workers.append(worker)
+        self._supervisor = threading.Thread(target=self._supervise, name="AiServer-supervisor", daemon=True)
+        self._supervisor.start()
+        self.app_log(f"AiServer started. {self.workers} workers listening on port {self.port} "
+                     f"(pids {', '.join(str(w.pid) for w in self._workers)}).")
+
+    def _spawn(self, index, timeout=30.0):
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, name=f"AiServer-worker-{index}", daemon=True,
+            args=(index, self.port, self.log_file, self.policy_checkpoint, child_conn),
+        )
+        process.start()
+        child_conn.close()
+        try:
+            if not conn.poll(timeout):
+                raise RuntimeError(f"AiServer worker {index} did not start within {timeout}s")
+            _, pid, self.port = conn.recv()
+        except EOFError:
+            process.join(1.0)
+            raise RuntimeError(f"AiServer worker {index} exited during start-up "
+                               f"(exit code {process.exitcode})") from None
+        except RuntimeError:
+            process.kill()
+            raise
+        return _Worker(index, process, conn, pid)
+
+    def _stop_worker(self, worker, grace):
+        worker.stopping = True
+        snapshot = {}
+        with worker.conn_lock:
+            try:
+                worker.conn.send(("stop", grace))
+                deadline = time.monotonic() + (grace or 0) + 10.0
+                while worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                    message = worker.conn.recv()
+                    if message[0] == "stopped":
+                        snapshot = message[1]
+                        break
+            except (EOFError, OSError):
+                pass
+            worker.process.join(5.0)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+        with self._lock:
+            self._retired.append(snapshot)
+
+    def _supervise(self):
+        # Replaces workers that exit without being asked to (crash, OOM kill).
+        while not self._stopped.is_set():
+            with self._lock:
+                sentinels = {w.process.sentinel: w for w in self._workers}
+            for sentinel in multiprocessing.connection.wait(list(sentinels), timeout=0.5):
+                worker = sentinels[sentinel]
+                with self._lock:
+                    if worker.stopping or worker not in self._workers or self._stopped.is_set():
+                        continue
+                    worker.stopping = True  # metrics() skips it from here on
+                self.app_log(f"Worker {worker.index} (pid {worker.pid}) exited with code "
+                             f"{worker.process.exitcode}; restarting it.")
+                worker.process.join()  # reap it; it has already exited
+                worker.conn.close()
+                try:
+                    new = self._spawn(worker.index)
+                except RuntimeError as e:
+                    self.app_log(str(e))
+                    new = None
+                with self._lock:
+                    replaced = not self._stopped.is_set() and worker in self._workers
+                    if replaced:
+                        position = self._workers.index(worker)
+                        if new is None:
+                            del self._workers[position]
+                        else:
+                            self._workers[position] = new
+                            self.restarts += 1
+                if new is not None and not replaced:
+                    # Stopped, or a rolling_restart() replaced it meanwhile.
+                    self._stop_worker(new, 0)
+
+    def rolling_restart(self, grace=5.0):
+        """
+        Replaces the workers one at a time. Each new process is listening before the
+        old one stops accepting, and the old one gets `grace` seconds to finish its
+        in-flight RPCs, so the port is never unserved. A call that reaches an old
+        worker's connection in the instant it shuts down can still fail with
+        CANCELLED; clients retry it like any other transient failure.
+
+        Returns:
+            list: The new worker pids.
+        """
+        if not self.workers:
+            raise RuntimeError("rolling_restart() needs the pre-fork mode (workers=N)")
+        with self._restart_lock:
+            with self._lock:
+                old_workers = list(self._workers)
+            for old in old_workers:
+                # _lock is only held to swap the worker in, so metrics() and the
+                # supervisor are not blocked while a worker starts or drains.
+                with self._lock:
+                    if self._stopped.is_set() or old not in self._workers:
+                        continue  # stopping, or the supervisor already replaced it
+                new = self._spawn(old.index)
+                with self._lock:
+                    replaced = not self._stopped.is_set() and old in self._workers
+                    if replaced:
+                        self._workers[self._workers.index(old)] = new
+                        old.stopping = True
+                        self.restarts += 1
+                if not replaced:
+                    # Stopped, or the old worker crashed meanwhile and the supervisor replaced it.
+                    self._stop_worker(new, 0)
+                    continue
+                self._stop_worker(old, grace)
+                self.app_log(f"Worker {old.index} restarted: pid {old.pid} -> {new.pid}.")
+            with self._lock:
+                return [w.pid for w in self._workers]
+
+    def metrics(self, timeout=5.0):
+        """
+        Per-method calls, errors and handler seconds summed over all workers,
+        including the final counts of workers that have since been restarted,
+        plus a per-worker breakdown.
+        """
+        if not self.workers:
+            per_worker = [{"pid": os.getpid(), "methods": self.servicer.stats.snapshot() if self.servicer else {}}]
+        else:
+            with self._lock:
+                workers = [w for w in self._workers if not w.stopping]
+            per_worker = [{"pid": worker.pid, "methods": self._worker_metrics(worker, timeout)} for worker in workers]
+        with self._lock:
+            return {
+                "workers": len(per_worker),
+                "restarts": self.restarts,
+                "methods": merge_stats([w["methods"] for w in per_worker] + self._retired),
+                "per_worker": per_worker,
+            }
+
+    def _worker_metrics(self, worker, timeout):
+        # Replies are tagged with the request id: one that arrives after an earlier
+        # call gave up waiting is still in the pipe and must not be taken as ours.
+        request_id = next(self._metrics_requests)
+        with worker.conn_lock:
+            if worker.stopping:
+                return {}
+            try:
+                worker.conn.send(("metrics", request_id))
+                deadline = time.monotonic() + timeout
+                while worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                    message = worker.conn.recv()
+                    if message[0] == "metrics" and message[1] == request_id:
+                        return message[2]
+            except (EOFError, OSError):
+                pass
+        return {}
 
     def stop(self, grace=None):
         self.app_log("AiServer stopping.")
+        self._stopped.set()
         if self.server:
             self.server.stop(grace)
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            self._stop_worker(worker, grace)
+        if self._supervisor is not None:
+            self._supervisor.join()
+            self._supervisor = None
         self.app_log("AiServer stopped.")
 
     def wait_for_termination(self):
         if self.server:
             self.server.wait_for_termination()
+        elif self.workers:
+            self._stopped.wait()
 
 # Updated main execution block
 if __name__ == '__main__':
-    ai_server = AiServer() # Uses default port and log file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AiActionService gRPC server.")
+    parser.add_argument("--port", type=int, default=50052)
+    parser.add_argument("--log-file", default="/tmp/ai_server.log")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="run N worker processes sharing the port; SIGHUP does a rolling restart")
+    parser.add_argument("--policy-checkpoint", default=None)
+    args = parser.parse_args()
+
+    ai_server = AiServer(port=args.port, log_file=args.log_file, workers=args.workers,
+                         policy_checkpoint=args.policy_checkpoint)
     ai_server.start()
+    if args.workers:
+        signal.signal(signal.SIGHUP, lambda *_: threading.Thread(target=ai_server.rolling_restart).start())
     print(f"AiServer running on port {ai_server.port}. Press Ctrl+C to stop.")
     try:
         ai_server.wait_for_termination()
@@ -1,10 +1,8 @@
 import grpc
 
 # Import the generated classes
-import sys
-sys.path.append('../proto')  # Add proto folder to Python path
-import dummy_pb2
-import dummy_pb2_grpc
+from proto import dummy_pb2
+from proto import dummy_pb2_grpc
 
 def run():
     # Connect to the server
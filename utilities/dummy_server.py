@@ -3,10 +3,8 @@ from concurrent import futures
 import time
 
 # Import the generated classes
-import sys
-sys.path.append('../proto')  # Add proto folder to Python path
-import dummy_pb2
-import dummy_pb2_grpc
+from proto import dummy_pb2
+from proto import dummy_pb2_grpc
 
 # Create a class to define the server functions, derived from
 # dummy_pb2_grpc.GreeterServicer
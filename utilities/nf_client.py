@@ -1,11 +1,15 @@
 import grpc
 import uuid
 import datetime
+import threading
+import time
 
 # Import the generated classes
-# Assuming 'proto' directory is in PYTHONPATH or handled by the calling script.
-import nf_ai_comms_pb2
-import nf_ai_comms_pb2_grpc
+from proto import nf_ai_comms_pb2
+from proto import nf_ai_comms_pb2_grpc
+
+from ai_action_streamer.features import parse_cpu_percent
+from ai_action_streamer.transport import local_address
 
 def send_task_observation(observation_data, server_address='localhost:50052'):
     """
@@ -13,7 +17,9 @@ def send_task_observation(observation_data, server_address='localhost:50052'):
 
     Args:
         observation_data (dict): A dictionary containing the data for the TaskObservation.
-        server_address (str): The address (host:port) of the gRPC server.
+        server_address (str): The address (host:port) of the gRPC server. A server on this
+                              host is reached over its Unix socket when it listens on one
+                              (see ai_action_streamer.transport.local_address).
 
     Returns:
         grpc.Future: A future object representing the asynchronous call.
@@ -22,7 +28,7 @@ def send_task_observation(observation_data, server_address='localhost:50052'):
                      checking for exceptions, waiting for results) and for channel management
                      if making many calls (this function creates a channel per call but does not close it).
     """
-    channel = grpc.insecure_channel(server_address) # Channel created per call
+    channel = grpc.insecure_channel(local_address(server_address)) # Channel created per call
     stub = nf_ai_comms_pb2_grpc.AiActionServiceStub(channel)
 
     request = nf_ai_comms_pb2.TaskObservation()
@@ -89,6 +95,164 @@ def send_task_observation(observation_data, server_address='localhost:50052'):
     future = stub.SendTaskObservation.future(request)
     return future
 
+def subscribe_actions(session_id, server_address='localhost:50052', pipeline_name="", resume_after=0,
+                      max_batch=0, reconnect_delay_s=1.0, max_reconnects=None):
+    """
+    Yields the Actions the server pushes to this session (SubscribeActions),
+    reconnecting when the stream drops and resuming after the last Action.sequence seen.
+
+    Args:
+        session_id (str): Stable id of this Nextflow run; reuse it across reconnects.
+        server_address (str): The address (host:port) of the gRPC server.
+        pipeline_name (str): Pipeline the session belongs to (for broadcasts).
+        resume_after (int): Sequence of the last action already handled (0 = all retained).
+        max_batch (int): Max actions the server writes per wakeup (0 = server default).
+        reconnect_delay_s (float): Pause before reconnecting after UNAVAILABLE.
+        max_reconnects (int): Give up (re-raise) after this many reconnects; None retries forever.
+
+    The generator returns when the server ends the stream (the session was closed).
+    """
+    reconnects = 0
+    while True:
+        channel = grpc.insecure_channel(local_address(server_address))
+        stub = nf_ai_comms_pb2_grpc.AiActionServiceStub(channel)
+        request = nf_ai_comms_pb2.SessionInfo(
+            session_id=session_id, pipeline_name=pipeline_name, resume_after=resume_after, max_batch=max_batch
+        )
+        try:
+            for action in stub.SubscribeActions(request):
+                resume_after = action.sequence
+                yield action
+            return
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.UNAVAILABLE or (max_reconnects is not None and reconnects >= max_reconnects):
+                raise
+            reconnects += 1
+            print(f"Action stream for session {session_id} lost ({e.details()}); resuming after {resume_after}")
+            time.sleep(reconnect_delay_s)
+        finally:
+            channel.close()
+
+def _epoch_ms(observation_data):
+    if "timestamp_epoch_s" in observation_data:
+        return int(float(observation_data["timestamp_epoch_s"]) * 1000)
+    iso = observation_data.get("timestamp_iso")
+    if iso:
+        try:
+            parsed = datetime.datetime.fromisoformat(iso.replace("Z", "+00:00"))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+            return int(parsed.timestamp() * 1000)
+        except ValueError:
+            print(f"Warning: Could not parse timestamp_iso '{iso}'. Using the current time.")
+    return int(time.time() * 1000)
+
+def compact_observation(observation_data, session, ids):
+    """
+    Builds a CompactTaskObservation from the same dictionary send_task_observation() takes.
+
+    Args:
+        observation_data (dict): Observation fields (see send_task_observation).
+        session (int): Handle returned by OpenSession.
+        ids (dict): Interned string -> id. Strings missing from it are sent as 0 (unset),
+                    except task_name, which then goes in the plain task_name field.
+    """
+    task_name = observation_data.get("task_name", "")
+    pipeline_name = observation_data.get("pipeline_name", "")
+    event_type = observation_data.get("event_type", "")
+    task_id_num = int(observation_data.get("task_id_num") or 0)
+    event_id = observation_data.get("event_id", "")
+    if event_id == f"{pipeline_name}-{task_id_num}-{event_type}":
+        event_id = ""  # the server derives exactly this
+    request = nf_ai_comms_pb2.CompactTaskObservation(
+        session=session,
+        event_id=event_id,
+        event_type_id=ids.get(event_type, 0),
+        timestamp_epoch_ms=_epoch_ms(observation_data),
+        pipeline_name_id=ids.get(pipeline_name, 0),
+        process_name_id=ids.get(observation_data.get("process_name", ""), 0),
+        task_id_num=task_id_num,
+        task_hash=observation_data.get("task_hash", ""),
+        native_id=observation_data.get("native_id", ""),
+        status_id=ids.get(observation_data.get("status", ""), 0),
+        cpu_percent=parse_cpu_percent(observation_data.get("cpu_percent", "")),  # "-" and the like -> 0.0
+    )
+    task_name_id = ids.get(task_name, 0)
+    if task_name_id:
+        request.task_name_id = task_name_id
+    else:
+        request.task_name = task_name
+    for field in ("exit_code", "duration_ms", "realtime_ms", "peak_rss_bytes", "peak_vmem_bytes",
+                  "read_bytes", "write_bytes"):
+        if field in observation_data:
+            setattr(request, field, int(observation_data[field]))
+    return request
+
+class CompactSession:
+    """
+    Sends observations as CompactTaskObservation messages over one channel.
+
+    Pipeline and process names, event types and statuses are interned through
+    OpenSession (synchronously, the first time each one is seen - a handful per
+    run). Task names are nearly all unique, so they are sent inline: interning
+    one would cost an OpenSession call to save its bytes on the task's one or
+    two later events.
+
+    If the server restarts it forgets the session and sends fail with NOT_FOUND;
+    call reopen() and resend. close() at the end of the run also drops the
+    session's strings on the server.
+    """
+
+    def __init__(self, server_address='localhost:50052', strings=()):
+        self.channel = grpc.insecure_channel(local_address(server_address))
+        self.stub = nf_ai_comms_pb2_grpc.AiActionServiceStub(self.channel)
+        self.session = 0
+        self.ids = {}
+        self._lock = threading.Lock()
+        self.intern(strings)
+
+    def intern(self, strings):
+        """Registers strings (blocking) and returns their ids."""
+        new = [s for s in dict.fromkeys(strings) if s and s not in self.ids]
+        if new or not self.session:
+            handle = self.stub.OpenSession(nf_ai_comms_pb2.SessionOpen(session=self.session, strings=new))
+            self._register(handle, new)
+        return [self.ids[s] for s in strings if s]
+
+    def reopen(self):
+        """Opens a new session with every string registered so far."""
+        with self._lock:
+            strings = list(self.ids)
+            previous, self.session = self.session, 0
+            self.ids = {}
+        if previous:
+            # Normally already gone (server restart); otherwise its table would linger until it expires.
+            self.stub.CloseSession.future(nf_ai_comms_pb2.SessionClose(session=previous))
+        self.intern(strings)
+
+    def send(self, observation_data):
+        """Sends one observation (same dictionary as send_task_observation); returns a grpc.Future of the Action."""
+        self.intern([observation_data.get(key, "") for key in ("pipeline_name", "process_name", "event_type", "status")])
+        request = compact_observation(observation_data, self.session, self.ids)
+        return self.stub.SendCompactObservation.future(request)
+
+    def close(self):
+        """Closes the session on the server (best effort) and the channel."""
+        if self.session:
+            try:
+                self.stub.CloseSession(nf_ai_comms_pb2.SessionClose(session=self.session), timeout=5)
+            except grpc.RpcError as e:
+                print(f"Warning: CloseSession failed: {e.code()}")
+            self.session = 0
+        self.channel.close()
+
+    def _register(self, handle, strings):
+        with self._lock:
+            if self.session and handle.session != self.session:
+                return  # reply for a session that has since been reopened
+            self.session = handle.session
+            self.ids.update(zip(strings, handle.ids))
+
 if __name__ == '__main__':
     # This main block demonstrates how to use the asynchronous client.
     # It shows how to get the result from the future.
@@ -4,21 +4,11 @@ import datetime
 import uuid
 import time
 
-# Add project root to sys.path to allow utilities.ai_server and utilities.nf_client imports
-# This is needed when running 'python utilities/test_integration.py' from the project root,
-# or if 'utilities' is not directly in PYTHONPATH.
-# Assumes this script is in 'utilities' and project root is one level up.
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-proto_dir = os.path.join(project_root, 'proto')
-
-if project_root not in sys.path:
-    sys.path.insert(0, project_root)
-if proto_dir not in sys.path:
-    sys.path.insert(0, proto_dir) # Add proto dir directly
+# Run from the project root as 'python -m utilities.test_integration' so that the
+# utilities and proto packages are importable.
 
 import grpc # For grpc.RpcError and grpc.FutureTimeoutError (though FutureTimeoutError is part of RpcError)
 
-# Now that sys.path is adjusted, we can import from utilities and proto deps should be found
 from utilities.ai_server import AiServer
 from utilities.nf_client import send_task_observation
 